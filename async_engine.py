@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import httpx
+from groq import AsyncGroq
+from download import download_video_audio, delete_download, stream_video_audio_chunks
+from transcription import needs_chunking, plan_audio_chunks, encode_chunk, TranscriptStitcher, WHISPER_MODEL, MAX_WORKERS, TRANSCRIPTION_RESPONSE_FORMAT
+from cache import disk_cache, hash_file, get_youtube_video_id
+from sections import SectionStore, MAX_CONCURRENT_SECTIONS
+from stats import GenerationStatistics, statistics_from_usage
+from rate_limit import rate_limiter, estimate_request_tokens, create_completion_async, CLIENT_MAX_RETRIES
+from clients import get_http_limits, get_http_timeout, HTTP2
+from tracing import span, observe, add_bytes, StreamTimer
+from outline import (TranscriptWindower, outline_messages, partial_outline_messages, merge_messages, outline_request_options,
+                     parse_partial_outlines, check_merged_outline, outline_window_chars, PARTIAL_OUTLINE_MAX_TOKENS, MERGE_MAX_TOKENS)
+from preprocess import preprocess_audio
+from media import open_upload
+from timeline import parse_segments
+from engine import (NotesResult, is_youtube_link, section_messages, section_prompts, restore_sections, write_outputs, transcript_cache_key, save_timeline,
+                    youtube_transcript_cache_key, outline_cache_key, section_cache_key, section_inputs_key, reuse_similar_outline, reuse_similar_sections,
+                    get_outline_source, can_stream_youtube_audio, can_preprocess_audio, DEFAULT_OUTLINE_MODEL, DEFAULT_CONTENT_MODEL,
+                    TRANSCRIPTION_LANGUAGE, TRANSCRIPTION_PROMPT)
+
+_http_client = None
+
+
+def get_http_client():
+    """
+    Returns the process-wide pooled httpx client shared by every AsyncGroq client. Connections are kept alive
+    between calls, so concurrent sessions reuse TLS connections instead of opening their own.
+    The pool belongs to the event loop that first uses it.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=get_http_limits(), timeout=get_http_timeout(), http2=HTTP2)
+    return _http_client
+
+
+def create_async_client(api_key=None):
+    return AsyncGroq(api_key=api_key, http_client=get_http_client(), max_retries=CLIENT_MAX_RETRIES)
+
+
+async def transcribe_file_async(client, path, model=WHISPER_MODEL, language=TRANSCRIPTION_LANGUAGE, prompt=TRANSCRIPTION_PROMPT):
+    """
+    Transcribes a single audio file with one Whisper API call. Returns the text and its (start, end, text) segments.
+    """
+    size = os.path.getsize(path)
+    add_bytes("upload", size)
+
+    async def request(model):
+        # The file is read in small blocks as the request body is sent, which is quick enough to do on the event loop
+        with span("transcription", file=os.path.basename(path), bytes=size), open_upload(path) as upload:
+            started = time.perf_counter()
+            transcription = await client.audio.transcriptions.create(
+                file=upload,
+                model=model,
+                prompt=prompt,
+                response_format=TRANSCRIPTION_RESPONSE_FORMAT,
+                language=language,
+                temperature=0.0
+            )
+            observe("request_seconds", time.perf_counter() - started, model=model)
+        return transcription, {}
+
+    _, transcription = await rate_limiter.call_async(request, model, fallback_models=())
+    return transcription.text, parse_segments(transcription)
+
+
+async def iter_chunk_transcripts(client, path, max_concurrency=MAX_WORKERS):
+    """
+    Yields (text, segments, start) for each audio chunk in order, as soon as it and every chunk before it are done.
+    Chunks are encoded and transcribed concurrently, so later chunks are in flight while earlier text is consumed.
+    """
+    if not await asyncio.to_thread(needs_chunking, path):
+        yield (*await transcribe_file_async(client, path), 0.0)
+        return
+
+    output_dir = tempfile.mkdtemp(prefix="scribewizard_chunks_")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def transcribe_chunk(chunk):
+        async with semaphore:
+            await asyncio.to_thread(encode_chunk, path, chunk, output_dir)
+            return (*await transcribe_file_async(client, chunk.path), chunk.start)
+
+    tasks = []
+    try:
+        chunks = await asyncio.to_thread(plan_audio_chunks, path)
+        print(f"Transcribing {len(chunks)} chunks with {max_concurrency} concurrent requests")
+        tasks = [asyncio.create_task(transcribe_chunk(chunk)) for chunk in chunks]
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+async def iter_stream_chunk_transcripts(client, url, max_concurrency=MAX_WORKERS):
+    """
+    Yields (text, segments, start) for each streamed YouTube chunk in order. ffmpeg produces segments in a worker thread
+    while earlier segments are already being transcribed.
+    """
+    output_dir = tempfile.mkdtemp(prefix="scribewizard_stream_")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = asyncio.Queue()
+
+    async def transcribe_chunk(chunk):
+        async with semaphore:
+            return (*await transcribe_file_async(client, chunk.path), chunk.start)
+
+    async def produce():
+        chunks = stream_video_audio_chunks(url, output_dir)
+        try:
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                await tasks.put(asyncio.create_task(transcribe_chunk(chunk)))
+        finally:
+            await tasks.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (task := await tasks.get()) is not None:
+            yield await task
+        await producer
+    finally:
+        producer.cancel()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+async def request_outline_async(client, messages, model, max_tokens):
+    async def request(chosen_model):
+        with span("outline_request", model=chosen_model):
+            started = time.perf_counter()
+            response = await create_completion_async(client, **outline_request_options(chosen_model, messages, max_tokens))
+            observe("request_seconds", time.perf_counter() - started, model=chosen_model)
+        return response
+
+    # Outlines are cached under the requested model, so they wait for it instead of falling back
+    model, completion = await rate_limiter.call_async(request, model, estimate_request_tokens(json.dumps(messages), max_tokens), fallback_models=())
+    return statistics_from_usage(completion.usage, model), completion.choices[0].message.content
+
+
+async def merge_window_outlines(client, window_tasks, model):
+    results = await asyncio.gather(*window_tasks)
+    total_statistics, partial_outlines = parse_partial_outlines(results, model)
+    merge_statistics, merged = await request_outline_async(client, merge_messages(partial_outlines), model, MERGE_MAX_TOKENS)
+    total_statistics.add(merge_statistics)
+    return total_statistics, check_merged_outline(merged, partial_outlines)
+
+
+async def generate_outline_async(client, transcript, model):
+    """
+    Outlines a transcript that is already complete, using the same windowing as outline.generate_outline.
+    """
+    await asyncio.to_thread(reuse_similar_outline, transcript, model)
+    cached_structure = disk_cache.get(outline_cache_key(transcript, model))
+    if cached_structure is not None:
+        return GenerationStatistics(model_name=model), cached_structure
+
+    windower = TranscriptWindower(outline_window_chars(model))
+    windows = windower.add(transcript) + windower.finish()
+    if len(windows) <= 1:
+        result = await request_outline_async(client, outline_messages(transcript), model, 8000)
+    else:
+        window_tasks = [request_outline_async(client, partial_outline_messages(window, index, len(windows)), model, PARTIAL_OUTLINE_MAX_TOKENS)
+                        for index, window in enumerate(windows)]
+        result = await merge_window_outlines(client, window_tasks, model)
+    disk_cache.set(outline_cache_key(transcript, model), result[1])
+    return result
+
+
+async def transcribe_and_outline(client, audio_file_path, outline_model=DEFAULT_OUTLINE_MODEL, youtube_video_id=None, on_status=print, on_preprocess=None):
+    """
+    Transcribes an audio file and outlines it with the stages overlapped. Audio is preprocessed first, as in
+    engine.transcribe_audio. Returns the transcript, the outline statistics and the outline JSON.
+    """
+    with span("hash_file"):
+        cache_key = transcript_cache_key(await asyncio.to_thread(hash_file, audio_file_path))
+    transcript = disk_cache.get(cache_key)
+    if transcript is not None:
+        outline_statistics, notes_structure = await generate_outline_async(client, transcript, outline_model)
+        return transcript, outline_statistics, notes_structure
+
+    on_status("Transcribing audio in background....")
+    cache_keys = [cache_key, youtube_transcript_cache_key(youtube_video_id) if youtube_video_id else None]
+    if not can_preprocess_audio():
+        return await outline_while_transcribing(client, iter_chunk_transcripts(client, audio_file_path), outline_model, cache_keys, on_status)
+
+    output_dir = tempfile.mkdtemp(prefix="scribewizard_preprocess_")
+    try:
+        preprocess_result = await asyncio.to_thread(preprocess_audio, audio_file_path, output_dir)
+        if on_preprocess:
+            on_preprocess(preprocess_result)
+        return await outline_while_transcribing(client, iter_chunk_transcripts(client, preprocess_result.path), outline_model, cache_keys, on_status,
+                                                preprocess_result.offset_map)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, output_dir, True)
+
+
+async def outline_while_transcribing(client, chunk_transcripts, outline_model, transcript_cache_keys, on_status=print, offset_map=None):
+    """
+    Consumes chunk transcripts in order and sends every outline window as soon as enough text has arrived,
+    while later chunks are still being transcribed. The finished transcript is cached under transcript_cache_keys,
+    and its timeline, mapped back onto the original audio through offset_map, with engine.save_timeline.
+    """
+    stitcher = TranscriptStitcher()
+    windower = TranscriptWindower(outline_window_chars(outline_model))
+    window_tasks = []
+
+    def start_windows(windows):
+        for window in windows:
+            messages = partial_outline_messages(window, len(window_tasks))
+            window_tasks.append(asyncio.create_task(request_outline_async(client, messages, outline_model, PARTIAL_OUTLINE_MAX_TOKENS)))
+
+    try:
+        async for piece in chunk_transcripts:
+            start_windows(windower.add(stitcher.add(*piece)))
+
+        transcript = stitcher.get_text()
+        for cache_key in transcript_cache_keys:
+            if cache_key:
+                disk_cache.set(cache_key, transcript)
+        timeline = stitcher.timeline
+        save_timeline(transcript, timeline.map_times(offset_map.to_original) if offset_map is not None else timeline)
+        if await asyncio.to_thread(reuse_similar_outline, transcript, outline_model) is not None:
+            # A near-duplicate was outlined before, so the windows still outlining are dropped
+            return transcript, GenerationStatistics(model_name=outline_model), disk_cache.get(outline_cache_key(transcript, outline_model))
+
+        remaining_windows = windower.finish()
+        if not window_tasks and len(remaining_windows) <= 1:
+            on_status("Generating notes structure....")
+            outline_statistics, notes_structure = await request_outline_async(client, outline_messages(transcript), outline_model, 8000)
+        else:
+            start_windows(remaining_windows)
+            on_status("Generating notes structure....")
+            outline_statistics, notes_structure = await merge_window_outlines(client, window_tasks, outline_model)
+    finally:
+        for task in window_tasks:
+            task.cancel()
+
+    disk_cache.set(outline_cache_key(transcript, outline_model), notes_structure)
+    return transcript, outline_statistics, notes_structure
+
+
+async def generate_section_async(client, transcript_excerpts, other_sections, section, model=DEFAULT_CONTENT_MODEL):
+    """
+    Async version of engine.generate_section, sharing its prompt and cache entries.
+    """
+    messages = section_messages(transcript_excerpts, other_sections, section)
+    cache_key = section_cache_key(transcript_excerpts, other_sections, section, model)
+    cached_section = disk_cache.get(cache_key)
+    if cached_section is not None:
+        yield cached_section
+        return
+
+    timer = None
+
+    async def request(chosen_model):
+        nonlocal timer
+        timer = StreamTimer(chosen_model)
+        return await create_completion_async(
+            client,
+            model=chosen_model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=8000,
+            top_p=1,
+            stream=True,
+            stop=None,
+        )
+
+    with span("section", model=model) as attributes:
+        model, stream = await rate_limiter.call_async(request, model, estimate_request_tokens(json.dumps(messages), 8000))
+        attributes["model"] = model
+
+        section_content = []
+        async for chunk in stream:
+            tokens = chunk.choices[0].delta.content
+            if tokens:
+                timer.tick()
+                section_content.append(tokens)
+                yield tokens
+            if x_groq := chunk.x_groq:
+                if not x_groq.usage:
+                    continue
+                yield statistics_from_usage(x_groq.usage, model)
+
+    disk_cache.set(section_cache_key(transcript_excerpts, other_sections, section, model), "".join(section_content))
+
+
+async def generate_sections_async(client, transcript, notes_structure, content_model=DEFAULT_CONTENT_MODEL, outline_statistics=None,
+                                  max_concurrent_sections=MAX_CONCURRENT_SECTIONS, on_chunk=None, on_statistics=None, job=None):
+    """
+    Generates every section of a parsed outline as concurrent tasks and returns a NotesResult.
+    With a jobs.Job, finished sections are checkpointed and the ones already saved with the same inputs are not generated again.
+    Sections of an outline reused from a near-duplicate transcript are reused too when their excerpts barely changed.
+    Raises json.JSONDecodeError if the outline is not valid JSON.
+    """
+    structure = json.loads(notes_structure)
+    contents = SectionStore(structure)
+    content_statistics = GenerationStatistics(model_name=content_model)
+    prompts = section_prompts(transcript, structure)
+    inputs = {title: section_inputs_key(section, transcript_excerpts, content_model) for title, section, transcript_excerpts, _ in prompts}
+    completed = restore_sections(job.get_sections(), job.get_section_inputs(), inputs, contents, content_statistics, on_chunk,
+                                 on_statistics) if job is not None else []
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_sections))
+    errors = []
+
+    async def generate_leaf(title, section, transcript_excerpts, other_sections):
+        submitted = time.perf_counter()
+        section_statistics = GenerationStatistics(model_name=content_model)
+        async with semaphore:
+            if errors:
+                return  # Another section failed; as in sections.SectionDispatcher, only started sections finish
+            observe("queue_seconds", time.perf_counter() - submitted, stage="section_worker")
+            try:
+                async for chunk in generate_section_async(client, transcript_excerpts, other_sections, section, model=content_model):
+                    if type(chunk) == GenerationStatistics:
+                        section_statistics.model_name = chunk.model_name
+                        section_statistics.add(chunk)
+                        content_statistics.add(chunk)
+                        if on_statistics:
+                            on_statistics(content_statistics)
+                    else:
+                        contents.append(title, chunk)
+                        if on_chunk:
+                            on_chunk(title, chunk)
+            except Exception as e:
+                errors.append(e)
+                return
+        if job is not None:
+            # Hashed with the model that wrote the section, as in engine.checkpoint_section
+            job.save_section(title, contents.get(title), section_statistics, section_inputs_key(section, transcript_excerpts, section_statistics.model_name))
+
+    previous_transcript = get_outline_source(transcript, structure)
+    if previous_transcript is not None:
+        await asyncio.to_thread(reuse_similar_sections, prompts, section_prompts(previous_transcript, structure), content_model)
+    await asyncio.gather(*(generate_leaf(*prompt) for prompt in prompts if prompt[0] not in completed))
+    if errors:
+        raise errors[0]
+    return NotesResult(transcript, structure, contents.to_dict(), outline_statistics or GenerationStatistics(model_name=""), content_statistics)
+
+
+async def run_pipeline_async(client, source, output_dir, outline_model=DEFAULT_OUTLINE_MODEL, content_model=DEFAULT_CONTENT_MODEL,
+                             max_concurrent_sections=MAX_CONCURRENT_SECTIONS, pdf=True, on_status=print, formats=(), job=None):
+    """
+    Async version of engine.run_pipeline. Blocking work (downloads, ffmpeg, file writes and PDF rendering)
+    runs in worker threads so one event loop can serve many pipelines at once. A jobs.Job is checkpointed and
+    resumed as in engine.run_pipeline.
+    """
+    preprocess_results = []
+    youtube_video_id = get_youtube_video_id(source) if is_youtube_link(source) else None
+    transcript = disk_cache.get(youtube_transcript_cache_key(youtube_video_id)) if youtube_video_id else None
+    if job is not None and job.transcript is not None:
+        transcript = job.transcript
+
+    if job is not None and job.structure is not None:
+        outline_statistics, notes_structure = job.outline_statistics, json.dumps(job.structure)
+    elif transcript is not None:
+        on_status("Generating notes structure....")
+        outline_statistics, notes_structure = await generate_outline_async(client, transcript, outline_model)
+    elif is_youtube_link(source) and can_stream_youtube_audio():
+        on_status("Streaming and transcribing audio from YouTube link ....")
+        cache_keys = [youtube_transcript_cache_key(youtube_video_id) if youtube_video_id else None]
+        transcript, outline_statistics, notes_structure = await outline_while_transcribing(client, iter_stream_chunk_transcripts(client, source),
+                                                                                           outline_model, cache_keys, on_status)
+    elif is_youtube_link(source):
+        on_status("Downloading audio from YouTube link ....")
+        with span("download"):
+            audio_file_path = await asyncio.to_thread(download_video_audio, source)
+        if audio_file_path is None:
+            raise ValueError("Failed to download audio from YouTube link. Please try again.")
+        add_bytes("download", os.path.getsize(audio_file_path))
+        try:
+            transcript, outline_statistics, notes_structure = await transcribe_and_outline(client, audio_file_path, outline_model, youtube_video_id,
+                                                                                          on_status, preprocess_results.append)
+        finally:
+            await asyncio.to_thread(delete_download, audio_file_path)
+    else:
+        transcript, outline_statistics, notes_structure = await transcribe_and_outline(client, source, outline_model, on_status=on_status,
+                                                                                      on_preprocess=preprocess_results.append)
+
+    if job is not None and job.structure is None:
+        job.save_transcript(transcript)
+        job.save_outline(json.loads(notes_structure), outline_statistics)
+
+    on_status("Generating notes ...")
+    result = await generate_sections_async(client, transcript, notes_structure, content_model, outline_statistics, max_concurrent_sections, job=job)
+    result.preprocessing = preprocess_results[0] if preprocess_results else None
+    outputs = await asyncio.to_thread(write_outputs, result, output_dir, pdf, formats)
+    return result, outputs
@@ -0,0 +1,193 @@
+"""
+Stand-ins for the Groq and AsyncGroq clients that replay recorded responses with simulated latency and token rates,
+so the pipeline can be benchmarked without an API key or network access.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+DEFAULT_RECORDING = os.path.join(RECORDINGS_DIR, "transformers_lecture.json")
+CHARS_PER_TOKEN = 4
+
+
+class MockProfile:
+    """
+    Latency model of the mocked API. Times are in seconds, rates in tokens or bytes per second.
+    """
+    def __init__(self, request_latency=0.05, queue_time=0.01, input_tokens_per_second=5000, output_tokens_per_second=800,
+                 transcription_latency=0.3, upload_bytes_per_second=20 * 1024 * 1024, audio_seconds_per_second=150):
+        self.request_latency = request_latency
+        self.queue_time = queue_time
+        self.input_tokens_per_second = input_tokens_per_second
+        self.output_tokens_per_second = output_tokens_per_second
+        self.transcription_latency = transcription_latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.audio_seconds_per_second = audio_seconds_per_second
+
+    def scaled(self, speed):
+        """
+        Returns a copy that runs speed times faster, keeping the ratios between stages.
+        """
+        return MockProfile(self.request_latency / speed, self.queue_time / speed, self.input_tokens_per_second * speed,
+                           self.output_tokens_per_second * speed, self.transcription_latency / speed,
+                           self.upload_bytes_per_second * speed, self.audio_seconds_per_second * speed)
+
+
+def load_recording(path=DEFAULT_RECORDING):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def count_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_tokens(text):
+    """
+    Splits text into stream deltas of roughly one token each, keeping whitespace so they join back exactly.
+    """
+    return re.findall(r"\s*\S{1,4}|\s+", text)
+
+
+def make_usage(profile, prompt_tokens, completion_tokens):
+    prompt_time = prompt_tokens / profile.input_tokens_per_second
+    completion_time = completion_tokens / profile.output_tokens_per_second
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens,
+                           prompt_time=prompt_time, completion_time=completion_time, queue_time=profile.queue_time,
+                           total_time=profile.queue_time + prompt_time + completion_time)
+
+
+def make_segments(text, duration):
+    """
+    Splits text into verbose_json segments of one sentence each, with times spread evenly over duration seconds.
+    """
+    sentences = re.findall(r"\S.*?(?:[.!?](?=\s)|$)", text, re.S)
+    step = duration / max(len(sentences), 1)
+    return [{"id": index, "start": index * step, "end": (index + 1) * step, "text": " " + sentence} for index, sentence in enumerate(sentences)]
+
+
+def make_completion(content, usage):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")], usage=usage)
+
+
+def make_chunk(content=None, usage=None):
+    # Groq sends usage in an x_groq field on the last chunk of a stream
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason="stop" if usage else None)],
+                           x_groq=SimpleNamespace(usage=usage) if usage else None)
+
+
+class MockBackend:
+    """
+    Builds responses from a recording and counts every call by endpoint and model.
+    """
+    def __init__(self, recording=None, profile=None):
+        self.recording = recording or load_recording()
+        self.profile = profile or MockProfile()
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def count_call(self, endpoint, model):
+        with self.lock:
+            self.calls[f"{endpoint}:{model}"] += 1
+
+    def transcription(self, file, model, response_format="json"):
+        self.count_call("audio.transcriptions", model)
+        name, data = file if isinstance(file, tuple) else (getattr(file, "name", "audio"), file)
+        if hasattr(data, "read"):
+            data = data.read()
+        # Opus speech chunks are about 3 KB per second of audio, so the size gives a rough duration
+        audio_seconds = len(data) / 3000
+        delay = (self.profile.transcription_latency + len(data) / self.profile.upload_bytes_per_second
+                 + audio_seconds / self.profile.audio_seconds_per_second)
+        text = self.recording["transcription"]
+        if response_format == "verbose_json":
+            return delay, SimpleNamespace(text=text, segments=make_segments(text, audio_seconds))
+        return delay, SimpleNamespace(text=text)
+
+    def completion_content(self, messages, response_format):
+        # Streamed outlines can't use JSON mode, so outline requests are also recognised by their system prompt
+        if (response_format and response_format.get("type") == "json_object") or messages[0]["content"].startswith("Write in JSON format"):
+            return json.dumps(self.recording["outline"])
+        return self.recording["section"]
+
+    def completion(self, model, messages, response_format=None):
+        self.count_call("chat.completions", model)
+        content = self.completion_content(messages, response_format)
+        usage = make_usage(self.profile, count_tokens(json.dumps(messages)), count_tokens(content))
+        delay = self.profile.request_latency + usage.total_time
+        return delay, make_completion(content, usage)
+
+    def stream(self, model, messages):
+        """
+        Returns the delay before the first token, the per-token delay and the chunks of a streamed completion.
+        """
+        self.count_call("chat.completions.stream", model)
+        content = self.completion_content(messages, None)
+        usage = make_usage(self.profile, count_tokens(json.dumps(messages)), count_tokens(content))
+        chunks = [make_chunk(token) for token in split_tokens(content)] + [make_chunk(usage=usage)]
+        first_token_delay = self.profile.request_latency + self.profile.queue_time + usage.prompt_time
+        return first_token_delay, 1 / self.profile.output_tokens_per_second, chunks
+
+
+class MockGroq:
+    """
+    Replaces groq.Groq for benchmarks. Only the endpoints the pipeline uses are implemented.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend or MockBackend()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._create_transcription))
+
+    def _create_completion(self, model, messages, stream=False, response_format=None, **kwargs):
+        if not stream:
+            delay, completion = self.backend.completion(model, messages, response_format)
+            time.sleep(delay)
+            return completion
+        first_token_delay, token_delay, chunks = self.backend.stream(model, messages)
+        time.sleep(first_token_delay)
+
+        def iterate():
+            for chunk in chunks:
+                yield chunk
+                time.sleep(token_delay)
+        return iterate()
+
+    def _create_transcription(self, file, model, response_format="json", **kwargs):
+        delay, transcription = self.backend.transcription(file, model, response_format)
+        time.sleep(delay)
+        return transcription
+
+
+class MockAsyncGroq:
+    """
+    Replaces groq.AsyncGroq for benchmarks, sleeping on the event loop instead of blocking.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend or MockBackend()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._create_transcription))
+
+    async def _create_completion(self, model, messages, stream=False, response_format=None, **kwargs):
+        if not stream:
+            delay, completion = self.backend.completion(model, messages, response_format)
+            await asyncio.sleep(delay)
+            return completion
+        first_token_delay, token_delay, chunks = self.backend.stream(model, messages)
+        await asyncio.sleep(first_token_delay)
+
+        async def iterate():
+            for chunk in chunks:
+                yield chunk
+                await asyncio.sleep(token_delay)
+        return iterate()
+
+    async def _create_transcription(self, file, model, response_format="json", **kwargs):
+        delay, transcription = self.backend.transcription(file, model, response_format)
+        await asyncio.sleep(delay)
+        return transcription
@@ -0,0 +1,99 @@
+"""
+Compares the cost of streaming tokens into the notes view with per-token string rebuilding (the old NoteSection)
+against SectionStore with batched flushes, as a section grows.
+
+    python benchmarks/note_rendering.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sections import SectionStore, format_section_markdown  # noqa: E402
+
+TOKEN = "token "
+CHECKPOINTS = (1000, 5000, 20000, 50000)
+OTHER_SECTIONS = 20
+OTHER_SECTION_TOKENS = 2000
+FLUSH_EVERY = 40  # Tokens per UI flush at about 500 tokens/s and a 75 ms flush interval
+
+
+def build_structure():
+    structure = {f"Section {index}": "description" for index in range(OTHER_SECTIONS)}
+    structure["Streaming section"] = "description"
+    return structure
+
+
+def render(title, content):
+    # Stands in for st.empty().markdown, which has to serialize the whole section every time it is called
+    return f"## {title}\n{content}"
+
+
+def run_naive(structure, checkpoints):
+    contents = {title: TOKEN * OTHER_SECTION_TOKENS for title in structure}
+    contents["Streaming section"] = ""
+    timings = []
+    started = time.perf_counter()
+    count = 0
+    for checkpoint in checkpoints:
+        window_started = time.perf_counter()
+        while count < checkpoint:
+            contents["Streaming section"] += TOKEN
+            render("Streaming section", contents["Streaming section"])
+            count += 1
+        timings.append(time.perf_counter() - window_started)
+    document = "".join(format_section_markdown(title, contents[title]) for title in structure)
+    return timings, time.perf_counter() - started, len(document)
+
+
+def run_store(structure, checkpoints):
+    store = SectionStore(structure)
+    for title in structure:
+        if title != "Streaming section":
+            store.append(title, TOKEN * OTHER_SECTION_TOKENS)
+    store.take_updated()
+    timings = []
+    append_timings = []
+    started = time.perf_counter()
+    count = 0
+    for checkpoint in checkpoints:
+        window_started = time.perf_counter()
+        append_time = 0.0
+        while count < checkpoint:
+            append_started = time.perf_counter()
+            store.append("Streaming section", TOKEN)
+            append_time += time.perf_counter() - append_started
+            count += 1
+            if count % FLUSH_EVERY == 0:
+                for title in store.take_updated():
+                    render(title, store.get(title))
+        timings.append(time.perf_counter() - window_started)
+        append_timings.append(append_time)
+    document = store.get_markdown_content()
+    return timings, time.perf_counter() - started, len(document), append_timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=list(CHECKPOINTS), help="Section lengths in tokens to report at.")
+    args = parser.parse_args(argv)
+
+    structure = build_structure()
+    naive_timings, naive_total, naive_length = run_naive(structure, args.checkpoints)
+    store_timings, store_total, store_length, append_timings = run_store(structure, args.checkpoints)
+    assert naive_length == store_length, "Both views must render the same document"
+
+    print("| Section length (tokens) | Rebuild per token (µs/token) | SectionStore with flush (µs/token) | SectionStore append (µs/token) |")
+    print("|-------------------------|------------------------------|------------------------------------|--------------------------------|")
+    previous = 0
+    for checkpoint, naive_time, store_time, append_time in zip(args.checkpoints, naive_timings, store_timings, append_timings):
+        tokens = checkpoint - previous
+        print(f"| {previous}–{checkpoint} | {naive_time / tokens * 1e6:.2f} | {store_time / tokens * 1e6:.2f} | {append_time / tokens * 1e6:.3f} |")
+        previous = checkpoint
+    print(f"\nTotal: {naive_total:.2f}s rebuilding per token, {store_total:.2f}s with SectionStore ({naive_total / store_total:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
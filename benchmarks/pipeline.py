@@ -0,0 +1,225 @@
+"""
+Runs the full pipeline against a mock Groq backend and reports end-to-end latency, token throughput,
+peak memory and API call counts, flagging regressions against a stored baseline.
+
+    python benchmarks/pipeline.py                      # run every scenario and compare with baseline.json
+    python benchmarks/pipeline.py --async              # same, through async_engine
+    python benchmarks/pipeline.py --update-baseline    # record the current numbers as the baseline
+
+Scenarios are the sample recordings under assets/audio (plus any --audio files) and synthetic transcripts of
+--transcript-words words.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Benchmarks always start from an empty cache of their own, never the app's
+os.environ["SCRIBEWIZARD_CACHE_DIR"] = tempfile.mkdtemp(prefix="scribewizard_benchmark_cache_")
+
+from cache import disk_cache  # noqa: E402
+from rate_limit import rate_limiter  # noqa: E402
+from tracing import Tracer, use_tracer  # noqa: E402
+from engine import run_pipeline, generate_notes, DEFAULT_OUTLINE_MODEL, DEFAULT_CONTENT_MODEL  # noqa: E402
+from async_engine import run_pipeline_async, generate_outline_async, generate_sections_async  # noqa: E402
+from mock_groq import MockBackend, MockGroq, MockAsyncGroq, MockProfile, load_recording, DEFAULT_RECORDING  # noqa: E402
+
+AUDIO_DIR = os.path.join(ROOT_DIR, "assets", "audio")
+AUDIO_EXTENSIONS = ("*.m4a", "*.mp3", "*.wav")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TRANSCRIPT_WORDS = (10000, 50000)
+REGRESSION_TOLERANCE = 0.2  # Relative slowdown (or memory growth) allowed before a metric is flagged
+
+
+def synthetic_transcript(recording, words):
+    """
+    Builds a transcript of about the given number of words by repeating the recorded one, numbering each
+    repetition so windows and retrieved segments stay distinguishable.
+    """
+    base = recording["transcription"].split()
+    parts = []
+    count = 0
+    part = 0
+    while count < words:
+        part += 1
+        text = f"Part {part}. " + " ".join(base[:words - count])
+        parts.append(text)
+        count += min(len(base), words - count)
+    return " ".join(parts)
+
+
+def get_scenarios(args, recording):
+    scenarios = []
+    audio_paths = [path for pattern in AUDIO_EXTENSIONS for path in sorted(glob.glob(os.path.join(AUDIO_DIR, pattern)))]
+    for path in audio_paths + (args.audio or []):
+        scenarios.append((f"audio_{os.path.splitext(os.path.basename(path))[0]}", "audio", os.path.abspath(path)))
+    for words in args.transcript_words:
+        scenarios.append((f"transcript_{words}", "transcript", synthetic_transcript(recording, words)))
+    if args.scenario:
+        scenarios = [scenario for scenario in scenarios if scenario[0] in args.scenario]
+    return scenarios
+
+
+def run_sync(backend, kind, source, output_dir, args):
+    client = MockGroq(backend)
+    if kind == "audio":
+        result, _ = run_pipeline(client, source, output_dir, outline_model=args.outline_model, content_model=args.content_model, pdf=args.pdf,
+                                 on_status=lambda text: None)
+        return result
+    return generate_notes(client, source, outline_model=args.outline_model, content_model=args.content_model, on_status=lambda text: None)
+
+
+async def run_async(backend, kind, source, output_dir, args):
+    client = MockAsyncGroq(backend)
+    if kind == "audio":
+        result, _ = await run_pipeline_async(client, source, output_dir, outline_model=args.outline_model, content_model=args.content_model,
+                                             pdf=args.pdf, on_status=lambda text: None)
+        return result
+    outline_statistics, notes_structure = await generate_outline_async(client, source, args.outline_model)
+    return await generate_sections_async(client, source, notes_structure, args.content_model, outline_statistics)
+
+
+def run_scenario(name, kind, source, args, recording, profile):
+    """
+    Runs one scenario args.repeat times from a cold cache and returns its metrics, using the median latency.
+    """
+    runs = []
+    for _ in range(args.repeat):
+        disk_cache.clear()
+        backend = MockBackend(recording, profile)
+        output_dir = tempfile.mkdtemp(prefix="scribewizard_benchmark_output_")
+        tracer = Tracer(name)
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            with use_tracer(tracer):
+                if args.use_async:
+                    result = asyncio.run(run_async(backend, kind, source, output_dir, args))
+                else:
+                    result = run_sync(backend, kind, source, output_dir, args)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        latency = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1]
+
+        output_tokens = result.outline_statistics.output_tokens + result.content_statistics.output_tokens
+        ttft = tracer.metrics.get_histograms("ttft_seconds")
+        section_stage = [stage for stage in tracer.get_stages() if stage["stage"] == "section"]
+        runs.append({
+            "latency": latency,
+            "output_tokens": output_tokens,
+            "tokens_per_second": output_tokens / latency if latency else 0,
+            "ttft_p50": statistics.median([histogram.quantile(0.5) for histogram in ttft.values()]) if ttft else 0,
+            "first_section": section_stage[0]["start"] if section_stage else 0,  # When the first section request went out
+            "peak_memory_mb": peak_memory / 1e6,
+            "api_calls": sum(backend.calls.values()),
+            "calls": dict(backend.calls),
+            "sections": len(result.contents),
+        })
+    runs.sort(key=lambda run: run["latency"])
+    return runs[len(runs) // 2]
+
+
+def compare(name, metrics, baseline, tolerance):
+    """
+    Returns a description of every metric that is worse than the baseline by more than tolerance.
+    """
+    regressions = []
+    if metrics["latency"] > baseline["latency"] * (1 + tolerance):
+        regressions.append(f"latency {baseline['latency']:.2f}s → {metrics['latency']:.2f}s")
+    if metrics["tokens_per_second"] < baseline["tokens_per_second"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['tokens_per_second']:.0f} → {metrics['tokens_per_second']:.0f} T/s")
+    if "first_section" in baseline and metrics["first_section"] > baseline["first_section"] * (1 + tolerance):
+        regressions.append(f"first section {baseline['first_section']:.2f}s → {metrics['first_section']:.2f}s")
+    if metrics["peak_memory_mb"] > baseline["peak_memory_mb"] * (1 + tolerance):
+        regressions.append(f"peak memory {baseline['peak_memory_mb']:.1f} → {metrics['peak_memory_mb']:.1f} MB")
+    if metrics["api_calls"] > baseline["api_calls"]:
+        regressions.append(f"API calls {baseline['api_calls']} → {metrics['api_calls']}")
+    return [f"{name}: {regression}" for regression in regressions]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ScribeWizard pipeline against a mock Groq backend.")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario. Can be repeated.")
+    parser.add_argument("--audio", action="append", help="Also benchmark this audio file. Can be repeated.")
+    parser.add_argument("--transcript-words", type=int, nargs="*", default=list(TRANSCRIPT_WORDS), help="Sizes of the synthetic transcripts.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the median is reported.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run through async_engine instead of engine.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Make the mock API this many times faster.")
+    parser.add_argument("--recording", default=DEFAULT_RECORDING, help="JSON file with the recorded responses to replay.")
+    parser.add_argument("--outline-model", default=DEFAULT_OUTLINE_MODEL)
+    parser.add_argument("--content-model", default=DEFAULT_CONTENT_MODEL)
+    parser.add_argument("--pdf", action="store_true", help="Also render notes.pdf for audio scenarios.")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the free tier rate limits instead of disabling them.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--output", help="Also write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    if not args.rate_limits:
+        # The mock has its own latency model; waiting on real free tier budgets would only measure the limiter
+        rate_limiter.limits = {}
+        rate_limiter.default_limit = {"requests": 10 ** 9, "tokens": 10 ** 12}
+
+    recording = load_recording(args.recording)
+    profile = MockProfile().scaled(args.speed)
+    mode = "async" if args.use_async else "sync"
+    if args.speed != 1.0:
+        mode += f"@{args.speed:g}x"  # Results at other mock speeds are kept apart from the 1x baseline
+    scenarios = get_scenarios(args, recording)
+    if not os.path.isdir(AUDIO_DIR):
+        print(f"No sample audio in {AUDIO_DIR}")
+
+    tracemalloc.start()
+    results = {}
+    print("| Scenario | Latency (s) | First section (s) | Output tokens | T/s | TTFT p50 (s) | Peak memory (MB) | API calls |")
+    print("|----------|-------------|-------------------|---------------|-----|--------------|------------------|-----------|")
+    for name, kind, source in scenarios:
+        metrics = run_scenario(name, kind, source, args, recording, profile)
+        results[f"{mode}/{name}"] = metrics
+        print(f"| {mode}/{name} | {metrics['latency']:.2f} | {metrics['first_section']:.2f} | {metrics['output_tokens']} | {metrics['tokens_per_second']:.0f} | "
+              f"{metrics['ttft_p50']:.2f} | {metrics['peak_memory_mb']:.1f} | {metrics['api_calls']} |")
+    tracemalloc.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    regressions = []
+    for key, metrics in results.items():
+        if key in baseline:
+            regressions += compare(key, metrics, baseline[key], args.tolerance)
+        else:
+            print(f"No baseline for {key}")
+    if regressions:
+        print("\nRegressions against baseline:\n" + "\n".join(f"- {regression}" for regression in regressions))
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
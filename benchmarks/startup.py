@@ -0,0 +1,132 @@
+"""
+Measures cold start: how long each entry point takes to import and which heavy modules it loads, and the latency of
+the first and following API requests with a new client per request versus the shared client pool.
+
+    python benchmarks/startup.py                                  # against a local stand-in for the API
+    python benchmarks/startup.py --base-url https://api.groq.com  # against the real API, using GROQ_API_KEY
+
+The local server waits --connect-latency seconds before accepting each new connection, standing in for the TCP
+and TLS handshakes that a kept-alive connection skips.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+ENTRY_POINTS = {
+    "engine": "import engine",
+    "app": "import streamlit, engine, runner, export, jobs, media, clients",
+    "batch": "import scribewizard",
+}
+HEAVY_MODULES = ("groq", "httpx", "yt_dlp", "numpy", "weasyprint", "streamlit")
+CONNECT_LATENCY = 0.1  # Seconds; about two round trips to a distant API for TCP and TLS 1.3
+REQUESTS = 10
+
+
+def measure_import(statement):
+    """
+    Imports in a fresh interpreter and returns the seconds taken and the heavy modules that were loaded.
+    """
+    code = (f"import sys, time, json\nstarted = time.perf_counter()\n{statement}\n"
+            f"print(json.dumps([time.perf_counter() - started, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+    seconds, modules = json.loads(output.strip().splitlines()[-1])
+    return seconds, modules
+
+
+class ModelsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keeps connections alive between requests
+    disable_nagle_algorithm = True  # Otherwise the separate header and body writes wait on delayed ACKs
+
+    def do_GET(self):
+        body = json.dumps({"object": "list", "data": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowConnectServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connect_latency = CONNECT_LATENCY
+
+    def get_request(self):
+        request = super().get_request()
+        time.sleep(self.connect_latency)
+        return request
+
+
+def start_server(connect_latency):
+    server = SlowConnectServer(("127.0.0.1", 0), ModelsHandler)
+    server.connect_latency = connect_latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def measure_requests(get_client, requests):
+    """
+    Returns the seconds each request took, including getting its client.
+    """
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        get_client().models.list()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ScribeWizard's import time and first-request latency.")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per entry point; the median is reported.")
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="Requests per client strategy.")
+    parser.add_argument("--connect-latency", type=float, default=CONNECT_LATENCY, help="Delay before the local server accepts a connection.")
+    parser.add_argument("--base-url", help="Send requests to this API instead of a local server.")
+    args = parser.parse_args(argv)
+
+    print("| Entry point | Import (s) | Heavy modules loaded |")
+    print("|-------------|------------|----------------------|")
+    for name, statement in ENTRY_POINTS.items():
+        runs = [measure_import(statement) for _ in range(args.repeat)]
+        seconds = statistics.median(run[0] for run in runs)
+        print(f"| {name} | {seconds:.2f} | {', '.join(runs[-1][1]) or '-'} |")
+
+    server = None
+    if args.base_url:
+        os.environ["GROQ_BASE_URL"] = args.base_url
+    else:
+        server, os.environ["GROQ_BASE_URL"] = start_server(args.connect_latency)
+        os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+    from groq import Groq
+    from clients import ClientPool
+    from rate_limit import CLIENT_MAX_RETRIES
+    pool = ClientPool()
+    strategies = {
+        "client per request": lambda: Groq(max_retries=CLIENT_MAX_RETRIES),
+        "shared pool": lambda: pool.get(),
+    }
+    print("\n| Clients | First request (s) | Later requests p50 (s) |")
+    print("|---------|-------------------|------------------------|")
+    for name, get_client in strategies.items():
+        timings = measure_requests(get_client, args.requests)
+        later = statistics.median(timings[1:]) if len(timings) > 1 else float("nan")
+        print(f"| {name} | {timings[0]:.3f} | {later:.3f} |")
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("SCRIBEWIZARD_CACHE_DIR", "./cache")
+CACHE_MAX_SIZE = 500 * 1024 * 1024  # 500 MB
+CACHE_TTL = 30 * 24 * 60 * 60  # 30 days
+
+YOUTUBE_ID_PATTERN = re.compile(r"(?:v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})")
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hash_bytes(text.encode("utf-8"))
+
+
+def hash_file(path, block_size=1024 * 1024) -> str:
+    """
+    Hashes a file in blocks so large audio is never held in memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(kind: str, *parts) -> str:
+    """
+    Builds a cache key from an artifact kind and everything its content depends on.
+    """
+    return f"{kind}:" + hash_text(json.dumps(parts, sort_keys=True, default=str))
+
+
+def get_youtube_video_id(url: str):
+    """
+    Returns the 11 character video ID of a YouTube URL, or None if one can't be found.
+    """
+    match = YOUTUBE_ID_PATTERN.search(url or "")
+    return match.group(1) if match else None
+
+
+class LazyDatabase:
+    """
+    A SQLite file whose directory and tables are only created on the first connect(), so importing a module that
+    holds a store writes nothing to disk. create_tables(conn) creates the store's schema.
+    """
+    def __init__(self, directory, filename, create_tables):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self.create_tables = create_tables
+        self.initialized = False
+
+    def connect(self):
+        if not self.initialized:
+            os.makedirs(self.directory, exist_ok=True)
+            with sqlite3.connect(self.path, timeout=30) as conn:
+                self.create_tables(conn)
+            self.initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+
+class DiskCache:
+    """
+    Persistent key/value store for JSON-serializable artifacts with TTL expiry and size-bounded LRU eviction.
+    """
+    def __init__(self, directory=CACHE_DIR, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL):
+        self.database = LazyDatabase(directory, "cache.sqlite3", self._create_tables)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def _create_tables(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self.lock, self.database.connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        now = time.time()
+        with self.lock, self.database.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+            self._evict(conn, now)
+
+    def delete(self, key):
+        with self.lock, self.database.connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.lock, self.database.connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def _evict(self, conn, now):
+        """
+        Drops expired entries, then the least recently used ones until the cache fits in max_size.
+        """
+        if self.ttl:
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+
+disk_cache = DiskCache()
@@ -0,0 +1,86 @@
+import hashlib
+import importlib.util
+import threading
+import traceback
+from collections import OrderedDict
+from rate_limit import CLIENT_MAX_RETRIES
+
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 300  # Seconds an idle connection is kept open for the next request
+HTTP2 = importlib.util.find_spec("h2") is not None  # h2 is in requirements.txt; without it httpx falls back to HTTP/1.1
+CLIENT_POOL_SIZE = 32  # API keys whose clients are kept; pasted keys beyond this evict the least recently used
+
+
+def get_http_limits():
+    import httpx
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+
+def get_http_timeout():
+    import httpx
+    return httpx.Timeout(600.0, connect=10.0)
+
+
+def get_pool_key(api_key):
+    # Clients are looked up by a digest, so the pool's keys don't hold the API keys themselves
+    return hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+
+
+class ClientPool:
+    """
+    Process-wide Groq clients, one per API key, shared by every Streamlit session, job and batch worker. Each client
+    keeps its connections alive, so a request only pays for DNS and TLS setup when no idle connection is left.
+    groq and httpx are imported on first use, so starting the app doesn't wait for them.
+    """
+    def __init__(self, max_size=CLIENT_POOL_SIZE):
+        self.max_size = max_size
+        self.clients = OrderedDict()
+        self.warmed = set()
+        self.lock = threading.Lock()
+
+    def get(self, api_key=None):
+        """
+        Returns the shared client for api_key, or for GROQ_API_KEY when it is None.
+        """
+        key = get_pool_key(api_key)
+        with self.lock:
+            if key in self.clients:
+                self.clients.move_to_end(key)
+                return self.clients[key]
+            client = self._create(api_key)
+            self.clients[key] = client
+            # Evicted clients may still be serving a running job, so their connections are left to close with them
+            while len(self.clients) > self.max_size:
+                self.clients.popitem(last=False)
+            return client
+
+    def _create(self, api_key):
+        import httpx
+        from groq import Groq
+        http_client = httpx.Client(limits=get_http_limits(), timeout=get_http_timeout(), http2=HTTP2)
+        return Groq(api_key=api_key, http_client=http_client, max_retries=CLIENT_MAX_RETRIES)
+
+    def warm_up(self, api_key=None):
+        """
+        Creates the client for api_key in a background thread and opens its first connection with a models request,
+        so the first job after a deploy doesn't wait for imports and the TLS handshake. Runs once per key.
+        """
+        key = get_pool_key(api_key)
+        with self.lock:
+            if key in self.warmed:
+                return
+            self.warmed.add(key)
+
+        def warm():
+            try:
+                self.get(api_key).models.list()
+            except Exception:
+                # A failed warm-up only means the first real request sets up the connection itself
+                traceback.print_exc()
+
+        threading.Thread(target=warm, name="scribewizard-client-warm-up", daemon=True).start()
+
+
+client_pool = ClientPool()
@@ -0,0 +1,80 @@
+import json
+import time
+from cache import disk_cache, make_key
+from engine import get_markdown_content, write_document, DEFAULT_OUTLINE_MODEL
+from sections import get_section_levels
+from stats import GenerationStatistics, statistics_from_usage
+from rate_limit import rate_limiter, estimate_request_tokens, create_completion
+from retrieval import truncate_context
+from tracing import span, observe
+
+COURSE_OUTLINE_CHARS = 16000  # Budget for all lecture outlines in the course overview prompt, shared evenly
+COURSE_OVERVIEW_MAX_TOKENS = 2000
+
+
+def format_lecture_outline(structure):
+    return "\n".join(f"{'  ' * (level - 1)}- {title}" for title, level in get_section_levels(structure).items())
+
+
+def course_overview_messages(lectures, max_chars=COURSE_OUTLINE_CHARS):
+    lecture_chars = max_chars // max(len(lectures), 1)
+    outlines = "\n\n".join(f"### Lecture {index + 1}: {title}\n\n{truncate_context(format_lecture_outline(structure), lecture_chars)}"
+                           for index, (title, structure) in enumerate(lectures))
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert writer. Write an overview of a course for the notes of its lectures."
+        },
+        {
+            "role": "user",
+            "content": f"{outlines}\n\n### Instructions\n\nThese are the outlines of the lectures of one course, in order. Summarize what the course covers, how the lectures build on each other and the key concepts that recur across them. Refer to lectures by number. Write in markdown, without a top-level heading."
+        }
+    ]
+
+
+def generate_course_overview(groq_client, lectures, model=DEFAULT_OUTLINE_MODEL):
+    """
+    Writes an overview of a course from the outlines of its lectures, given as (title, structure) pairs. Only the
+    outlines are sent, so one request covers any number of lectures. Returns the statistics and the overview.
+    """
+    messages = course_overview_messages(lectures)
+    cache_key = make_key("course_overview", model, messages)
+    cached_overview = disk_cache.get(cache_key)
+    if cached_overview is not None:
+        return GenerationStatistics(model_name=model), cached_overview
+
+    def request(chosen_model):
+        with span("course_overview", model=chosen_model):
+            started = time.perf_counter()
+            response = create_completion(groq_client, model=chosen_model, messages=messages, max_tokens=COURSE_OVERVIEW_MAX_TOKENS,
+                                         temperature=0.3, top_p=1, stream=False, stop=None)
+            observe("request_seconds", time.perf_counter() - started, model=chosen_model)
+        return response
+
+    model, completion = rate_limiter.call(request, model, estimate_request_tokens(json.dumps(messages), COURSE_OVERVIEW_MAX_TOKENS), fallback_models=())
+    overview = completion.choices[0].message.content
+    disk_cache.set(cache_key, overview)
+    return statistics_from_usage(completion.usage, model), overview
+
+
+def get_course_markdown(overview, lectures):
+    """
+    Joins the overview and the notes of every lecture, given as (title, structure, contents), into one document
+    with each lecture's sections one level below its title.
+    """
+    parts = [f"# Course Overview\n\n{overview.strip()}\n\n"]
+    for index, (title, structure, contents) in enumerate(lectures):
+        parts.append(f"# Lecture {index + 1}: {title}\n\n")
+        parts.append(get_markdown_content(structure, contents, level=2))
+    return "".join(parts)
+
+
+def write_course_notes(groq_client, lectures, output_dir, model=DEFAULT_OUTLINE_MODEL, pdf=True, formats=()):
+    """
+    Writes course_notes.md (and the other formats) for lectures given as (title, structure, contents), in course order.
+    Returns the statistics of the overview and the paths written.
+    """
+    statistics, overview = generate_course_overview(groq_client, [(title, structure) for title, structure, _ in lectures], model)
+    with span("markdown"):
+        markdown_content = get_course_markdown(overview, lectures)
+    return statistics, write_document(markdown_content, output_dir, "course_notes", pdf, formats)
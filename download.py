@@ -1,14 +1,21 @@
 from __future__ import unicode_literals
-import yt_dlp as youtube_dl
 import os
+import re
 import time
 import os
 import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span, add_bytes, bind_tracer
+from rate_limit import backoff_delay
+from cache import get_youtube_video_id
+from transcription import AudioChunk, detect_silences, CHUNK_LENGTH, CHUNK_OVERLAP, SPEECH_SAMPLE_RATE, SPEECH_AUDIO_CODEC, SPEECH_AUDIO_BITRATE, SPEECH_AUDIO_EXTENSION
 
-MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
-FILE_TOO_LARGE_MESSAGE = "The audio file is too large for the current size and rate limits using Whisper. If you used a YouTube link, please try a shorter video clip. If you uploaded an audio file, try trimming or compressing the audio to under 100 MB."
+FILE_TOO_LARGE_MESSAGE = "Whisper rejected part of the audio as too large to transcribe. Please try again; if it keeps happening, try a different copy of the recording."
 max_retries = 3
-delay = 2
+PLAYLIST_WORKERS = 4  # Playlists and channels listed at the same time
+# Playlist and channel pages; a watch link that is merely opened from a playlist stays a single video
+PLAYLIST_LINK_PATTERN = re.compile(r"youtube\.com/(playlist\?|@|channel/|c/|user/)")
 
 
 class MyLogger(object):
@@ -48,34 +55,177 @@ def get_ydl_opts(external_logger=lambda x: None):
 }
 
 
-def download_video_audio(url, external_logger=lambda x: None):
-    retries = 0
-    while retries < max_retries:
+def retry(function, description):
+    """
+    Calls function until it succeeds or max_retries attempts have failed, with a jittered exponential backoff
+    between attempts so parallel downloads that failed together don't retry in lockstep.
+    """
+    attempt = 0
+    while True:
         try:
-            ydl_opts = get_ydl_opts(external_logger)
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                print("Going to download ", url)
-                info = ydl.extract_info(url, download=False)
-                filesize = info.get("filesize", 0)
-                if filesize > MAX_FILE_SIZE:
-                    raise Exception(FILE_TOO_LARGE_MESSAGE)
-                filename = ydl.prepare_filename(info)
-                res = ydl.download([url])
-                print("youtube-dl result :", res)
-                mp3_filename = os.path.splitext(filename)[0] + '.mp3'
-                print('mp3 file name - ', mp3_filename)
-                return mp3_filename
+            return function()
         except Exception as e:
-            retries += 1
+            attempt += 1
             print(
-                f"An error occurred during downloading (Attempt {retries}/{max_retries}):",
+                f"An error occurred {description} (Attempt {attempt}/{max_retries}):",
                 str(e),
             )
-            if retries >= max_retries:
+            if attempt >= max_retries:
                 raise e
-            time.sleep(delay)
+            time.sleep(backoff_delay(attempt))
+
+
+def download_video_audio(url, external_logger=lambda x: None):
+    def download():
+        import yt_dlp as youtube_dl
+        ydl_opts = get_ydl_opts(external_logger)
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            print("Going to download ", url)
+            # One extraction both resolves the formats and downloads, instead of extracting the metadata twice
+            info = ydl.extract_info(url, download=True)
+            mp3_filename = os.path.splitext(ydl.prepare_filename(info))[0] + '.mp3'
+            print('mp3 file name - ', mp3_filename)
+            return mp3_filename
+
+    return retry(download, "during downloading")
+
+
+def extract_audio_info(url, external_logger=lambda x: None):
+    """
+    Resolves a YouTube link to the metadata of its best audio-only format without downloading anything.
+    """
+    def extract():
+        import yt_dlp as youtube_dl
+        ydl_opts = {"format": "bestaudio/best", "logger": MyLogger(external_logger)}
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    return retry(extract, "while extracting info")
+
+
+def is_playlist_link(url):
+    return PLAYLIST_LINK_PATTERN.search(url) is not None
+
+
+def get_playlist_videos(info):
+    """
+    Returns (url, title) for every video in flat playlist metadata, including the playlists nested in a channel's tabs.
+    """
+    videos = []
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        if entry.get("entries") is not None:
+            videos += get_playlist_videos(entry)
+            continue
+        video_id = get_youtube_video_id(entry.get("url") or "") or (entry.get("id") if entry.get("ie_key") in (None, "Youtube") else None)
+        if video_id:
+            videos.append((f"https://www.youtube.com/watch?v={video_id}", entry.get("title") or video_id))
+    return videos
 
 
+def list_playlist_videos(url, external_logger=lambda x: None):
+    """
+    Returns (url, title) for every video of a YouTube playlist or channel. The whole listing comes from one flat
+    metadata request; the formats of each video are only resolved when it is transcribed.
+    """
+    def extract():
+        import yt_dlp as youtube_dl
+        ydl_opts = {"extract_flat": "in_playlist", "logger": MyLogger(external_logger)}
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    with span("list_playlist"):
+        info = retry(extract, "while listing the playlist")
+    return get_playlist_videos(info)
+
+
+def expand_playlists(sources, max_workers=PLAYLIST_WORKERS, external_logger=lambda x: None):
+    """
+    Replaces every playlist or channel link in sources with its videos, listing playlists in parallel. Returns
+    (source, title) pairs in order, without duplicate videos; title is None for sources that aren't playlist entries.
+    """
+    def expand(source):
+        if not is_playlist_link(source):
+            return [(source, None)]
+        return list_playlist_videos(source, external_logger)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        expanded = list(executor.map(bind_tracer(expand), sources))
+    seen = set()
+    items = []
+    for source, title in [item for source_items in expanded for item in source_items]:
+        key = get_youtube_video_id(source) or source
+        if key not in seen:
+            seen.add(key)
+            items.append((source, title))
+    return items
+
+
+def overlap_segment(previous_path, previous_duration, chunk, output_dir, overlap=CHUNK_OVERLAP):
+    """
+    Prepends about the last overlap seconds of the previous segment to a streamed chunk with a stream copy, and moves
+    chunk.start back to match. A word cut at the segment boundary is then heard whole in one of the two chunks,
+    and TranscriptStitcher drops the words the chunks share. The overlap starts in the silence closest to overlap
+    seconds from the end, so its first word isn't cut either; without one, the stitcher skips the clipped word.
+    """
+    inpoint = max(previous_duration - overlap, 0.0)
+    silences = detect_silences(previous_path, start=max(previous_duration - 2 * overlap, 0.0))
+    candidates = [(start + end) / 2 for start, end in silences if (start + end) / 2 < previous_duration - overlap / 2]
+    if candidates:
+        inpoint = min(candidates, key=lambda point: abs(point - inpoint))
+    list_path = os.path.join(output_dir, f"chunk_{chunk.index:04d}.txt")
+    with open(list_path, "w") as f:
+        f.write(f"file '{previous_path}'\ninpoint {inpoint:.3f}\nfile '{chunk.path}'\n")
+    path = os.path.join(output_dir, f"overlap_{chunk.index:04d}.{SPEECH_AUDIO_EXTENSION}")
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", path],
+                   check=True)
+    chunk.start -= previous_duration - inpoint
+    chunk.path = path
+    return chunk
+
+
+def stream_video_audio_chunks(url, output_dir, chunk_length=CHUNK_LENGTH, overlap=CHUNK_OVERLAP, external_logger=lambda x: None):
+    """
+    Streams a YouTube video's audio through ffmpeg straight into small speech-encoded segments of chunk_length seconds,
+    yielding an AudioChunk as soon as each segment is complete. ffmpeg reads the media URL itself, so the full
+    download is never buffered in memory or written to disk as an MP3. Every chunk after the first also repeats the
+    last overlap seconds of the one before, as split_audio's chunks do, so no word is lost at a cut.
+    """
+    with span("extract_info"):
+        info = extract_audio_info(url, external_logger)
+    headers = "".join(f"{key}: {value}\r\n" for key, value in (info.get("http_headers") or {}).items())
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if headers:
+        command += ["-headers", headers]
+    command += [
+        "-i", info["url"], "-vn", "-ac", "1", "-ar", str(SPEECH_SAMPLE_RATE),
+        "-c:a", SPEECH_AUDIO_CODEC, "-b:a", SPEECH_AUDIO_BITRATE, "-application", "voip",
+        "-f", "segment", "-segment_time", str(chunk_length), "-reset_timestamps", "1",
+        "-segment_list", "pipe:1", "-segment_list_type", "csv",
+        os.path.join(output_dir, f"chunk_%04d.{SPEECH_AUDIO_EXTENSION}"),
+    ]
+    external_logger(f"Streaming audio from {info.get('title', url)}")
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        # ffmpeg writes one "filename,start,end" line to the segment list once each segment is finished
+        previous = None
+        for index, line in enumerate(process.stdout):
+            filename, start, end = line.strip().rsplit(",", 2)
+            chunk = AudioChunk(index, float(start), float(end), os.path.join(output_dir, os.path.basename(filename)))
+            add_bytes("stream", os.path.getsize(chunk.path))
+            segment = (chunk.path, chunk.end - chunk.start)
+            if previous is not None and overlap > 0:
+                chunk = overlap_segment(*previous, chunk, output_dir, overlap)
+            previous = segment
+            yield chunk
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed while streaming audio: {process.stderr.read().strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+
 
 def delete_download(path):
     try:
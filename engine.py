@@ -0,0 +1,628 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from download import download_video_audio, delete_download, stream_video_audio_chunks
+from preprocess import preprocess_audio
+from transcription import transcribe_long_audio, transcribe_chunk_stream, WHISPER_MODEL
+from cache import disk_cache, make_key, hash_file, hash_text, get_youtube_video_id
+from sections import (flatten_leaf_sections, build_outline_context, get_section_levels, format_section_markdown, SectionStore, SectionDispatcher,
+                      MAX_CONCURRENT_SECTIONS)
+from stats import GenerationStatistics, statistics_from_usage
+from tracing import span, add_bytes, StreamTimer
+from export import exporter, EXPORT_EXTENSIONS
+from rate_limit import rate_limiter, estimate_request_tokens, create_completion
+from outline import generate_outline, stream_outline_sections, outline_messages, MERGE_SYSTEM_PROMPT, outline_window_chars
+from timeline import timeline_from_dict
+from retrieval import split_transcript, BM25Index, format_segments, truncate_context, RETRIEVAL_TOP_K, TIMESTAMP_PATTERN
+from similarity import similarity_index, get_signature, shingle_similarity
+
+DEFAULT_OUTLINE_MODEL = "llama3-70b-8192"
+DEFAULT_CONTENT_MODEL = "llama3-8b-8192"
+TRANSCRIPTION_LANGUAGE = "en"
+TRANSCRIPTION_PROMPT = ""
+PREPROCESS_AUDIO = True  # Downmix, resample and cut long silences from audio files before upload
+STREAM_YOUTUBE_AUDIO = True  # Transcode YouTube audio on the fly into small speech chunks instead of downloading an MP3
+STREAM_OUTLINE = True  # Stream the outline and start each top-level section as soon as it is outlined
+REUSE_SIMILAR_NOTES = True  # Reuse the outline and unchanged sections of a near-duplicate transcript, such as a re-encoded or trimmed upload
+SECTION_REUSE_SIMILARITY = 0.7  # Shingle similarity of a section's excerpts above which its earlier notes are reused
+
+
+class NotesResult:
+    def __init__(self, transcript, structure, contents, outline_statistics, content_statistics):
+        self.transcript = transcript
+        self.structure = structure
+        self.contents = contents
+        self.outline_statistics = outline_statistics
+        self.content_statistics = content_statistics
+        self.preprocessing = None  # PreprocessResult when the audio was preprocessed before transcription
+
+    def get_markdown_content(self):
+        return get_markdown_content(self.structure, self.contents)
+
+
+def is_youtube_link(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def get_markdown_content(structure, contents, level=1):
+    """
+    Returns the markdown styled pure string with the contents.
+    """
+    return "".join(format_section_markdown(title, contents[title], section_level) for title, section_level in get_section_levels(structure, level).items())
+
+
+def create_pdf_file(content: str):
+    """
+    Create a PDF file from the provided content. Rendering happens in the export process pool and is cached by content hash.
+    """
+    with span("pdf_render"):
+        pdf_bytes = exporter.export(content, "pdf")
+    add_bytes("pdf", len(pdf_bytes))
+    return BytesIO(pdf_bytes)
+
+
+def transcript_cache_key(audio_hash: str) -> str:
+    return make_key("transcript", audio_hash, WHISPER_MODEL, TRANSCRIPTION_LANGUAGE, TRANSCRIPTION_PROMPT)
+
+
+def youtube_transcript_cache_key(video_id: str) -> str:
+    return make_key("youtube_transcript", video_id, WHISPER_MODEL, TRANSCRIPTION_LANGUAGE, TRANSCRIPTION_PROMPT)
+
+
+def timeline_cache_key(transcript: str) -> str:
+    return make_key("timeline", hash_text(transcript))
+
+
+def save_timeline(transcript: str, timeline):
+    if len(timeline):
+        disk_cache.set(timeline_cache_key(transcript), timeline.to_dict())
+
+
+def get_timeline(transcript: str):
+    """
+    Returns the Timeline of segment timestamps recorded when the transcript was made, or None if it has none.
+    """
+    data = disk_cache.get(timeline_cache_key(transcript))
+    return timeline_from_dict(data) if data is not None else None
+
+
+def outline_cache_key(transcript: str, model: str) -> str:
+    return make_key("outline", hash_text(transcript), model, outline_messages(""), MERGE_SYSTEM_PROMPT, outline_window_chars(model))
+
+
+def outline_source_cache_key(transcript: str, structure) -> str:
+    return make_key("outline_source", hash_text(transcript), structure)
+
+
+def get_outline_source(transcript: str, structure):
+    """
+    Returns the earlier transcript whose outline was reused for this one, or None if it was outlined itself.
+    """
+    source_id = disk_cache.get(outline_source_cache_key(transcript, structure))
+    return similarity_index.get(source_id) if source_id is not None else None
+
+
+def reuse_similar_outline(transcript: str, model: str):
+    """
+    Looks for an indexed near-duplicate of the transcript with a cached outline and, if there is one, caches that
+    outline for this transcript too, so the outline is not generated again. Indexes the transcript for later lookups.
+    Returns the earlier transcript whose outline is used, or None.
+    """
+    if not REUSE_SIMILAR_NOTES:
+        return None
+    cache_key = outline_cache_key(transcript, model)
+    cached_structure = disk_cache.get(cache_key)
+    if cached_structure is not None:
+        return get_outline_source(transcript, json.loads(cached_structure))
+    with span("similar_transcripts"):
+        signature = get_signature(transcript)
+        matches = similarity_index.find(transcript, signature=signature)
+        similarity_index.add(transcript, signature)
+    for similarity, previous_transcript in matches:
+        previous_structure = disk_cache.get(outline_cache_key(previous_transcript, model))
+        if previous_structure is not None:
+            print(f"Reusing the outline of a transcript {similarity:.0%} similar")
+            disk_cache.set(cache_key, previous_structure)
+            disk_cache.set(outline_source_cache_key(transcript, json.loads(previous_structure)), hash_text(previous_transcript))
+            return previous_transcript
+    return None
+
+
+def can_preprocess_audio() -> bool:
+    return PREPROCESS_AUDIO and shutil.which("ffmpeg") is not None
+
+
+def transcribe_audio(groq_client, audio_file_path: str, youtube_video_id: str = None, on_preprocess=None):
+    """
+    Transcribes audio using Groq's Whisper API. Long recordings are split on silence and transcribed in parallel.
+    Audio is first reduced to compact 16 kHz mono speech with long silences cut, and on_preprocess(result) is called
+    with the savings. Transcripts are cached by the original audio hash, and by video ID for YouTube downloads.
+    Segment timestamps are mapped back onto the original audio and cached with get_timeline.
+    """
+    with span("hash_file"):
+        cache_key = transcript_cache_key(hash_file(audio_file_path))
+    add_bytes("hash", os.path.getsize(audio_file_path))
+    transcript = disk_cache.get(cache_key)
+    if transcript is None and can_preprocess_audio():
+        output_dir = tempfile.mkdtemp(prefix="scribewizard_preprocess_")
+        try:
+            preprocess_result = preprocess_audio(audio_file_path, output_dir)
+            print(preprocess_result)
+            if on_preprocess:
+                on_preprocess(preprocess_result)
+            transcript, timeline = transcribe_long_audio(groq_client, preprocess_result.path, language=TRANSCRIPTION_LANGUAGE, prompt=TRANSCRIPTION_PROMPT)
+            timeline = timeline.map_times(preprocess_result.offset_map.to_original)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        disk_cache.set(cache_key, transcript)
+        save_timeline(transcript, timeline)
+    elif transcript is None:
+        transcript, timeline = transcribe_long_audio(groq_client, audio_file_path, language=TRANSCRIPTION_LANGUAGE, prompt=TRANSCRIPTION_PROMPT)
+        disk_cache.set(cache_key, transcript)
+        save_timeline(transcript, timeline)
+    if youtube_video_id:
+        disk_cache.set(youtube_transcript_cache_key(youtube_video_id), transcript)
+    return transcript
+
+
+def can_stream_youtube_audio() -> bool:
+    return STREAM_YOUTUBE_AUDIO and shutil.which("ffmpeg") is not None
+
+
+def transcribe_youtube_stream(groq_client, url: str, youtube_video_id: str = None, external_logger=lambda x: None):
+    """
+    Transcribes a YouTube video while it streams, uploading each speech-encoded chunk as soon as ffmpeg finishes it.
+    """
+    output_dir = tempfile.mkdtemp(prefix="scribewizard_stream_")
+    try:
+        with span("youtube_stream"):
+            chunks = stream_video_audio_chunks(url, output_dir, external_logger=external_logger)
+            transcript, timeline = transcribe_chunk_stream(groq_client, chunks, language=TRANSCRIPTION_LANGUAGE, prompt=TRANSCRIPTION_PROMPT)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    save_timeline(transcript, timeline)
+    if youtube_video_id:
+        disk_cache.set(youtube_transcript_cache_key(youtube_video_id), transcript)
+    return transcript
+
+
+def get_transcript(groq_client, source: str, on_status=print, external_logger=lambda x: None, on_preprocess=None):
+    """
+    Transcribes a local audio file or a YouTube link. YouTube transcripts are looked up by video ID before downloading,
+    and YouTube audio is streamed into chunks when ffmpeg is available. Downloaded audio is deleted afterwards;
+    local files are left in place.
+    """
+    if not is_youtube_link(source):
+        on_status("Transcribing audio in background....")
+        return transcribe_audio(groq_client, source, on_preprocess=on_preprocess)
+
+    youtube_video_id = get_youtube_video_id(source)
+    if youtube_video_id:
+        transcript = disk_cache.get(youtube_transcript_cache_key(youtube_video_id))
+        if transcript is not None:
+            return transcript
+
+    if can_stream_youtube_audio():
+        on_status("Streaming and transcribing audio from YouTube link ....")
+        return transcribe_youtube_stream(groq_client, source, youtube_video_id, external_logger)
+
+    on_status("Downloading audio from YouTube link ....")
+    with span("download"):
+        audio_file_path = download_video_audio(source, external_logger)
+    if audio_file_path is None:
+        raise ValueError("Failed to download audio from YouTube link. Please try again.")
+    add_bytes("download", os.path.getsize(audio_file_path))
+
+    try:
+        on_status("Transcribing audio in background....")
+        return transcribe_audio(groq_client, audio_file_path, youtube_video_id=youtube_video_id, on_preprocess=on_preprocess)
+    finally:
+        delete_download(audio_file_path)
+
+
+def generate_notes_structure(groq_client, transcript: str, model: str = DEFAULT_OUTLINE_MODEL):
+    """
+    Returns notes structure content as well as total tokens and total time for generation.
+    Long transcripts are outlined in windows in parallel and merged, see outline.generate_outline.
+    """
+    # Cached outlines cost nothing, so they come back with empty statistics
+    cache_key = outline_cache_key(transcript, model)
+    cached_structure = disk_cache.get(cache_key)
+    if cached_structure is not None:
+        return GenerationStatistics(model_name=model), cached_structure
+
+    with span("outline", model=model):
+        statistics_to_return, notes_structure = generate_outline(groq_client, transcript, model)
+    disk_cache.set(cache_key, notes_structure)
+    return statistics_to_return, notes_structure
+
+
+def stream_notes_structure(groq_client, transcript: str, model: str = DEFAULT_OUTLINE_MODEL):
+    """
+    Streaming version of generate_notes_structure. Yields each top-level (title, content) pair of the outline as soon
+    as it has been generated, then the GenerationStatistics of the outline. A cached outline is replayed the same way.
+    Raises json.JSONDecodeError if the outline is not valid JSON.
+    """
+    cache_key = outline_cache_key(transcript, model)
+    cached_structure = disk_cache.get(cache_key)
+    if cached_structure is not None:
+        yield from json.loads(cached_structure).items()
+        yield GenerationStatistics(model_name=model)
+        return
+
+    structure = {}
+    with span("outline", model=model):
+        for item in stream_outline_sections(groq_client, transcript, model):
+            if type(item) != GenerationStatistics:
+                structure[item[0]] = item[1]
+            yield item
+    print("Structure: ", json.dumps(structure))
+    disk_cache.set(cache_key, json.dumps(structure))
+
+
+def section_messages(transcript_excerpts: str, other_sections: str, section: str):
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert writer. Generate a comprehensive note for the section provided based factually on the transcript provided. Do *not* repeat any content covered by the other sections."
+        },
+        {
+            "role": "user",
+            "content": f"### Transcript Excerpts\n\n{transcript_excerpts}\n\n### Other Sections\n\n{other_sections}\n\n### Instructions\n\nGenerate comprehensive notes for this section only based on the transcript: \n\n{section}"
+        }
+    ]
+
+
+class SectionPrompter:
+    """
+    Builds section prompts for an outline that may arrive a few top-level sections at a time. Each prompt lists the
+    sections outlined so far, so a section can be sent before the rest of the outline exists. With the transcript's
+    Timeline, the excerpts are marked with their timestamps.
+    """
+    def __init__(self, transcript: str, timeline=None):
+        self.transcript_index = BM25Index(split_transcript(transcript, timeline=timeline))
+        self.leaf_sections = []
+
+    def add(self, structure):
+        """
+        Adds top-level sections and returns (title, section, transcript_excerpts, other_sections) for each of their leaves.
+        """
+        new_leaf_sections = flatten_leaf_sections(structure)
+        self.leaf_sections += new_leaf_sections
+        prompts = []
+        for title, description in new_leaf_sections:
+            section = title + ": " + description
+            transcript_excerpts = format_segments(self.transcript_index.search(section, top_k=RETRIEVAL_TOP_K))
+            other_sections = truncate_context(build_outline_context(self.leaf_sections, title))
+            prompts.append((title, section, transcript_excerpts, other_sections))
+        return prompts
+
+
+def split_outline(structure, progressive):
+    """
+    Returns the parts of an outline in the order generate_notes receives them: one per top-level section when the
+    outline streams, otherwise the whole outline at once. Prompts built part by part match those of the original run.
+    """
+    return [{title: content} for title, content in structure.items()] if progressive else [structure]
+
+
+def section_prompts(transcript: str, structure, progressive=None):
+    """
+    Returns (title, section, transcript_excerpts, other_sections) for every leaf of the outline, in outline order,
+    built as generate_notes builds them (progressively when STREAM_OUTLINE is set).
+    """
+    prompter = SectionPrompter(transcript, get_timeline(transcript))
+    progressive = STREAM_OUTLINE if progressive is None else progressive
+    return [prompt for part in split_outline(structure, progressive) for prompt in prompter.add(part)]
+
+
+def get_section_timestamps(transcript: str, structure, timeline):
+    """
+    Returns {title: [start seconds]} of the transcript segments each leaf section was written from, so notes can
+    link back to the recording.
+    """
+    if not timeline:
+        return {}
+    transcript_index = BM25Index(split_transcript(transcript, timeline=timeline))
+    return {title: [segment.start for segment in transcript_index.search(title + ": " + description, top_k=RETRIEVAL_TOP_K)]
+            for title, description in flatten_leaf_sections(structure)}
+
+
+def section_cache_key(transcript_excerpts: str, other_sections: str, section: str, model: str) -> str:
+    return make_key("section", hash_text(transcript_excerpts), model, section_messages(transcript_excerpts, other_sections, section))
+
+
+def reuse_similar_sections(prompts, previous_prompts, model: str):
+    """
+    Caches the notes written for a near-duplicate transcript under the matching sections of this one, for the sections
+    whose retrieved excerpts barely changed, so generate_section finds them instead of writing them again. prompts
+    and previous_prompts are section_prompts of the same outline for both transcripts. Returns the titles reused.
+    """
+    reused = []
+    for (title, section, transcript_excerpts, other_sections), (_, _, previous_excerpts, previous_other_sections) in zip(prompts, previous_prompts):
+        cache_key = section_cache_key(transcript_excerpts, other_sections, section, model)
+        if disk_cache.get(cache_key) is not None:
+            continue
+        # The same words are stamped with different times when a recording was trimmed, so timestamps are left out
+        similarity = shingle_similarity(TIMESTAMP_PATTERN.sub("", transcript_excerpts), TIMESTAMP_PATTERN.sub("", previous_excerpts))
+        if similarity < SECTION_REUSE_SIMILARITY:
+            continue
+        previous_content = disk_cache.get(section_cache_key(previous_excerpts, previous_other_sections, section, model))
+        if previous_content is not None:
+            disk_cache.set(cache_key, previous_content)
+            reused.append(title)
+    return reused
+
+
+def generate_section(groq_client, transcript_excerpts: str, other_sections: str, section: str, model: str = DEFAULT_CONTENT_MODEL):
+    """
+    Streams the notes for one section from the transcript segments retrieved for it, so the prompt size stays
+    fixed however long the transcript is. other_sections lists the rest of the outline, which may be written in parallel.
+    """
+    messages = section_messages(transcript_excerpts, other_sections, section)
+
+    cache_key = section_cache_key(transcript_excerpts, other_sections, section, model)
+    cached_section = disk_cache.get(cache_key)
+    if cached_section is not None:
+        yield cached_section
+        return
+
+    timer = None
+
+    def request(chosen_model):
+        nonlocal timer
+        timer = StreamTimer(chosen_model)
+        return create_completion(
+            groq_client,
+            model=chosen_model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=8000,
+            top_p=1,
+            stream=True,
+            stop=None,
+        )
+
+    with span("section", model=model) as attributes:
+        # The scheduler may answer from a fallback model when the requested one is saturated
+        model, stream = rate_limiter.call(request, model, estimate_request_tokens(json.dumps(messages), 8000))
+        attributes["model"] = model
+
+        section_content = []
+        for chunk in stream:
+            tokens = chunk.choices[0].delta.content
+            if tokens:
+                timer.tick()
+                section_content.append(tokens)
+                yield tokens
+            if x_groq := chunk.x_groq:
+                if not x_groq.usage:
+                    continue
+                usage = x_groq.usage
+                statistics_to_return = statistics_from_usage(usage, model)
+                yield statistics_to_return
+
+    # Only completed sections are cached, so a failed run can be retried without paying for finished ones again.
+    # A section written by a fallback model is cached under that model, so it never stands in for the requested one.
+    disk_cache.set(section_cache_key(transcript_excerpts, other_sections, section, model), "".join(section_content))
+
+
+def section_inputs_key(section: str, transcript_excerpts: str, model: str) -> str:
+    """
+    Hash of what a section's notes depend on: its outline entry, the excerpts retrieved for it and the model.
+    The rest of the outline is left out, so editing one outline entry only makes that section stale.
+    """
+    return make_key("section_inputs", section, hash_text(transcript_excerpts), model)
+
+
+def is_section_current(job_inputs, title, inputs):
+    # Sections checkpointed before their inputs were recorded belong to a plain resume and are kept
+    return job_inputs.get(title) in (None, inputs)
+
+
+def checkpoint_section(job, title, chunks, section: str, transcript_excerpts: str, model: str):
+    """
+    Passes a section's chunks through and saves the finished section with its statistics and inputs hash to job, if any.
+    The inputs are hashed with the model that wrote the section, which is a fallback model when model was saturated.
+    """
+    content = []
+    statistics = GenerationStatistics(model_name="")
+    for chunk in chunks:
+        if type(chunk) == GenerationStatistics:
+            statistics.model_name = chunk.model_name
+            statistics.add(chunk)
+        else:
+            content.append(chunk)
+        yield chunk
+    if job is not None:
+        # Cached sections report no statistics and were written by model
+        job.save_section(title, "".join(content), statistics, section_inputs_key(section, transcript_excerpts, statistics.model_name or model))
+
+
+def restore_sections(completed, job_inputs, inputs, contents, content_statistics, on_chunk=None, on_statistics=None):
+    """
+    Fills contents with the sections a resumed or revised job already finished and returns their titles. completed and
+    job_inputs are the job's get_sections() and get_section_inputs(). inputs, {title: section_inputs_key}, lists the
+    sections to look for; those whose inputs changed are left out so they are generated again.
+    """
+    restored = []
+    for title, section_inputs in inputs.items():
+        if title in completed and title in contents and is_section_current(job_inputs, title, section_inputs):
+            content, statistics = completed[title]
+            contents.append(title, content)
+            content_statistics.add(statistics)
+            if on_chunk:
+                on_chunk(title, content)
+            restored.append(title)
+    if restored and on_statistics:
+        on_statistics(content_statistics)
+    return restored
+
+
+def generate_notes(groq_client, transcript: str, outline_model=DEFAULT_OUTLINE_MODEL, content_model=DEFAULT_CONTENT_MODEL,
+                   max_concurrent_sections=MAX_CONCURRENT_SECTIONS, on_status=print, on_structure=None, on_chunk=None, on_statistics=None, job=None):
+    """
+    Runs outline and section generation for a transcript and returns a NotesResult.
+    With STREAM_OUTLINE, the outline streams and each top-level section starts generating as soon as it is outlined,
+    while the rest of the outline is still being written.
+    Callbacks are invoked on the calling thread: on_structure(structure) with the outline so far whenever it grows,
+    on_chunk(title, text) for every streamed piece of a section and on_statistics(total) whenever usage is reported.
+    With a jobs.Job, the outline and every finished section are checkpointed, and a resumed job only generates
+    the sections it hasn't finished or whose inputs changed, see revise_job. With REUSE_SIMILAR_NOTES, a near-duplicate of an earlier transcript reuses its
+    outline and the sections whose excerpts barely changed, see reuse_similar_outline.
+    Raises json.JSONDecodeError if the outline is not valid JSON.
+    """
+    progressive = STREAM_OUTLINE
+
+    def outline_parts():
+        if job is not None and job.structure is not None:
+            yield from split_outline(job.structure, progressive)
+            yield job.outline_statistics
+        elif progressive:
+            for item in stream_notes_structure(groq_client, transcript, model=outline_model):
+                yield item if type(item) == GenerationStatistics else dict([item])
+        else:
+            outline_statistics, notes_structure = generate_notes_structure(groq_client, transcript, model=outline_model)
+            print("Structure: ", notes_structure)
+            yield json.loads(notes_structure)
+            yield outline_statistics
+
+    def generate_leaf(title, prompt):
+        section, transcript_excerpts, other_sections = prompt
+        return checkpoint_section(job, title, generate_section(groq_client, transcript_excerpts=transcript_excerpts, other_sections=other_sections,
+                                                               section=section, model=content_model),
+                                  section, transcript_excerpts, content_model)
+
+    structure = {}
+    contents = SectionStore(structure)
+    outline_statistics = GenerationStatistics(model_name=outline_model)
+    content_statistics = GenerationStatistics(model_name=content_model)
+    completed = job.get_sections() if job is not None else {}
+    completed_inputs = job.get_section_inputs() if job is not None else {}
+    prompter = SectionPrompter(transcript, get_timeline(transcript))
+    if job is not None and job.structure is not None:
+        previous_transcript = get_outline_source(transcript, job.structure)
+    else:
+        previous_transcript = reuse_similar_outline(transcript, outline_model)
+    # Builds the earlier transcript's prompts alongside, to find the sections that can be reused
+    previous_prompter = SectionPrompter(previous_transcript, get_timeline(previous_transcript)) if previous_transcript else None
+
+    if job is None or job.structure is None:
+        on_status("Generating notes structure....")
+    dispatcher = SectionDispatcher(generate_leaf, max_workers=max_concurrent_sections)
+    try:
+        dispatcher.add_source(None, outline_parts())
+        for title, chunk in dispatcher:
+            if title is None and type(chunk) == GenerationStatistics:
+                # The outline's statistics come last, once the whole outline has been generated, so the transcript index can go
+                outline_statistics = chunk
+                prompter = previous_prompter = None
+                if job is not None and job.structure is None:
+                    job.save_outline(structure, outline_statistics)
+            elif title is None:
+                if not structure:
+                    on_status("Generating notes ...")
+                structure.update(chunk)
+                contents.extend(structure)
+                if on_structure:
+                    on_structure(dict(structure))
+                prompts = prompter.add(chunk)
+                if previous_prompter is not None:
+                    reuse_similar_sections(prompts, previous_prompter.add(chunk), content_model)
+                # Sections a resumed or revised job already finished are restored instead of generated
+                restored = restore_sections(completed, completed_inputs,
+                                            {leaf_title: section_inputs_key(section, transcript_excerpts, content_model)
+                                             for leaf_title, section, transcript_excerpts, _ in prompts},
+                                            contents, content_statistics, on_chunk, on_statistics)
+                for leaf_title, section, transcript_excerpts, other_sections in prompts:
+                    if leaf_title not in restored:
+                        dispatcher.submit(leaf_title, (section, transcript_excerpts, other_sections))
+            # Check if GenerationStatistics data is returned instead of str tokens
+            elif type(chunk) == GenerationStatistics:
+                content_statistics.add(chunk)
+                if on_statistics:
+                    on_statistics(content_statistics)
+            elif chunk is not None:
+                contents.append(title, chunk)
+                if on_chunk:
+                    on_chunk(title, chunk)
+    finally:
+        dispatcher.close()
+
+    return NotesResult(transcript, structure, contents.to_dict(), outline_statistics, content_statistics)
+
+
+def get_current_sections(job, structure, content_model):
+    """
+    Returns the titles of the sections job finished whose inputs are the same under structure and content_model.
+    """
+    job_inputs = job.get_section_inputs()
+    return [title for title, section, transcript_excerpts, _ in section_prompts(job.transcript, structure)
+            if job_inputs.get(title) == section_inputs_key(section, transcript_excerpts, content_model)]
+
+
+def revise_job(job, outline_model, content_model, structure=None):
+    """
+    Starts a new job from one that has its transcript, for a model switch or an edited outline, and returns it.
+    Only stale artifacts are left for generate_notes: the transcript is always kept, the outline is kept unless an
+    edited structure replaces it or the outline model changed, and a section is kept when its inputs are unchanged.
+    """
+    outline_statistics = None
+    if structure is None and outline_model == job.outline_model:
+        structure, outline_statistics = job.structure, job.outline_statistics
+    sections = get_current_sections(job, structure, content_model) if structure is not None else []
+    return job.revise(outline_model, content_model, structure, outline_statistics, sections)
+
+
+def run_pipeline(groq_client, source: str, output_dir: str, outline_model=DEFAULT_OUTLINE_MODEL, content_model=DEFAULT_CONTENT_MODEL,
+                 max_concurrent_sections=MAX_CONCURRENT_SECTIONS, pdf=True, on_status=print, formats=(), job=None):
+    """
+    Runs download -> transcribe -> outline -> sections for one source and writes notes.md (and notes.pdf) to output_dir.
+    Returns the NotesResult and a dict of the files written. With a jobs.Job, every stage is checkpointed and
+    a resumed job skips the stages it already finished.
+    """
+    preprocess_results = []
+    if job is not None and job.transcript is not None:
+        transcript = job.transcript
+    else:
+        transcript = get_transcript(groq_client, source, on_status=on_status, on_preprocess=preprocess_results.append)
+        if job is not None:
+            job.save_transcript(transcript)
+    result = generate_notes(groq_client, transcript, outline_model=outline_model, content_model=content_model,
+                            max_concurrent_sections=max_concurrent_sections, on_status=on_status, job=job)
+    result.preprocessing = preprocess_results[0] if preprocess_results else None
+    return result, write_outputs(result, output_dir, pdf=pdf, formats=formats)
+
+
+def write_document(markdown_content: str, output_dir: str, name: str, pdf=True, formats=()):
+    """
+    Writes name.md and optionally name.pdf, plus name.html or name.docx for each extra format. Returns the paths written.
+    """
+    outputs = {"markdown": os.path.join(output_dir, f"{name}.md")}
+    with open(outputs["markdown"], "w", encoding="utf-8") as f:
+        f.write(markdown_content)
+    for fmt in formats:
+        outputs[fmt] = os.path.join(output_dir, f"{name}.{EXPORT_EXTENSIONS[fmt]}")
+        with open(outputs[fmt], "wb") as f:
+            f.write(exporter.export(markdown_content, fmt))
+    if pdf:
+        outputs["pdf"] = os.path.join(output_dir, f"{name}.pdf")
+        with open(outputs["pdf"], "wb") as f:
+            f.write(create_pdf_file(markdown_content).getvalue())
+    return outputs
+
+
+def write_outputs(result, output_dir: str, pdf=True, formats=()):
+    """
+    Writes notes.md, transcript.txt and optionally notes.pdf for a NotesResult, plus notes.html or notes.docx
+    for each extra format. Returns the paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with span("markdown"):
+        markdown_content = result.get_markdown_content()
+    outputs = {"transcript": os.path.join(output_dir, "transcript.txt")}
+    with open(outputs["transcript"], "w", encoding="utf-8") as f:
+        f.write(result.transcript)
+    return {**write_document(markdown_content, output_dir, "notes", pdf, formats), **outputs}
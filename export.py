@@ -0,0 +1,258 @@
+import html
+import io
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future
+from cache import hash_text
+from pdf_workers import PdfWorkerPool
+
+EXPORT_WORKERS = 2  # Processes rendering PDFs; 0 renders on the calling thread
+EXPORT_CACHE_SIZE = 32  # Rendered documents kept in memory, shared by every session in the process
+MARKDOWN_EXTRAS = ["cuddled-lists", "tables", "footnotes", "fenced-code-blocks"]
+
+NOTES_CSS = """
+@page { size: A4; margin: 2cm; }
+body { font-family: "DejaVu Sans", "Helvetica", "Arial", sans-serif; font-size: 11pt; line-height: 1.45; color: #222; }
+h1, h2, h3, h4, h5, h6 { line-height: 1.2; margin: 1.2em 0 0.4em; }
+table { border-collapse: collapse; margin: 0.8em 0; }
+th, td { border: 1px solid #bbb; padding: 4px 8px; text-align: left; vertical-align: top; }
+th { background: #f0f0f0; }
+code { font-family: "DejaVu Sans Mono", monospace; font-size: 0.9em; background: #f4f4f4; padding: 0 2px; }
+pre { background: #f4f4f4; padding: 8px; white-space: pre-wrap; }
+"""
+
+EXPORT_MIME_TYPES = {
+    "markdown": "text/plain",
+    "html": "text/html",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+}
+EXPORT_EXTENSIONS = {"markdown": "txt", "html": "html", "docx": "docx", "pdf": "pdf"}
+
+
+def markdown_to_html(markdown_content: str) -> str:
+    from markdown2 import markdown
+    return markdown(markdown_content, extras=MARKDOWN_EXTRAS)
+
+
+def render_html(markdown_content: str, title="Generated Notes") -> bytes:
+    """
+    Renders the notes as a standalone HTML page with the same stylesheet as the PDF.
+    """
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+            f"<style>{NOTES_CSS}</style></head><body>\n{markdown_to_html(markdown_content)}</body></html>\n").encode("utf-8")
+
+
+# PDF rendering runs in worker processes (see pdf_workers) that load WeasyPrint, parse the stylesheet and load fonts once at startup
+
+_stylesheet = None
+
+
+def _init_pdf_worker():
+    global _stylesheet
+    from weasyprint import HTML, CSS
+    _stylesheet = CSS(string=NOTES_CSS)
+    HTML(string="<h1>Warm up</h1><p>Loads fonts before the first real document.</p>").write_pdf(stylesheets=[_stylesheet])
+
+
+def render_pdf(markdown_content: str) -> bytes:
+    from weasyprint import HTML
+    if _stylesheet is None:
+        _init_pdf_worker()
+    return HTML(string=markdown_to_html(markdown_content)).write_pdf(stylesheets=[_stylesheet])
+
+
+# DOCX is written directly as WordprocessingML, so no Word library is needed
+
+DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+
+DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+DOCX_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+DOCX_NAMESPACE = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+DOCX_HEADING_SIZES = [32, 28, 26, 24, 22, 22]  # Half-points
+
+
+def _docx_styles():
+    headings = "".join(
+        f'<w:style w:type="paragraph" w:styleId="Heading{level}"><w:name w:val="heading {level}"/><w:basedOn w:val="Normal"/>'
+        f'<w:next w:val="Normal"/><w:pPr><w:keepNext/><w:spacing w:before="240" w:after="80"/><w:outlineLvl w:val="{level - 1}"/></w:pPr>'
+        f'<w:rPr><w:b/><w:sz w:val="{size}"/></w:rPr></w:style>'
+        for level, size in enumerate(DOCX_HEADING_SIZES, start=1)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {DOCX_NAMESPACE}>'
+            '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+            '<w:pPr><w:spacing w:after="120"/></w:pPr><w:rPr><w:sz w:val="22"/></w:rPr></w:style>'
+            '<w:style w:type="paragraph" w:styleId="Code"><w:name w:val="Code"/><w:basedOn w:val="Normal"/>'
+            '<w:pPr><w:spacing w:after="0"/></w:pPr><w:rPr><w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/><w:sz w:val="20"/></w:rPr></w:style>'
+            f'{headings}</w:styles>')
+
+
+def _docx_runs(text):
+    """
+    Converts inline **bold**, *italic* and `code` markdown into runs.
+    """
+    runs = []
+    for part in re.split(r"(\*\*[^*]+\*\*|`[^`]+`|\*[^*\s][^*]*\*|_[^_\s][^_]*_)", text):
+        if not part:
+            continue
+        properties = ""
+        if part.startswith("**") and part.endswith("**") and len(part) > 4:
+            part, properties = part[2:-2], "<w:b/>"
+        elif part.startswith("`") and part.endswith("`") and len(part) > 2:
+            part, properties = part[1:-1], '<w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/>'
+        elif part[0] in "*_" and part[-1] == part[0] and len(part) > 2:
+            part, properties = part[1:-1], "<w:i/>"
+        runs.append(f'<w:r>{f"<w:rPr>{properties}</w:rPr>" if properties else ""}<w:t xml:space="preserve">{html.escape(part, quote=False)}</w:t></w:r>')
+    return "".join(runs)
+
+
+def _docx_paragraph(text, style=None, indent=0):
+    properties = ""
+    if style or indent:
+        properties = "<w:pPr>" + (f'<w:pStyle w:val="{style}"/>' if style else "") + (f'<w:ind w:left="{indent}"/>' if indent else "") + "</w:pPr>"
+    return f"<w:p>{properties}{_docx_runs(text)}</w:p>"
+
+
+def _docx_table(rows):
+    body = []
+    for index, row in enumerate(rows):
+        if index == 1 and re.fullmatch(r"[\s|:-]+", row):
+            continue  # Header separator
+        cells = [cell.strip() for cell in row.strip().strip("|").split("|")]
+        body.append("<w:tr>" + "".join(f'<w:tc><w:tcPr><w:tcW w:w="0" w:type="auto"/></w:tcPr>{_docx_paragraph(f"**{cell}**" if index == 0 and cell else cell)}</w:tc>'
+                                       for cell in cells) + "</w:tr>")
+    borders = "".join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="BBBBBB"/>' for side in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    grid = "".join('<w:gridCol/>' for _ in rows[0].strip().strip("|").split("|"))
+    return f'<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/><w:tblBorders>{borders}</w:tblBorders></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{"".join(body)}</w:tbl>'
+
+
+def render_docx(markdown_content: str) -> bytes:
+    """
+    Converts the notes markdown (headings, paragraphs, lists, tables and code blocks) into a .docx file.
+    """
+    body = []
+    paragraph = []
+    table = []
+    in_code = False
+
+    def flush():
+        if paragraph:
+            body.append(_docx_paragraph(" ".join(paragraph)))
+            paragraph.clear()
+        if table:
+            body.append(_docx_table(table))
+            table.clear()
+
+    for line in markdown_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            flush()
+            in_code = not in_code
+        elif in_code:
+            body.append(f'<w:p><w:pPr><w:pStyle w:val="Code"/></w:pPr><w:r><w:t xml:space="preserve">{html.escape(line, quote=False)}</w:t></w:r></w:p>')
+        elif heading := re.match(r"(#{1,6})\s+(.*)", stripped):
+            flush()
+            body.append(_docx_paragraph(heading.group(2), style=f"Heading{len(heading.group(1))}"))
+        elif stripped.startswith("|"):
+            if paragraph:
+                flush()
+            table.append(stripped)
+        elif item := re.match(r"([*+-]|\d+[.)])\s+(.*)", stripped):
+            flush()
+            marker = "•" if item.group(1) in "*+-" else item.group(1)
+            indent = 360 + (len(line) - len(line.lstrip())) // 2 * 360
+            body.append(_docx_paragraph(f"{marker} {item.group(2)}", indent=indent))
+        elif not stripped:
+            flush()
+        else:
+            if table:
+                flush()
+            paragraph.append(stripped)
+    flush()
+
+    document = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {DOCX_NAMESPACE}><w:body>{"".join(body)}<w:sectPr/></w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", DOCX_RELS)
+        docx.writestr("word/_rels/document.xml.rels", DOCX_DOCUMENT_RELS)
+        docx.writestr("word/styles.xml", _docx_styles())
+        docx.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    "markdown": lambda markdown_content: markdown_content.encode("utf-8"),
+    "html": render_html,
+    "docx": render_docx,
+    "pdf": render_pdf,
+}
+
+
+class Exporter:
+    """
+    Renders notes in each format once per content hash. Rendered bytes are kept in a bounded in-memory LRU as futures,
+    so a request for a document that is already rendering waits for that render instead of starting another.
+    PDFs are rendered in worker processes so WeasyPrint never holds the GIL of the app process.
+    """
+    def __init__(self, workers=EXPORT_WORKERS, cache_size=EXPORT_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = PdfWorkerPool(workers) if workers else None
+
+    def submit(self, markdown_content: str, fmt="pdf") -> Future:
+        """
+        Starts rendering (or returns the cached render) without waiting for it.
+        """
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        key = (fmt, hash_text(markdown_content))
+        render_here = not (fmt == "pdf" and self.workers)
+        with self.lock:
+            future = self.cache.get(key)
+            if future is not None and not (future.done() and future.exception()):
+                self.cache.move_to_end(key)
+                return future
+            future = Future() if render_here else self.pool.submit(markdown_content)
+            self.cache[key] = future
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        # Lightweight formats render on the calling thread, outside the lock, so other sessions are never held up
+        if render_here:
+            try:
+                future.set_result(RENDERERS[fmt](markdown_content))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def export(self, markdown_content: str, fmt="pdf") -> bytes:
+        return self.submit(markdown_content, fmt).result()
+
+    def warm_up(self):
+        """
+        Starts the PDF worker processes in the background so the first export doesn't pay for WeasyPrint startup.
+        """
+        if self.pool is not None:
+            self.pool.start()
+
+
+exporter = Exporter()
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from cache import LazyDatabase, CACHE_DIR
+from stats import GenerationStatistics, statistics_from_dict
+
+JOB_TTL = 7 * 24 * 60 * 60  # Jobs older than a week are dropped
+
+# A job is "queued" or "running" only while this process holds it; anything else left that way was interrupted
+JOB_STATUSES = ("queued", "running", "completed", "failed", "interrupted")
+
+
+class Job:
+    """
+    Checkpointed state of one note generation run: the transcript, the outline and every finished section with its
+    statistics. A failed or interrupted job resumes from the first stage or section that has no checkpoint.
+    """
+    def __init__(self, store, job_id, source, outline_model, content_model, status="queued", transcript=None, structure=None,
+                 outline_statistics=None, error=None, created=None, updated=None):
+        self.store = store
+        self.id = job_id
+        self.source = source
+        self.outline_model = outline_model
+        self.content_model = content_model
+        self.status = status
+        self.transcript = transcript
+        self.structure = structure
+        self.outline_statistics = outline_statistics
+        self.error = error
+        self.created = created
+        self.updated = updated
+
+    def get_status(self):
+        if self.status in ("queued", "running") and not self.store.is_active(self.id):
+            return "interrupted"
+        return self.status
+
+    def is_resumable(self):
+        return self.get_status() in ("failed", "interrupted")
+
+    def save_transcript(self, transcript):
+        self.transcript = transcript
+        self.store.update(self.id, transcript=transcript)
+
+    def save_outline(self, structure, statistics):
+        self.structure = structure
+        self.outline_statistics = statistics
+        self.store.update(self.id, structure=json.dumps(structure), outline_statistics=json.dumps(statistics.to_dict()))
+
+    def save_section(self, title, content, statistics, inputs=None):
+        """
+        Saves a finished section. inputs is a hash of everything its content was generated from, see
+        engine.section_inputs_key, so a later revision of the job can tell whether the section is still current.
+        """
+        self.store.save_section(self.id, title, content, statistics, inputs)
+
+    def get_sections(self):
+        """
+        Returns {title: (content, GenerationStatistics)} for every finished section.
+        """
+        return self.store.get_sections(self.id)
+
+    def get_section_inputs(self):
+        """
+        Returns {title: inputs hash} for every finished section; sections saved without one map to None.
+        """
+        return self.store.get_section_inputs(self.id)
+
+    def revise(self, outline_model, content_model, structure=None, outline_statistics=None, sections=()):
+        """
+        Returns a new job for the same source that starts from this job's transcript, the given outline if any
+        and copies of the named finished sections, so only what is left gets generated.
+        """
+        return self.store.revise(self, outline_model, content_model, structure, outline_statistics, sections)
+
+    def queue(self):
+        """
+        Marks the job as waiting for a worker. It stays held by this process until its run ends.
+        """
+        self.store.activate(self.id)
+        self.status = "queued"
+        self.store.update(self.id, status="queued")
+
+    def get_progress(self):
+        if self.transcript is None:
+            return "transcription"
+        if self.structure is None:
+            return "outline"
+        return f"{len(self.get_sections())} sections done"
+
+    @contextmanager
+    def run(self):
+        """
+        Holds the job as running in this process for the duration of the block and records how the block ended.
+        Streamlit stops a script run with a BaseException, which leaves the job interrupted rather than failed.
+        """
+        self.store.activate(self.id)
+        self.status, self.error = "running", None
+        self.store.update(self.id, status="running", error=None)
+        try:
+            yield self
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            self.store.update(self.id, status="failed", error=str(e))
+            raise
+        except BaseException:
+            self.status = "interrupted"
+            self.store.update(self.id, status="interrupted")
+            raise
+        else:
+            self.status = "completed"
+            self.store.update(self.id, status="completed")
+        finally:
+            self.store.deactivate(self.id)
+
+
+class JobStore:
+    """
+    SQLite store of jobs and their section checkpoints, shared by every session and thread in the process.
+    """
+    def __init__(self, directory=CACHE_DIR, ttl=JOB_TTL):
+        self.database = LazyDatabase(directory, "jobs.sqlite3", self._create_tables)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.active = set()
+
+    def _create_tables(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, source TEXT, outline_model TEXT, content_model TEXT, status TEXT, "
+                     "transcript TEXT, structure TEXT, outline_statistics TEXT, error TEXT, created REAL, updated REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sections (job_id TEXT, title TEXT, content TEXT, statistics TEXT, created REAL, inputs TEXT, "
+                     "PRIMARY KEY (job_id, title))")
+        # Stores created before sections recorded their inputs gain the column; their sections keep None
+        if "inputs" not in [row[1] for row in conn.execute("PRAGMA table_info(sections)")]:
+            conn.execute("ALTER TABLE sections ADD COLUMN inputs TEXT")
+
+    def create(self, source, outline_model, content_model):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.lock, self.database.connect() as conn:
+            conn.execute("INSERT INTO jobs (id, source, outline_model, content_model, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (job_id, source, outline_model, content_model, "queued", now, now))
+            self._expire(conn, now)
+        return Job(self, job_id, source, outline_model, content_model, created=now, updated=now)
+
+    def get(self, job_id):
+        """
+        Returns the Job with this ID, or None if it doesn't exist or has expired.
+        """
+        with self.lock, self.database.connect() as conn:
+            row = conn.execute("SELECT source, outline_model, content_model, status, transcript, structure, outline_statistics, error, created, updated "
+                               "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        source, outline_model, content_model, status, transcript, structure, outline_statistics, error, created, updated = row
+        return Job(self, job_id, source, outline_model, content_model, status, transcript, json.loads(structure) if structure else None,
+                   statistics_from_dict(json.loads(outline_statistics)) if outline_statistics else None, error, created, updated)
+
+    def update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        with self.lock, self.database.connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?", (*fields.values(), job_id))
+
+    def save_section(self, job_id, title, content, statistics, inputs=None):
+        now = time.time()
+        with self.lock, self.database.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sections (job_id, title, content, statistics, created, inputs) VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, title, content, json.dumps(statistics.to_dict()), now, inputs))
+            conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+
+    def get_sections(self, job_id):
+        with self.lock, self.database.connect() as conn:
+            rows = conn.execute("SELECT title, content, statistics FROM sections WHERE job_id = ? ORDER BY created", (job_id,)).fetchall()
+        return {title: (content, statistics_from_dict(json.loads(statistics))) for title, content, statistics in rows}
+
+    def get_section_inputs(self, job_id):
+        with self.lock, self.database.connect() as conn:
+            rows = conn.execute("SELECT title, inputs FROM sections WHERE job_id = ?", (job_id,)).fetchall()
+        return dict(rows)
+
+    def revise(self, job, outline_model, content_model, structure=None, outline_statistics=None, sections=()):
+        revision = self.create(job.source, outline_model, content_model)
+        revision.save_transcript(job.transcript)
+        if structure is not None:
+            revision.save_outline(structure, outline_statistics or GenerationStatistics(model_name=outline_model))
+        if sections:
+            with self.lock, self.database.connect() as conn:
+                conn.execute(f"INSERT INTO sections (job_id, title, content, statistics, created, inputs) "
+                             f"SELECT ?, title, content, statistics, created, inputs FROM sections WHERE job_id = ? AND title IN ({', '.join('?' * len(sections))})",
+                             (revision.id, job.id, *sections))
+        return revision
+
+    def activate(self, job_id):
+        with self.lock:
+            self.active.add(job_id)
+
+    def deactivate(self, job_id):
+        with self.lock:
+            self.active.discard(job_id)
+
+    def is_active(self, job_id):
+        with self.lock:
+            return job_id in self.active
+
+    def _expire(self, conn, now):
+        conn.execute("DELETE FROM sections WHERE job_id IN (SELECT id FROM jobs WHERE updated < ?)", (now - self.ttl,))
+        conn.execute("DELETE FROM jobs WHERE updated < ?", (now - self.ttl,))
+
+
+job_store = JobStore()
@@ -1,125 +1,138 @@
 import streamlit as st
-from groq import Groq
 import json
+import math
 import os
-from io import BytesIO
-from md2pdf.core import md2pdf
+import tempfile
+import time
 from dotenv import load_dotenv
-from download import download_video_audio, delete_download, MAX_FILE_SIZE, FILE_TOO_LARGE_MESSAGE
+from download import delete_download, is_playlist_link, list_playlist_videos, FILE_TOO_LARGE_MESSAGE
+from sections import flatten_structure, SectionStore, MAX_CONCURRENT_SECTIONS
+from engine import get_markdown_content, get_timeline, get_section_timestamps, is_youtube_link, revise_job
+from cache import get_youtube_video_id
+from retrieval import format_timestamp
+from export import exporter, EXPORT_MIME_TYPES, EXPORT_EXTENSIONS
+from rate_limit import CONTENT_MODELS
+from clients import client_pool
+from stats import GenerationStatistics
+from jobs import job_store
+from runner import job_runner
+from media import media_library, SAMPLE_AUDIO
 
 load_dotenv()
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", None)
+NOTES_FLUSH_INTERVAL = 0.075  # Seconds between redraws of streaming sections
+JOB_POLL_INTERVAL = 0.5  # Seconds between redraws of a job running in the background
+TRANSCRIPT_PAGE_SEGMENTS = 60  # Timestamped segments per page of the transcript view
+TRANSCRIPT_PAGE_CHARS = 8000  # Characters per page of the transcript view when it has no timestamps
 audio_file_path = None
+job = None
 
 if 'api_key' not in st.session_state:
     st.session_state.api_key = GROQ_API_KEY
 
-if 'groq' not in st.session_state:
-    if GROQ_API_KEY:
-        st.session_state.groq = Groq()
-
 st.set_page_config(
     page_title="ScribeWizard",
     page_icon="🧙‍♂️",
 )
-      
-class GenerationStatistics:
-    def __init__(self, input_time=0,output_time=0,input_tokens=0,output_tokens=0,total_time=0,model_name="llama3-8b-8192"):
-        self.input_time = input_time
-        self.output_time = output_time
-        self.input_tokens = input_tokens
-        self.output_tokens = output_tokens
-        self.total_time = total_time # Sum of queue, prompt (input), and completion (output) times
-        self.model_name = model_name
-
-    def get_input_speed(self):
-        """ 
-        Tokens per second calculation for input
-        """
-        if self.input_time != 0:
-            return self.input_tokens / self.input_time
-        else:
-            return 0
-    
-    def get_output_speed(self):
-        """ 
-        Tokens per second calculation for output
-        """
-        if self.output_time != 0:
-            return self.output_tokens / self.output_time
-        else:
-            return 0
-    
-    def add(self, other):
-        """
-        Add statistics from another GenerationStatistics object to this one.
-        """
-        if not isinstance(other, GenerationStatistics):
-            raise TypeError("Can only add GenerationStatistics objects")
-        
-        self.input_time += other.input_time
-        self.output_time += other.output_time
-        self.input_tokens += other.input_tokens
-        self.output_tokens += other.output_tokens
-        self.total_time += other.total_time
-
-    def __str__(self):
-        return (f"\n## {self.get_output_speed():.2f} T/s ⚡\nRound trip time: {self.total_time:.2f}s  Model: {self.model_name}\n\n"
-                f"| Metric          | Input          | Output          | Total          |\n"
-                f"|-----------------|----------------|-----------------|----------------|\n"
-                f"| Speed (T/s)     | {self.get_input_speed():.2f}            | {self.get_output_speed():.2f}            | {(self.input_tokens + self.output_tokens) / self.total_time if self.total_time != 0 else 0:.2f}            |\n"
-                f"| Tokens          | {self.input_tokens}            | {self.output_tokens}            | {self.input_tokens + self.output_tokens}            |\n"
-                f"| Inference Time (s) | {self.input_time:.2f}            | {self.output_time:.2f}            | {self.total_time:.2f}            |")
+
+# Start the PDF workers now so WeasyPrint has loaded by the time notes are ready
+exporter.warm_up()
+# Likewise import groq and connect to the API in the background, once per server process
+if GROQ_API_KEY:
+    client_pool.warm_up(GROQ_API_KEY)
+
+def format_timestamp_link(seconds, source=None):
+    """
+    Returns a markdown timestamp, linked to that moment of the video when the source is a YouTube link.
+    """
+    timestamp = format_timestamp(seconds)
+    if source and is_youtube_link(source) and (video_id := get_youtube_video_id(source)):
+        return f"[{timestamp}](https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s)"
+    return f"`{timestamp}`"
+
+def get_transcript_page(transcript, page):
+    """
+    Returns one TRANSCRIPT_PAGE_CHARS page of a transcript without timestamps, cut between words.
+    """
+    def cut(position):
+        if position <= 0 or position >= len(transcript):
+            return min(max(position, 0), len(transcript))
+        index = transcript.rfind(" ", position - TRANSCRIPT_PAGE_CHARS // 2, position)
+        return index if index > 0 else position
+    return transcript[cut((page - 1) * TRANSCRIPT_PAGE_CHARS):cut(page * TRANSCRIPT_PAGE_CHARS)]
+
+def show_transcript(transcript, timeline=None, source=None, key="transcript_page"):
+    """
+    Renders the raw transcript one page at a time, so a long recording isn't sent to the browser whole on every rerun.
+    With a timeline, each segment starts with its timestamp.
+    """
+    st.markdown("## Raw transcript:")
+    if timeline:
+        pages = math.ceil(len(timeline) / TRANSCRIPT_PAGE_SEGMENTS)
+    else:
+        pages = max(math.ceil(len(transcript) / TRANSCRIPT_PAGE_CHARS), 1)
+    page = st.number_input(f"Transcript page (of {pages})", min_value=1, max_value=pages, key=key) if pages > 1 else 1
+    if timeline:
+        first = (page - 1) * TRANSCRIPT_PAGE_SEGMENTS
+        segments = timeline.get_segments(transcript, first, first + TRANSCRIPT_PAGE_SEGMENTS)
+        st.markdown("\n\n".join(f"{format_timestamp_link(start, source)} {text}" for start, end, text in segments))
+    else:
+        st.markdown(get_transcript_page(transcript, page))
+    st.markdown("---")
 
 class NoteSection:
-    def __init__(self, structure, transcript):
+    def __init__(self, structure, transcript, timeline=None, source=None, key="transcript_page", with_transcript=True):
         self.structure = structure
-        self.contents = {title: "" for title in self.flatten_structure(structure)}
+        self.contents = SectionStore(structure)
         self.placeholders = {title: st.empty() for title in self.flatten_structure(structure)}
+        self.rendered = {}  # Markdown last drawn for each section
+        self.last_flush = 0.0
+        self.source = source
+        # Start times of the transcript segments each section was written from
+        self.timestamps = get_section_timestamps(transcript, structure, timeline)
 
-        st.markdown("## Raw transcript:")
-        st.markdown(transcript)
-        st.markdown("---")
+        if with_transcript:
+            show_transcript(transcript, timeline, source, key)
 
     def flatten_structure(self, structure):
-        sections = []
-        for title, content in structure.items():
-            sections.append(title)
-            if isinstance(content, dict):
-                sections.extend(self.flatten_structure(content))
-        return sections
+        return flatten_structure(structure)
 
     def update_content(self, title, new_content):
-        try:
-            self.contents[title] += new_content
+        if not isinstance(new_content, str):
+            return
+        self.contents.append(title, new_content)
+        # Tokens arrive far faster than the page can redraw, so changed sections are rendered in batches
+        if time.monotonic() - self.last_flush >= NOTES_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Renders every section that changed since the last flush.
+        """
+        for title in self.contents.take_updated():
             self.display_content(title)
-        except TypeError as e:
-            pass
+        self.last_flush = time.monotonic()
+
+    def format_content(self, title):
+        content = self.contents.get(title)
+        if self.timestamps.get(title):
+            content += "\n\n*Transcript:* " + " · ".join(format_timestamp_link(start, self.source) for start in self.timestamps[title])
+        return content
 
     def display_content(self, title):
-        if self.contents[title].strip():
-            self.placeholders[title].markdown(f"## {title}\n{self.contents[title]}")
-
-    def return_existing_contents(self, level=1) -> str:
-        existing_content = ""
-        for title, content in self.structure.items():
-            if self.contents[title].strip():  # Only include title if there is content
-                existing_content += f"{'#' * level} {title}\n{self.contents[title]}.\n\n"
-            if isinstance(content, dict):
-                existing_content += self.get_markdown_content(content, level + 1)
-        return existing_content
+        if self.contents.get(title).strip():
+            self.rendered[title] = f"## {title}\n{self.format_content(title)}"
+            self.placeholders[title].markdown(self.rendered[title])
 
-    def display_structure(self, structure=None, level=1):
-        if structure is None:
-            structure = self.structure
-        
-        for title, content in structure.items():
-            if self.contents[title].strip():  # Only display title if there is content
-                st.markdown(f"{'#' * level} {title}")
-                self.placeholders[title].markdown(self.contents[title])
-            if isinstance(content, dict):
-                self.display_structure(content, level + 1)
+    def redraw(self):
+        """
+        Draws every section into new placeholders without formatting it again, for a fragment rerun,
+        which clears what the previous run drew.
+        """
+        self.placeholders = {title: st.empty() for title in self.flatten_structure(self.structure)}
+        for title, markdown in self.rendered.items():
+            self.placeholders[title].markdown(markdown)
 
     def display_toc(self, structure, columns, level=1, col_index=0):
         for title, content in structure.items():
@@ -135,119 +148,99 @@ class NoteSection:
         Returns the markdown styled pure string with the contents.
         """
         if structure is None:
-            structure = self.structure
-        
-        markdown_content = ""
-        for title, content in structure.items():
-            if self.contents[title].strip():  # Only include title if there is content
-                markdown_content += f"{'#' * level} {title}\n{self.contents[title]}.\n\n"
-            if isinstance(content, dict):
-                markdown_content += self.get_markdown_content(content, level + 1)
-        return markdown_content
+            return self.contents.get_markdown_content()
+        return get_markdown_content(structure, self.contents, level)
 
-def create_markdown_file(content: str) -> BytesIO:
+def show_job(job):
     """
-    Create a Markdown file from the provided content.
+    Renders what a job has checkpointed so far, so a refreshed page picks up where it was.
     """
-    markdown_file = BytesIO()
-    markdown_file.write(content.encode('utf-8'))
-    markdown_file.seek(0)
-    return markdown_file
-
-def create_pdf_file(content: str):
+    st.session_state.notes = NoteSection(structure=job.structure, transcript=job.transcript, timeline=get_timeline(job.transcript),
+                                         source=job.source, key=f"transcript_page_{job.id}")
+    for title, (content, statistics) in job.get_sections().items():
+        if title in st.session_state.notes.contents:
+            st.session_state.notes.update_content(title, content)
+    st.session_state.notes.flush()
+
+def show_job_statistics(job):
+    content_statistics = GenerationStatistics(model_name=job.content_model)
+    for content, statistics in job.get_sections().values():
+        content_statistics.add(statistics)
+    return str(job.outline_statistics) + str(content_statistics)
+
+def parse_edited_outline(text, structure):
     """
-    Create a PDF file from the provided content.
+    Returns the outline edited in the app, or None if it is unchanged. Raises ValueError if it isn't an outline.
     """
-    pdf_buffer = BytesIO()
-    md2pdf(pdf_buffer, md_content=content)
-    pdf_buffer.seek(0)
-    return pdf_buffer
-
-def transcribe_audio(audio_file):
+    def is_outline(value):
+        return isinstance(value, dict) and bool(value) and all(isinstance(content, str) or is_outline(content) for content in value.values())
+
+    try:
+        edited = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The edited notes outline is not valid JSON: {e}")
+    if not is_outline(edited):
+        raise ValueError("The notes outline must map each section title to a description or to its subsections.")
+    return None if edited == structure else edited
+
+def describe_error(error):
+    if isinstance(error, json.JSONDecodeError):
+        return "Failed to decode the notes structure. Please try again."
+    if hasattr(error, 'status_code') and error.status_code == 413:
+        # Long audio is split into chunks before upload, so this only happens if a single chunk is rejected.
+        return FILE_TOO_LARGE_MESSAGE
+    return str(error)
+
+@st.experimental_fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_status(job_id, stage):
     """
-    Transcribes audio using Groq's Whisper API.
+    Polls a running job's status and statistics. When the job reaches a new stage the whole page reruns,
+    so the transcript and the notes layout are drawn once rather than on every poll.
     """
-    transcription = st.session_state.groq.audio.transcriptions.create(
-      file=audio_file,
-      model="whisper-large-v3",
-      prompt="",
-      response_format="json",
-      language="en",
-      temperature=0.0 
-    )
-
-    results = transcription.text
-    return results
-
-def generate_notes_structure(transcript: str, model: str = "llama3-70b-8192"):
+    progress = job_runner.get(job_id)
+    if progress.get_stage() != stage:
+        st.rerun()
+    if stage == "queued":
+        st.write(f"Queued, {job_runner.get_queue_position(job_id)} job(s) ahead ⏳")
+    else:
+        st.write(progress.status)
+    if progress.download_status:
+        st.write(progress.download_status)
+    if statistics_text := progress.get_statistics_text():
+        st.markdown(statistics_text + "\n\n---\n")
+
+@st.experimental_fragment(run_every=JOB_POLL_INTERVAL)
+def show_job_sections(job_id):
     """
-    Returns notes structure content as well as total tokens and total time for generation.
+    Polls the sections a running job has streamed so far into a NoteSection kept for the session. Only what the
+    sections gained since the last poll is copied, and only those sections are formatted and drawn again.
     """
-
-    shot_example = """
-"Introduction": "Introduction to the AMA session, including the topic of Groq scaling architecture and the panelists",
-"Panelist Introductions": "Brief introductions from Igor, Andrew, and Omar, covering their backgrounds and roles at Groq",
-"Groq Scaling Architecture Overview": "High-level overview of Groq's scaling architecture, covering hardware, software, and cloud components",
-"Hardware Perspective": "Igor's overview of Groq's hardware approach, using an analogy of city traffic management to explain the traditional compute approach and Groq's innovative approach",
-"Traditional Compute": "Description of traditional compute approach, including asynchronous nature, queues, and poor utilization of infrastructure",
-"Groq's Approach": "Description of Groq's approach, including pre-orchestrated movement of data, low latency, high energy efficiency, and high utilization of resources",
-"Hardware Implementation": "Igor's explanation of the hardware implementation, including a comparison of GPU and LPU architectures"
-}"""
-    completion = st.session_state.groq.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": "Write in JSON format:\n\n{\"Title of section goes here\":\"Description of section goes here\",\"Title of section goes here\":\"Description of section goes here\",\"Title of section goes here\":\"Description of section goes here\"}"
-            },
-            {
-                "role": "user",
-                "content": f"### Transcript {transcript}\n\n### Example\n\n{shot_example}### Instructions\n\nCreate a structure for comprehensive notes on the above transcribed audio. Section titles and content descriptions must be comprehensive. Quality over quantity."
-            }
-        ],
-        temperature=0.3,
-        max_tokens=8000,
-        top_p=1,
-        stream=False,
-        response_format={"type": "json_object"},
-        stop=None,
-    )
-
-    usage = completion.usage
-    statistics_to_return = GenerationStatistics(input_time=usage.prompt_time, output_time=usage.completion_time, input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens, total_time=usage.total_time, model_name=model)
-
-    return statistics_to_return, completion.choices[0].message.content
-
-def generate_section(transcript: str, existing_notes: str, section: str, model: str = "llama3-8b-8192"):
-    stream = st.session_state.groq.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert writer. Generate a comprehensive note for the section provided based factually on the transcript provided. Do *not* repeat any content from previous sections."
-            },
-            {
-                "role": "user",
-                "content": f"### Transcript\n\n{transcript}\n\n### Existing Notes\n\n{existing_notes}\n\n### Instructions\n\nGenerate comprehensive notes for this section only based on the transcript: \n\n{section}"
-            }
-        ],
-        temperature=0.3,
-        max_tokens=8000,
-        top_p=1,
-        stream=True,
-        stop=None,
-    )
-
-    for chunk in stream:
-        tokens = chunk.choices[0].delta.content
-        if tokens:
-            yield tokens
-        if x_groq := chunk.x_groq:
-            if not x_groq.usage:
-                continue
-            usage = x_groq.usage
-            statistics_to_return = GenerationStatistics(input_time=usage.prompt_time, output_time=usage.completion_time, input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens, total_time=usage.total_time, model_name=model)
-            yield statistics_to_return
+    progress = job_runner.get(job_id)
+    if progress.structure is None:
+        return
+    live_job_id, notes = st.session_state.get("live_notes", (None, None))
+    if live_job_id != job_id or notes.structure != progress.structure:
+        # The outline grew while it streamed, so the sections and their timestamps are laid out again
+        notes = NoteSection(structure=dict(progress.structure), transcript=progress.transcript, timeline=get_timeline(progress.transcript),
+                            source=progress.job.source, with_transcript=False)
+        st.session_state.live_notes = (job_id, notes)
+    else:
+        notes.redraw()
+    lengths = {title: len(notes.contents.get(title)) for title in notes.placeholders}
+    for title, text in progress.get_new_content(lengths).items():
+        if title in notes.contents:
+            notes.update_content(title, text)
+    notes.flush()
+
+def save_uploaded_file(uploaded_file) -> str:
+    """
+    Writes an uploaded file to a temporary path on disk so it can be split into chunks.
+    """
+    os.makedirs("./downloads/uploads", exist_ok=True)
+    suffix = os.path.splitext(uploaded_file.name)[1]
+    with tempfile.NamedTemporaryFile(dir="./downloads/uploads", suffix=suffix, delete=False) as f:
+        f.write(uploaded_file.getbuffer())
+    return f.name
 
 # Initialize
 if 'button_disabled' not in st.session_state:
@@ -256,8 +249,8 @@ if 'button_disabled' not in st.session_state:
 if 'button_text' not in st.session_state:
     st.session_state.button_text = "Generate Notes"
 
-if 'statistics_text' not in st.session_state:
-    st.session_state.statistics_text = ""
+if 'job_ids' not in st.session_state:
+    st.session_state.job_ids = []
 
 st.write("""
 # ScribeWizard: Create structured notes from audio 🗒️⚡
@@ -274,21 +267,6 @@ def empty_st():
 
 try:
     with st.sidebar:
-        audio_files = {
-            "Transformers Explained by Google Cloud Tech": {
-                "file_path": "assets/audio/transformers_explained.m4a",
-                "youtube_link": "https://www.youtube.com/watch?v=SZorAJ4I-sA"
-            },
-            "The Essence of Calculus by 3Blue1Brown": {
-                "file_path": "assets/audio/essence_calculus.m4a",
-                "youtube_link": "https://www.youtube.com/watch?v=WUvTyaaNkzM"
-            },
-            "First 20 minutes of Groq's AMA": {
-                "file_path": "assets/audio/groq_ama_trimmed_20min.m4a",
-                "youtube_link": "https://www.youtube.com/watch?v=UztfweS-7MU"
-            }
-        }
-
         st.write(f"# 🧙‍♂️ ScribeWizard \n## Generate notes from audio in seconds using Groq, Whisper, and Llama3")
         st.markdown(f"[Github Repository](https://github.com/bklieger/scribewizard)\n\nAs with all generative AI, content may include inaccurate or placeholder information. ScribeWizard is in beta and all feedback is welcome!")
 
@@ -296,21 +274,19 @@ try:
 
         st.write(f"# Sample Audio Files")
 
-        for audio_name, audio_info in audio_files.items():
+        for audio_name, audio_info in SAMPLE_AUDIO.items():
 
             st.write(f"### {audio_name}")
-            
-            # Read audio file as binary
-            with open(audio_info['file_path'], 'rb') as audio_file:
-                audio_bytes = audio_file.read()
-
-            # Create download button
-            st.download_button(
-                label=f"Download audio",
-                data=audio_bytes,
-                file_name=audio_info['file_path'],
-                mime='audio/m4a'
-            )
+
+            # Sample files are read once per server process and shared by every session and rerun
+            asset = media_library.get(audio_info['file_path'])
+            if asset.exists():
+                st.download_button(
+                    label=f"Download audio",
+                    data=asset.get_bytes(),
+                    file_name=asset.file_name,
+                    mime=asset.mime_type
+                )
             
             st.markdown(f"[Credit Youtube Link]({audio_info['youtube_link']})")
             st.write(f"\n\n")
@@ -321,38 +297,53 @@ try:
         st.write(f"By default, ScribeWizard uses Llama3-70b for generating the notes outline and Llama3-8b for the content. This balances quality with speed and rate limit usage. You can customize these selections below.")
         outline_model_options = ["llama3-70b-8192", "llama3-8b-8192", "mixtral-8x7b-32768", "gemma-7b-it"]
         outline_selected_model = st.selectbox("Outline generation:", outline_model_options)
-        content_model_options = ["llama3-8b-8192", "llama3-70b-8192", "mixtral-8x7b-32768", "gemma-7b-it", "gemma2-9b-it"]
+        content_model_options = CONTENT_MODELS
         content_selected_model = st.selectbox("Content generation:", content_model_options)
+        max_concurrent_sections = st.slider("Sections generated in parallel:", min_value=1, max_value=8, value=MAX_CONCURRENT_SECTIONS)
 
         
         # Add note about rate limits
-        st.info("Important: Different models have different token and rate limits which may cause runtime errors.")
+        st.info("Important: Different models have different token and rate limits. When the selected model is saturated, requests wait, retry and may fall back to another model.")
+
+        # Jobs keep running in the background, so earlier ones can be reopened while newer ones generate
+        if st.session_state.job_ids:
+            st.write(f"---")
+            st.write(f"# Your Jobs")
+            for job_id in reversed(st.session_state.job_ids):
+                listed_job = job_store.get(job_id)
+                if listed_job is None:
+                    continue
+                progress = job_runner.get(job_id)
+                job_status = progress.get_stage() if progress is not None and not progress.done.is_set() else listed_job.get_status()
+                if st.button(f"{listed_job.source} ({job_status})", key=f"job_{job_id}"):
+                    st.query_params["job"] = job_id
+                    st.rerun()
     
 
     if st.button('End Generation and Download Notes'):
         if "notes" in st.session_state:
+            markdown_content = st.session_state.notes.get_markdown_content()
 
-            # Create markdown file
-            markdown_file = create_markdown_file(st.session_state.notes.get_markdown_content())
-            st.download_button(
-                label='Download Text',
-                data=markdown_file,
-                file_name='generated_notes.txt',
-                mime='text/plain'
-            )
-
-            # Create pdf file (styled)
-            pdf_file = create_pdf_file(st.session_state.notes.get_markdown_content())
-            st.download_button(
-                label='Download PDF',
-                data=pdf_file,
-                file_name='generated_notes.pdf',
-                mime='application/pdf'
-            )
+            # Text, HTML and DOCX are cheap to build; the PDF was usually rendered in the background when generation finished
+            for fmt, label in [("markdown", "Download Text"), ("html", "Download HTML"), ("docx", "Download DOCX"), ("pdf", "Download PDF")]:
+                if fmt == "pdf":
+                    with st.spinner("Rendering PDF..."):
+                        data = exporter.export(markdown_content, fmt)
+                else:
+                    data = exporter.export(markdown_content, fmt)
+                st.download_button(
+                    label=label,
+                    data=data,
+                    file_name=f'generated_notes.{EXPORT_EXTENSIONS[fmt]}',
+                    mime=EXPORT_MIME_TYPES[fmt]
+                )
             st.session_state.button_disabled = False
         else:
             raise ValueError("Please generate content first before downloading the notes.")
 
+    # The job ID is kept in the URL, so a refresh reattaches to the job's checkpoints
+    attached_job = job_store.get(st.query_params["job"]) if "job" in st.query_params else None
+
     input_method = st.radio("Choose input method:", ["Upload audio file", "YouTube link"])
     audio_file = None
     youtube_link = None
@@ -366,129 +357,101 @@ try:
         if input_method == "Upload audio file":
             audio_file = st.file_uploader("Upload an audio file", type=["mp3", "wav", "m4a"]) # TODO: Add a max size
         else:
-            youtube_link = st.text_input("Enter YouTube link:", "")
+            youtube_link = st.text_input("Enter YouTube link (a video, playlist or channel):", "")
 
         # Generate button
         submitted = st.form_submit_button(st.session_state.button_text, on_click=disable, disabled=st.session_state.button_disabled)
 
-        #processing status
-        status_text = st.empty()
-        def display_status(text):
-            status_text.write(text)
-
-        def clear_status():
-            status_text.empty()
-
-        download_status_text = st.empty()
-        def display_download_status(text:str):
-            download_status_text.write(text)    
-
-        def clear_download_status():
-            download_status_text.empty()
-        
-        # Statistics
-        placeholder = st.empty()
-        def display_statistics():
-            with placeholder.container():
-                if st.session_state.statistics_text:
-                    if "Transcribing audio in background" not in st.session_state.statistics_text:
-                        st.markdown(st.session_state.statistics_text + "\n\n---\n")  # Format with line if showing statistics
-                    else:
-                        st.markdown(st.session_state.statistics_text)
-                else:
-                    placeholder.empty()
-
-        if submitted:
-            if input_method == "Upload audio file" and audio_file is None:
+        resumed = False
+        regenerated = False
+        edited_outline = None
+        if attached_job is not None and not submitted and not job_runner.is_running(attached_job.id):
+            job_status = attached_job.get_status()
+            st.info(f"Job {attached_job.id} ({attached_job.source}): {job_status}, {attached_job.get_progress()}."
+                    + (f" Error: {attached_job.error}" if attached_job.error and job_status == "failed" else ""))
+            # An upload is deleted when its run ends, so a job can only resume without a transcript from a YouTube link
+            if attached_job.is_resumable() and (attached_job.transcript is not None or is_youtube_link(attached_job.source)):
+                resumed = st.form_submit_button("Resume Generation", on_click=disable, disabled=st.session_state.button_disabled)
+            elif attached_job.is_resumable():
+                st.warning("This job failed before its audio was transcribed. Please upload the file again.")
+            if attached_job.transcript is not None:
+                # A revision keeps the transcript, and the outline and sections whose inputs didn't change
+                if attached_job.structure is not None:
+                    edited_outline = st.text_area("Notes outline (edit entries to regenerate only those sections):",
+                                                  json.dumps(attached_job.structure, indent=2), height=300)
+                regenerated = st.form_submit_button("Regenerate with Selected Models", on_click=disable, disabled=st.session_state.button_disabled)
+
+        if submitted or resumed or regenerated:
+            # Clients are shared by every session using the same key, along with their open connections
+            groq_client = client_pool.get(GROQ_API_KEY or groq_input_key)
+
+            # Jobs run on the server's worker pool; this script run only queues them, so reruns and refreshes don't stop them
+            if resumed:
+                resume_source = attached_job.source if attached_job.transcript is None else None
+                job_runner.submit(groq_client, attached_job, resume_source, max_concurrent_sections=max_concurrent_sections)
+                st.session_state.button_disabled = False
+                st.rerun()
+            elif regenerated:
+                structure = parse_edited_outline(edited_outline, attached_job.structure) if edited_outline is not None else None
+                revision = revise_job(attached_job, str(outline_selected_model), str(content_selected_model), structure)
+                job_runner.submit(groq_client, revision, max_concurrent_sections=max_concurrent_sections)
+                st.session_state.job_ids.append(revision.id)
+                st.query_params["job"] = revision.id
+                st.session_state.button_disabled = False
+                st.rerun()
+            elif input_method == "Upload audio file" and audio_file is None:
                 st.error("Please upload an audio file")
             elif input_method == "YouTube link" and not youtube_link:
                 st.error("Please enter a YouTube link")
+            elif input_method == "YouTube link" and is_playlist_link(youtube_link):
+                # A playlist or channel becomes one job per video, which the worker pool works through in order
+                with st.spinner("Listing videos..."):
+                    videos = list_playlist_videos(youtube_link)
+                if not videos:
+                    st.error("No videos found at this link")
+                for video_url, video_title in videos:
+                    video_job = job_store.create(video_url, str(outline_selected_model), str(content_selected_model))
+                    job_runner.submit(groq_client, video_job, video_url, max_concurrent_sections=max_concurrent_sections)
+                    st.session_state.job_ids.append(video_job.id)
+                if videos:
+                    st.query_params["job"] = st.session_state.job_ids[-len(videos)]
+                    st.session_state.button_disabled = False
+                    st.rerun()
             else:
-                st.session_state.button_disabled = True
-                # Show temporary message before transcription is generated and statistics show
-            
-            audio_file_path = None
-
-            if input_method == "YouTube link":
-                display_status("Downloading audio from YouTube link ....")
-                audio_file_path = download_video_audio(youtube_link, display_download_status)
-                if audio_file_path is None:
-                    st.error("Failed to download audio from YouTube link. Please try again.")
-                    enable()
-                    clear_status()
-                else:
-                    # Read the downloaded file and create a file-like objec
-                    display_status("Processing Youtube audio ....")
-                    with open(audio_file_path, 'rb') as f:
-                        file_contents = f.read()
-                    audio_file = BytesIO(file_contents)
-
-                    # Check size first to ensure will work with Whisper
-                    if os.path.getsize(audio_file_path) > MAX_FILE_SIZE:
-                        raise ValueError(FILE_TOO_LARGE_MESSAGE)
-
-                    audio_file.name = os.path.basename(audio_file_path)  # Set the file name
-                    delete_download(audio_file_path)
-                clear_download_status()
-
-            if not GROQ_API_KEY:
-                st.session_state.groq = Groq(api_key=groq_input_key)
-
-            display_status("Transcribing audio in background....")
-            transcription_text = transcribe_audio(audio_file)
-
-            display_statistics()
-            
-
-            display_status("Generating notes structure....")
-            large_model_generation_statistics, notes_structure = generate_notes_structure(transcription_text, model=str(outline_selected_model))
-            print("Structure: ",notes_structure)
-
-            display_status("Generating notes ...")
-            total_generation_statistics = GenerationStatistics(model_name=str(content_selected_model))
-            clear_status()
-
-
-            try:
-                notes_structure_json = json.loads(notes_structure)
-                notes = NoteSection(structure=notes_structure_json,transcript=transcription_text)
-                
-                if 'notes' not in st.session_state:
-                    st.session_state.notes = notes
-
-                st.session_state.notes.display_structure()
-
-                def stream_section_content(sections):
-                    for title, content in sections.items():
-                        if isinstance(content, str):
-                            content_stream = generate_section(transcript=transcription_text, existing_notes=notes.return_existing_contents(), section=(title + ": " + content),model=str(content_selected_model))
-                            for chunk in content_stream:
-                                # Check if GenerationStatistics data is returned instead of str tokens
-                                chunk_data = chunk
-                                if type(chunk_data) == GenerationStatistics:
-                                    total_generation_statistics.add(chunk_data)
-                                    
-                                    st.session_state.statistics_text = str(total_generation_statistics)
-                                    display_statistics()
-                                elif chunk is not None:
-                                    st.session_state.notes.update_content(title, chunk)
-                        elif isinstance(content, dict):
-                            stream_section_content(content)
-
-                stream_section_content(notes_structure_json)
-            except json.JSONDecodeError:
-                st.error("Failed to decode the notes structure. Please try again.")
-
+                source = youtube_link
+                if input_method == "Upload audio file":
+                    audio_file_path = save_uploaded_file(audio_file)
+                    source = audio_file_path
+
+                job = job_store.create(audio_file.name if audio_file is not None else youtube_link, str(outline_selected_model), str(content_selected_model))
+                job_runner.submit(groq_client, job, source, audio_file_path, max_concurrent_sections)
+                audio_file_path = None  # The job deletes the upload once it is transcribed
+                st.session_state.job_ids.append(job.id)
+                st.query_params["job"] = job.id
+                st.session_state.button_disabled = False
+                st.rerun()
             enable()
 
+    job_progress = job_runner.get(attached_job.id) if attached_job is not None else None
+    if job_progress is not None and not job_progress.done.is_set():
+        st.session_state.notes = job_progress
+        show_job_status(attached_job.id, job_progress.get_stage())
+        if job_progress.transcript is not None:
+            show_transcript(job_progress.transcript, get_timeline(job_progress.transcript), attached_job.source, key=f"transcript_page_{attached_job.id}")
+        show_job_sections(attached_job.id)
+    elif attached_job is not None and attached_job.structure is not None:
+        statistics_text = job_progress.get_statistics_text() if job_progress is not None else show_job_statistics(attached_job)
+        st.markdown(statistics_text + "\n\n---\n")
+        show_job(attached_job)
+        if job_progress is not None and job_progress.error is not None:
+            st.error(describe_error(job_progress.error))
+    elif job_progress is not None and job_progress.error is not None:
+        st.error(describe_error(job_progress.error))
+
 except Exception as e:
     st.session_state.button_disabled = False
 
-    if hasattr(e, 'status_code') and e.status_code == 413:
-        # In the future, this limitation will be fixed as ScribeWizard will automatically split the audio file and transcribe each part.
-        st.error(FILE_TOO_LARGE_MESSAGE)
-    else:
-        st.error(e)
+    st.error(describe_error(e))
 
     if st.button("Clear"):
         st.rerun()
@@ -0,0 +1,79 @@
+import os
+import threading
+from contextlib import contextmanager
+
+AUDIO_MIME_TYPES = {".m4a": "audio/m4a", ".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg", ".flac": "audio/flac"}
+
+SAMPLE_AUDIO = {
+    "Transformers Explained by Google Cloud Tech": {
+        "file_path": "assets/audio/transformers_explained.m4a",
+        "youtube_link": "https://www.youtube.com/watch?v=SZorAJ4I-sA"
+    },
+    "The Essence of Calculus by 3Blue1Brown": {
+        "file_path": "assets/audio/essence_calculus.m4a",
+        "youtube_link": "https://www.youtube.com/watch?v=WUvTyaaNkzM"
+    },
+    "First 20 minutes of Groq's AMA": {
+        "file_path": "assets/audio/groq_ama_trimmed_20min.m4a",
+        "youtube_link": "https://www.youtube.com/watch?v=UztfweS-7MU"
+    }
+}
+
+
+def get_mime_type(path):
+    return AUDIO_MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+class MediaAsset:
+    """
+    A file served to every session, such as a sample recording. Its bytes are read on first use and then shared,
+    so a Streamlit rerun costs no disk reads or allocations. The file is read again if it changes on disk.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file_name = os.path.basename(path)
+        self.mime_type = get_mime_type(path)
+        self.data = None
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def get_bytes(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if self.signature != signature:
+                with open(self.path, "rb") as f:
+                    self.data = f.read()
+                self.signature = signature
+            return self.data
+
+
+class MediaLibrary:
+    """
+    Process-wide registry of MediaAssets by path.
+    """
+    def __init__(self):
+        self.assets = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            if path not in self.assets:
+                self.assets[path] = MediaAsset(path)
+            return self.assets[path]
+
+
+media_library = MediaLibrary()
+
+
+@contextmanager
+def open_upload(path):
+    """
+    Opens an audio file for upload as (file name, file object). The HTTP client sends it in small blocks straight
+    from the file, so the recording is never copied into memory whole, and it rewinds the file on every retry.
+    """
+    with open(path, "rb") as f:
+        yield os.path.basename(path), f
@@ -0,0 +1,360 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span, observe, bind_tracer, StreamTimer
+from stats import GenerationStatistics, statistics_from_usage
+from rate_limit import rate_limiter, estimate_request_tokens, create_completion, CHARS_PER_TOKEN
+
+OUTLINE_WINDOW_CHARS = 20000  # Roughly 5000 tokens, leaving room for the completion in an 8192 context
+OUTLINE_WINDOW_OVERLAP_CHARS = 500
+OUTLINE_MAX_WORKERS = 4
+PARTIAL_OUTLINE_MAX_TOKENS = 2000
+MERGE_MAX_TOKENS = 4000
+
+OUTLINE_SYSTEM_PROMPT = "Write in JSON format:\n\n{\"Title of section goes here\":\"Description of section goes here\",\"Title of section goes here\":\"Description of section goes here\",\"Title of section goes here\":\"Description of section goes here\"}"
+
+SHOT_EXAMPLE = """
+"Introduction": "Introduction to the AMA session, including the topic of Groq scaling architecture and the panelists",
+"Panelist Introductions": "Brief introductions from Igor, Andrew, and Omar, covering their backgrounds and roles at Groq",
+"Groq Scaling Architecture Overview": "High-level overview of Groq's scaling architecture, covering hardware, software, and cloud components",
+"Hardware Perspective": "Igor's overview of Groq's hardware approach, using an analogy of city traffic management to explain the traditional compute approach and Groq's innovative approach",
+"Traditional Compute": "Description of traditional compute approach, including asynchronous nature, queues, and poor utilization of infrastructure",
+"Groq's Approach": "Description of Groq's approach, including pre-orchestrated movement of data, low latency, high energy efficiency, and high utilization of resources",
+"Hardware Implementation": "Igor's explanation of the hardware implementation, including a comparison of GPU and LPU architectures"
+}"""
+
+MERGE_SYSTEM_PROMPT = "Write in JSON format. Values are either a description string or a nested object of subsections:\n\n{\"Title of section goes here\":\"Description of section goes here\",\"Title of section goes here\":{\"Title of subsection goes here\":\"Description of subsection goes here\"}}"
+
+
+def outline_messages(transcript: str):
+    return [
+        {
+            "role": "system",
+            "content": OUTLINE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"### Transcript {transcript}\n\n### Example\n\n{SHOT_EXAMPLE}### Instructions\n\nCreate a structure for comprehensive notes on the above transcribed audio. Section titles and content descriptions must be comprehensive. Quality over quantity."
+        }
+    ]
+
+
+def partial_outline_messages(window: str, index: int, total: int = None):
+    return [
+        {
+            "role": "system",
+            "content": OUTLINE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"### Transcript (part {index + 1}{f' of {total}' if total else ''})\n\n{window}\n\n### Example\n\n{SHOT_EXAMPLE}### Instructions\n\nCreate a structure for comprehensive notes on this part of the transcribed audio only. Section titles and content descriptions must be comprehensive. Quality over quantity."
+        }
+    ]
+
+
+def merge_messages(partial_outlines):
+    parts = "\n\n".join(f"### Part {index + 1}\n\n{json.dumps(outline, indent=1)}" for index, outline in enumerate(partial_outlines))
+    return [
+        {
+            "role": "system",
+            "content": MERGE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"{parts}\n\n### Instructions\n\nThese are outlines of consecutive parts of one transcribed audio. Merge them into a single structure for comprehensive notes. Combine sections that cover the same topic, keep the order of the audio, and nest closely related sections under a shared parent section. Keep the descriptions comprehensive."
+        }
+    ]
+
+
+class TranscriptWindower:
+    """
+    Cuts transcript text into windows of at most window_chars characters on sentence boundaries as it arrives,
+    repeating the last overlap_chars of each window at the start of the next.
+    """
+    def __init__(self, window_chars=OUTLINE_WINDOW_CHARS, overlap_chars=OUTLINE_WINDOW_OVERLAP_CHARS):
+        self.window_chars = window_chars
+        self.overlap_chars = overlap_chars
+        self.current = ""
+        self.pending = ""
+
+    def _add_sentence(self, sentence, windows):
+        if self.current and len(self.current) + len(sentence) + 1 > self.window_chars:
+            windows.append(self.current)
+            self.current = self.current[-self.overlap_chars:].split(" ", 1)[-1] if self.overlap_chars else ""
+        self.current = f"{self.current} {sentence}" if self.current else sentence
+
+    def add(self, text):
+        """
+        Adds text and returns the windows it completed. The last, possibly unfinished, sentence is held back.
+        """
+        windows = []
+        sentences = re.split(r"(?<=[.!?])\s+", f"{self.pending} {text}".strip())
+        self.pending = sentences.pop()
+        for sentence in sentences:
+            self._add_sentence(sentence, windows)
+        return windows
+
+    def finish(self):
+        windows = []
+        if self.pending:
+            self._add_sentence(self.pending, windows)
+            self.pending = ""
+        if self.current:
+            windows.append(self.current)
+            self.current = ""
+        return windows
+
+
+def outline_window_chars(model):
+    """
+    Window size for outlining with model: OUTLINE_WINDOW_CHARS, shrunk when a window's request would not fit in the
+    model's tokens per minute. A larger request has to wait for a completely full budget, which holds up every
+    other window behind it.
+    """
+    request_tokens = estimate_request_tokens(json.dumps(partial_outline_messages("", 0, 99)), PARTIAL_OUTLINE_MAX_TOKENS)
+    window_chars = (rate_limiter.get_token_limit(model) - request_tokens) * CHARS_PER_TOKEN
+    return max(4 * OUTLINE_WINDOW_OVERLAP_CHARS, min(OUTLINE_WINDOW_CHARS, window_chars))
+
+
+def split_windows(transcript: str, window_chars=OUTLINE_WINDOW_CHARS, overlap_chars=OUTLINE_WINDOW_OVERLAP_CHARS):
+    """
+    Splits a transcript into windows of at most window_chars characters on sentence boundaries,
+    repeating the last overlap_chars of each window at the start of the next.
+    """
+    windower = TranscriptWindower(window_chars, overlap_chars)
+    return windower.add(transcript) + windower.finish()
+
+
+def outline_request_options(model, messages, max_tokens):
+    return dict(
+        model=model,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=max_tokens,
+        top_p=1,
+        stream=False,
+        response_format={"type": "json_object"},
+        stop=None,
+    )
+
+
+def stream_outline_request_options(model, messages, max_tokens):
+    # Groq's JSON mode can't stream, so a streamed outline relies on the prompt and is validated once it is complete
+    options = outline_request_options(model, messages, max_tokens)
+    del options["response_format"]
+    options["stream"] = True
+    return options
+
+
+class OutlineStreamParser:
+    """
+    Incremental parser for an outline JSON object arriving in pieces. feed() returns the top-level (title, content)
+    pairs that the new text completed, so a section can be used as soon as it is outlined. Text around the object,
+    such as a code fence, is ignored.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.member = []  # Characters of the top-level member being read
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.closed = False
+        self.titles = set()
+
+    def _close_member(self):
+        text = "".join(self.member).strip()
+        self.member = []
+        if not text:
+            return []
+        try:
+            pairs = list(json.loads("{" + text + "}").items())
+        except json.JSONDecodeError:
+            return []  # Reported by finish(), which parses the whole text
+        self.titles.update(title for title, _ in pairs)
+        return pairs
+
+    def feed(self, text):
+        self.chunks.append(text)
+        pairs = []
+        for char in text:
+            if self.closed:
+                break
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.closed = True
+                    pairs.extend(self._close_member())
+                    continue
+            elif char == "," and self.depth == 1:
+                pairs.extend(self._close_member())
+                continue
+            self.member.append(char)
+        return pairs
+
+    def finish(self):
+        """
+        Parses the whole text and returns the pairs feed() didn't, if any.
+        Raises json.JSONDecodeError if the text doesn't contain a JSON object.
+        """
+        text = "".join(self.chunks)
+        start, end = text.find("{"), text.rfind("}")
+        structure = json.loads(text[start:end + 1] if -1 < start < end else text)
+        if not isinstance(structure, dict):
+            raise json.JSONDecodeError("Outline is not a JSON object", text, 0)
+        return [(title, content) for title, content in structure.items() if title not in self.titles]
+
+
+def stream_outline(client, messages, model, max_tokens):
+    """
+    Streams an outline completion and yields each top-level (title, content) pair as soon as it is complete,
+    then the GenerationStatistics of the call. Raises json.JSONDecodeError if the outline is not a JSON object.
+    """
+    timer = None
+
+    def request(chosen_model):
+        nonlocal timer
+        timer = StreamTimer(chosen_model)
+        return create_completion(client, **stream_outline_request_options(chosen_model, messages, max_tokens))
+
+    with span("outline_request", model=model) as attributes:
+        started = time.perf_counter()
+        # Outlines are cached under the requested model, so they wait for it instead of falling back
+        model, stream = rate_limiter.call(request, model, estimate_request_tokens(json.dumps(messages), max_tokens), fallback_models=())
+        attributes["model"] = model
+        parser = OutlineStreamParser()
+        statistics = GenerationStatistics(model_name=model)
+        for chunk in stream:
+            tokens = chunk.choices[0].delta.content
+            if tokens:
+                timer.tick()
+                yield from parser.feed(tokens)
+            if x_groq := chunk.x_groq:
+                if x_groq.usage:
+                    statistics = statistics_from_usage(x_groq.usage, model)
+        observe("request_seconds", time.perf_counter() - started, model=model)
+        yield from parser.finish()
+    yield statistics
+
+
+def request_outline(client, messages, model, max_tokens):
+    def request(chosen_model):
+        with span("outline_request", model=chosen_model):
+            started = time.perf_counter()
+            response = create_completion(client, **outline_request_options(chosen_model, messages, max_tokens))
+            observe("request_seconds", time.perf_counter() - started, model=chosen_model)
+        return response
+
+    model, completion = rate_limiter.call(request, model, estimate_request_tokens(json.dumps(messages), max_tokens), fallback_models=())
+    return statistics_from_usage(completion.usage, model), completion.choices[0].message.content
+
+
+def combine_outlines(partial_outlines):
+    """
+    Joins partial outlines in order, dropping sections whose title already appeared. Used when the merge pass fails.
+    """
+    combined = {}
+    seen = set()
+    for outline in partial_outlines:
+        for title, content in outline.items():
+            if title.strip().lower() not in seen:
+                seen.add(title.strip().lower())
+                combined[title] = content
+    return combined
+
+
+def parse_partial_outlines(results, model):
+    """
+    Adds up the statistics of the partial outline calls and parses their JSON, skipping any that are invalid.
+    """
+    total_statistics = GenerationStatistics(model_name=model)
+    partial_outlines = []
+    for statistics, content in results:
+        total_statistics.add(statistics)
+        try:
+            partial_outlines.append(json.loads(content))
+        except json.JSONDecodeError:
+            print(f"Skipping partial outline that is not valid JSON: {content[:200]}")
+    return total_statistics, partial_outlines
+
+
+def check_merged_outline(merged, partial_outlines):
+    """
+    Falls back to joining the partial outlines locally if the merge pass didn't return valid JSON.
+    """
+    try:
+        json.loads(merged)
+        return merged
+    except json.JSONDecodeError:
+        print("Merged outline is not valid JSON, combining partial outlines instead")
+        return json.dumps(combine_outlines(partial_outlines))
+
+
+def generate_outline(client, transcript: str, model: str, window_chars=None, max_workers=OUTLINE_MAX_WORKERS):
+    """
+    Returns notes structure content as well as the statistics for generating it. Transcripts that fit in one window
+    use a single call; longer ones get a partial outline per window, generated in parallel, and a merge pass.
+    Windows are outline_window_chars(model) long unless window_chars is given.
+    """
+    windows = split_windows(transcript, window_chars or outline_window_chars(model))
+    if len(windows) <= 1:
+        return request_outline(client, outline_messages(transcript), model, 8000)
+
+    def outline_window(index):
+        return request_outline(client, partial_outline_messages(windows[index], index, len(windows)), model, PARTIAL_OUTLINE_MAX_TOKENS)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bind_tracer(outline_window), range(len(windows))))
+
+    total_statistics, partial_outlines = parse_partial_outlines(results, model)
+    merge_statistics, merged = request_outline(client, merge_messages(partial_outlines), model, MERGE_MAX_TOKENS)
+    total_statistics.add(merge_statistics)
+    return total_statistics, check_merged_outline(merged, partial_outlines)
+
+
+def stream_outline_sections(client, transcript: str, model: str, window_chars=None, max_workers=OUTLINE_MAX_WORKERS):
+    """
+    Streaming version of generate_outline. Yields each top-level (title, content) pair of the outline as soon as it
+    has been generated, then the GenerationStatistics of all outline calls. For long transcripts only the merge pass
+    streams, since it needs every partial outline first.
+    """
+    windows = split_windows(transcript, window_chars or outline_window_chars(model))
+    if len(windows) <= 1:
+        yield from stream_outline(client, outline_messages(transcript), model, 8000)
+        return
+
+    def outline_window(index):
+        return request_outline(client, partial_outline_messages(windows[index], index, len(windows)), model, PARTIAL_OUTLINE_MAX_TOKENS)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bind_tracer(outline_window), range(len(windows))))
+
+    total_statistics, partial_outlines = parse_partial_outlines(results, model)
+    titles = set()
+    try:
+        for item in stream_outline(client, merge_messages(partial_outlines), model, MERGE_MAX_TOKENS):
+            if type(item) == GenerationStatistics:
+                total_statistics.add(item)
+            else:
+                titles.add(item[0])
+                yield item
+    except json.JSONDecodeError:
+        # Sections already yielded may be running, so the fallback only adds the ones the merge pass didn't reach
+        print("Merged outline is not valid JSON, combining partial outlines instead")
+        yield from ((title, content) for title, content in combine_outlines(partial_outlines).items() if title not in titles)
+    yield total_statistics
@@ -0,0 +1,165 @@
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+STDERR_TAIL_CHARS = 2000  # Characters of a dead worker's stderr quoted in the error
+
+
+class PdfWorkerError(RuntimeError):
+    """
+    A PDF worker exited without answering. starting is True if it never got as far as rendering.
+    """
+    def __init__(self, message, starting=False):
+        super().__init__(message)
+        self.starting = starting
+
+
+class PdfWorker:
+    """
+    One PDF renderer running as `python -m pdf_workers`, fed markdown over a pipe. It is started as a plain
+    subprocess of this module rather than by multiprocessing, whose spawned children re-run the parent's __main__
+    first; under Streamlit that is the app script. The worker reports whether it started before its first render,
+    and its stderr goes to a temporary file so a crash can be explained.
+    """
+    def __init__(self):
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen([sys.executable, "-m", "pdf_workers", str(request_read), str(response_write)],
+                                        cwd=MODULE_DIR, pass_fds=(request_read, response_write), stderr=self.stderr)
+        os.close(request_read)
+        os.close(response_write)
+        self.requests = Connection(request_write, readable=False)
+        self.responses = Connection(response_read, writable=False)
+        self.started = False
+
+    def render(self, markdown_content):
+        """
+        Returns the PDF bytes, or raises the renderer's exception, including one raised while the worker started.
+        Raises PdfWorkerError if the worker has exited.
+        """
+        if not self.started:
+            self._receive()
+            self.started = True
+        try:
+            self.requests.send(markdown_content)
+        except OSError:
+            raise self._exited() from None
+        return self._receive()
+
+    def _receive(self):
+        try:
+            succeeded, result = self.responses.recv()
+        except (EOFError, OSError):
+            raise self._exited() from None
+        if not succeeded:
+            raise result
+        return result
+
+    def _exited(self):
+        return PdfWorkerError(f"The PDF worker exited{'' if self.started else ' while starting'}: {self.get_stderr()}", starting=not self.started)
+
+    def get_stderr(self):
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        self.stderr.seek(0)
+        output = self.stderr.read().decode("utf-8", "replace").strip()
+        return output[-STDERR_TAIL_CHARS:] or f"exit code {self.process.poll()}"
+
+    def close(self):
+        self.requests.close()
+        self.responses.close()
+        self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+
+
+class PdfWorkerPool:
+    """
+    A fixed set of PdfWorkers, all started at once on first use. Each request waits for an idle worker on a thread of
+    its own, so callers get a Future, and a worker that dies (for example, killed for memory) is replaced. A worker
+    that fails to start, for example because a system library is missing, would fail again, so its error is raised
+    for every later request instead.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.idle = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-worker")
+        self.lock = threading.Lock()
+        self.started = False
+        self.startup_error = None
+
+    def start(self):
+        with self.lock:
+            if not self.started:
+                for _ in range(self.workers):
+                    self.idle.put(PdfWorker())
+                self.started = True
+
+    def submit(self, markdown_content):
+        self.start()
+        return self.executor.submit(self._render, markdown_content)
+
+    def _render(self, markdown_content):
+        if self.startup_error is not None:
+            raise self.startup_error
+        worker = self.idle.get()
+        try:
+            return worker.render(markdown_content)
+        except PdfWorkerError as e:
+            worker.close()
+            if e.starting:
+                self.startup_error = e
+            else:
+                worker = PdfWorker()
+            raise
+        except Exception as e:
+            # Raised by the worker's startup report, after which it exits
+            if not worker.started:
+                worker.close()
+                self.startup_error = e
+            raise
+        finally:
+            self.idle.put(worker)
+
+
+def send_error(responses, error):
+    try:
+        responses.send((False, error))
+    except Exception:
+        # The exception can't be pickled, so its message is sent instead
+        responses.send((False, RuntimeError(f"{type(error).__name__}: {error}")))
+
+
+def main(request_fd, response_fd):
+    requests = Connection(request_fd, writable=False)
+    responses = Connection(response_fd, readable=False)
+    # WeasyPrint, the stylesheet and the fonts are loaded once, before the first request
+    try:
+        from export import render_pdf, _init_pdf_worker
+        _init_pdf_worker()
+    except Exception as e:
+        send_error(responses, e)
+        return
+    responses.send((True, None))
+    while True:
+        try:
+            markdown_content = requests.recv()
+        except EOFError:
+            return  # The app process has exited or closed the pool
+        try:
+            responses.send((True, render_pdf(markdown_content)))
+        except Exception as e:
+            send_error(responses, e)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,197 @@
+import bisect
+import math
+import os
+import subprocess
+from collections import deque
+from tracing import span, add_bytes
+from transcription import SPEECH_SAMPLE_RATE, SPEECH_AUDIO_CODEC, SPEECH_AUDIO_BITRATE, SPEECH_AUDIO_EXTENSION
+
+FRAME_DURATION = 0.03  # Seconds per VAD frame
+SILENCE_THRESHOLD_DB = -40.0  # Frames quieter than this (dBFS) count as silence
+MIN_SILENCE_DURATION = 1.0  # Only silences at least this long are cut
+SILENCE_PADDING = 0.25  # Seconds of silence kept on each side of a cut
+FRAMES_PER_BLOCK = 1000  # Frames decoded and classified at a time (30 s of audio)
+BYTES_PER_SAMPLE = 2  # 16-bit PCM
+
+
+class OffsetMap:
+    """
+    Maps timestamps in the preprocessed audio back to the original recording.
+    Each span records where a contiguous run of kept audio starts in both timelines.
+    """
+    def __init__(self, spans=None):
+        self.spans = spans or []  # (processed_start, original_start) in seconds, sorted
+
+    def add(self, processed_start, original_start):
+        self.spans.append((processed_start, original_start))
+
+    def to_original(self, seconds):
+        if not self.spans:
+            return seconds
+        position = max(bisect.bisect_right(self.spans, (seconds, math.inf)) - 1, 0)
+        processed_start, original_start = self.spans[position]
+        return original_start + (seconds - processed_start)
+
+    def to_list(self):
+        return [list(span) for span in self.spans]
+
+
+class PreprocessResult:
+    def __init__(self, path, original_bytes, processed_bytes, original_duration, processed_duration, offset_map):
+        self.path = path
+        self.original_bytes = original_bytes
+        self.processed_bytes = processed_bytes
+        self.original_duration = original_duration
+        self.processed_duration = processed_duration
+        self.offset_map = offset_map
+
+    def get_bytes_saved(self):
+        return self.original_bytes - self.processed_bytes
+
+    def get_seconds_removed(self):
+        return self.original_duration - self.processed_duration
+
+    def to_dict(self):
+        return {
+            "original_bytes": self.original_bytes,
+            "processed_bytes": self.processed_bytes,
+            "bytes_saved": self.get_bytes_saved(),
+            "original_duration": self.original_duration,
+            "processed_duration": self.processed_duration,
+            "seconds_removed": self.get_seconds_removed(),
+        }
+
+    def __str__(self):
+        return (f"Audio preprocessing: {self.original_bytes / 1e6:.1f} MB → {self.processed_bytes / 1e6:.1f} MB "
+                f"({self.get_bytes_saved() / 1e6:.1f} MB saved), {self.get_seconds_removed():.1f}s of silence removed "
+                f"from {self.original_duration:.1f}s\n\n")
+
+
+def frame_levels(samples, frame_samples):
+    """
+    Returns the RMS level in dBFS of each complete frame in a block of 16-bit samples.
+    """
+    import numpy as np
+    frames = samples[:len(samples) // frame_samples * frame_samples].reshape(-1, frame_samples).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+class SilenceTrimmer:
+    """
+    Streams fixed-size PCM frames through an energy VAD, passing speech through and shortening every silence
+    longer than min_silence to the padding on each side. Only the current silence run is buffered.
+    """
+    def __init__(self, frame_samples, sample_rate=SPEECH_SAMPLE_RATE, threshold_db=SILENCE_THRESHOLD_DB,
+                 min_silence=MIN_SILENCE_DURATION, padding=SILENCE_PADDING):
+        self.frame_duration = frame_samples / sample_rate
+        self.threshold_db = threshold_db
+        self.min_silence_frames = math.ceil(min_silence / self.frame_duration)
+        self.padding_frames = math.ceil(padding / self.frame_duration)
+        self.offset_map = OffsetMap()
+        self.run = []  # (frame_index, frame) for a silence run not yet known to be long enough to cut
+        self.run_tail = deque(maxlen=self.padding_frames)  # Last frames of a run that is being cut
+        self.cutting = False
+        self.frame_index = 0
+        self.kept_frames = 0
+        self.last_kept_index = None
+
+    def _keep(self, frames, output):
+        for index, frame in frames:
+            if self.last_kept_index is None or index != self.last_kept_index + 1:
+                self.offset_map.add(self.kept_frames * self.frame_duration, index * self.frame_duration)
+            output.append(frame)
+            self.kept_frames += 1
+            self.last_kept_index = index
+
+    def _end_run(self, output):
+        self._keep(list(self.run_tail) if self.cutting else self.run, output)
+        self.run = []
+        self.run_tail.clear()
+        self.cutting = False
+
+    def process(self, frames, levels):
+        """
+        Classifies a block of frames and returns the PCM bytes to keep.
+        """
+        output = []
+        for frame, level in zip(frames, levels):
+            item = (self.frame_index, frame)
+            self.frame_index += 1
+            if level >= self.threshold_db:
+                self._end_run(output)
+                self._keep([item], output)
+            elif self.cutting:
+                self.run_tail.append(item)
+            else:
+                self.run.append(item)
+                if len(self.run) >= self.min_silence_frames:
+                    self._keep(self.run[:self.padding_frames], output)
+                    self.run_tail.extend(self.run[-self.padding_frames:])
+                    self.run = []
+                    self.cutting = True
+        return b"".join(output)
+
+    def finish(self):
+        """
+        Returns the bytes of a trailing silence that was too short to cut.
+        """
+        output = []
+        if not self.cutting:
+            self._keep(self.run, output)
+        self.run = []
+        return b"".join(output)
+
+
+def preprocess_audio(path, output_dir, sample_rate=SPEECH_SAMPLE_RATE):
+    """
+    Downmixes an audio file to mono, resamples it to 16 kHz, cuts long silences and re-encodes it compactly.
+    Audio is decoded and re-encoded through ffmpeg pipes a block at a time, so memory use stays flat.
+    """
+    # numpy is only needed here, so importing the pipeline doesn't pay for it
+    import numpy as np
+    output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + f".{SPEECH_AUDIO_EXTENSION}")
+    frame_samples = int(sample_rate * FRAME_DURATION)
+    frame_bytes = frame_samples * BYTES_PER_SAMPLE
+    block_bytes = frame_bytes * FRAMES_PER_BLOCK
+
+    with span("preprocess", file=os.path.basename(path)):
+        decoder = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"],
+            stdout=subprocess.PIPE,
+        )
+        encoder = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+             "-c:a", SPEECH_AUDIO_CODEC, "-b:a", SPEECH_AUDIO_BITRATE, "-application", "voip", output_path],
+            stdin=subprocess.PIPE,
+        )
+        trimmer = SilenceTrimmer(frame_samples, sample_rate)
+        try:
+            pending = b""
+            while block := decoder.stdout.read(block_bytes):
+                pending += block
+                usable = len(pending) // frame_bytes * frame_bytes
+                samples = np.frombuffer(pending[:usable], dtype=np.int16)
+                frames = [pending[start:start + frame_bytes] for start in range(0, usable, frame_bytes)]
+                encoder.stdin.write(trimmer.process(frames, frame_levels(samples, frame_samples)))
+                pending = pending[usable:]
+            encoder.stdin.write(trimmer.finish() + pending)
+            encoder.stdin.close()
+            if decoder.wait() != 0 or encoder.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed while preprocessing {path}")
+        finally:
+            for process in (decoder, encoder):
+                if process.poll() is None:
+                    process.kill()
+
+    result = PreprocessResult(
+        path=output_path,
+        original_bytes=os.path.getsize(path),
+        processed_bytes=os.path.getsize(output_path),
+        original_duration=trimmer.frame_index * trimmer.frame_duration,
+        processed_duration=trimmer.kept_frames * trimmer.frame_duration,
+        offset_map=trimmer.offset_map,
+    )
+    add_bytes("preprocess_input", result.original_bytes)
+    add_bytes("preprocess_output", result.processed_bytes)
+    return result
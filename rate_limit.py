@@ -0,0 +1,343 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from tracing import observe, increment
+
+# Requests and tokens per minute for each model, based on Groq's free tier limits
+MODEL_RATE_LIMITS = {
+    "llama3-8b-8192": {"requests": 30, "tokens": 30000},
+    "llama3-70b-8192": {"requests": 30, "tokens": 6000},
+    "mixtral-8x7b-32768": {"requests": 30, "tokens": 5000},
+    "gemma-7b-it": {"requests": 30, "tokens": 15000},
+    "gemma2-9b-it": {"requests": 30, "tokens": 15000},
+}
+DEFAULT_RATE_LIMIT = {"requests": 30, "tokens": 6000}
+# Models offered for content generation, in the order they are tried when the requested model is saturated
+CONTENT_MODELS = ["llama3-8b-8192", "llama3-70b-8192", "mixtral-8x7b-32768", "gemma-7b-it", "gemma2-9b-it"]
+CHARS_PER_TOKEN = 4
+# Completion tokens reserved per request until its usage is known; outlines and sections rarely come near max_tokens
+OUTPUT_TOKEN_ESTIMATE = 1000
+
+CLIENT_MAX_RETRIES = 0  # The scheduler retries with model fallback, so the Groq SDK's own retries are turned off
+RETRY_ATTEMPTS = 6
+BACKOFF_BASE = 1.0  # Seconds; the backoff ceiling doubles with every failed attempt
+BACKOFF_MAX = 30.0
+FALLBACK_WAIT = 5.0  # Switch to a fallback model when the preferred one needs a longer wait than this
+WAIT_STEP = 1.0  # Longest sleep before the budget is checked again, since refunds and response headers can shorten a wait
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting before the API reports real usage.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_request_tokens(prompt: str, max_tokens: int) -> int:
+    """
+    Tokens reserved for a completion request: the prompt plus the expected share of max_tokens.
+    RateLimiter.call settles the reservation once the response reports what it really used.
+    """
+    return estimate_tokens(prompt) + min(max_tokens, OUTPUT_TOKEN_ESTIMATE)
+
+
+def get_total_tokens(usage):
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def parse_reset(value):
+    """
+    Parses Groq's reset and retry-after header values ("2m59.56s", "7.66s", "120ms" or plain seconds) into seconds.
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", str(value))
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def get_status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def get_headers(error_or_response):
+    return getattr(getattr(error_or_response, "response", None), "headers", None) or {}
+
+
+def is_retryable(error):
+    return get_status_code(error) in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Full jitter exponential backoff, never shorter than the server's retry-after.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def create_completion(client, **options):
+    """
+    Calls chat.completions.create and returns (response, headers). The raw response is used when the client
+    exposes it, so the rate limit headers can be read; a stream is returned before it is consumed.
+    """
+    completions = client.chat.completions
+    raw_completions = getattr(completions, "with_raw_response", None)
+    if raw_completions is None:
+        return completions.create(**options), {}
+    response = raw_completions.create(**options)
+    return response.parse(), response.headers
+
+
+async def create_completion_async(client, **options):
+    completions = client.chat.completions
+    raw_completions = getattr(completions, "with_raw_response", None)
+    if raw_completions is None:
+        return await completions.create(**options), {}
+    response = await raw_completions.create(**options)
+    return await response.parse(), response.headers
+
+
+class TokenBucket:
+    def __init__(self, capacity, period=60.0):
+        self.capacity = capacity
+        self.available = capacity
+        self.rate = capacity / period
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until amount can be taken. Requests larger than the bucket only wait for a full bucket.
+        """
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    def settle(self, taken, used):
+        """
+        Replaces an amount taken before a request with what the request really used, refunding or charging the difference.
+        """
+        self.refill()
+        self.available = min(self.capacity, self.available + min(taken, self.capacity) - used)
+
+    def resize(self, capacity, period=60.0):
+        self.refill()
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.available = min(self.available, capacity)
+
+
+class RateLimiter:
+    """
+    Per-model request and token budget shared by every thread in the process. Budgets start from MODEL_RATE_LIMITS
+    and are corrected from the x-ratelimit headers of every response; a 429 blocks the model until its retry-after.
+    call and call_async run a request under this budget with retries and fallback to other models.
+    """
+    def __init__(self, limits=None, default_limit=None, fallback_models=None):
+        self.limits = limits if limits is not None else MODEL_RATE_LIMITS
+        self.default_limit = default_limit or DEFAULT_RATE_LIMIT
+        self.fallback_models = fallback_models if fallback_models is not None else CONTENT_MODELS
+        self.buckets = {}
+        self.blocked_until = {}
+        self.lock = threading.Lock()
+
+    def _get_buckets(self, model):
+        if model not in self.buckets:
+            limit = self.limits.get(model, self.default_limit)
+            self.buckets[model] = (TokenBucket(limit["requests"]), TokenBucket(limit["tokens"]))
+        return self.buckets[model]
+
+    def get_token_limit(self, model):
+        """
+        Configured tokens per minute for model. Unlike the live budget it ignores header corrections,
+        so anything sized from it stays the same between runs.
+        """
+        return self.limits.get(model, self.default_limit)["tokens"]
+
+    def _wait_time(self, model, tokens):
+        requests_bucket, tokens_bucket = self._get_buckets(model)
+        blocked = self.blocked_until.get(model, 0.0) - time.monotonic()
+        return max(requests_bucket.wait_time(1), tokens_bucket.wait_time(tokens), blocked, 0.0)
+
+    def try_acquire(self, model, tokens=0, fallback_models=()):
+        """
+        Takes one request and the given tokens from the budget of the model to use and returns (model, 0),
+        otherwise returns (model, seconds to wait before trying again). The preferred model is used unless it needs
+        a wait longer than FALLBACK_WAIT, in which case the fallback model with the shortest wait is picked.
+        """
+        with self.lock:
+            wait = self._wait_time(model, tokens)
+            if wait > FALLBACK_WAIT:
+                for fallback_model in fallback_models:
+                    fallback_wait = self._wait_time(fallback_model, tokens)
+                    if fallback_wait < wait:
+                        model, wait = fallback_model, fallback_wait
+            if wait == 0:
+                requests_bucket, tokens_bucket = self._get_buckets(model)
+                requests_bucket.take(1)
+                tokens_bucket.take(tokens)
+            return model, wait
+
+    def acquire(self, model, tokens=0, fallback_models=()):
+        """
+        Blocks until one request and the given number of tokens fit in the budget of model or one of
+        fallback_models, and returns the model to call.
+        """
+        started = time.perf_counter()
+        while True:
+            chosen_model, wait = self.try_acquire(model, tokens, fallback_models)
+            if not wait:
+                break
+            time.sleep(min(wait, WAIT_STEP))
+        observe("queue_seconds", time.perf_counter() - started, stage="rate_limit", model=chosen_model)
+        return chosen_model
+
+    async def acquire_async(self, model, tokens=0, fallback_models=()):
+        """
+        Same as acquire, but waits without blocking the event loop.
+        """
+        started = time.perf_counter()
+        while True:
+            chosen_model, wait = self.try_acquire(model, tokens, fallback_models)
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, WAIT_STEP))
+        observe("queue_seconds", time.perf_counter() - started, stage="rate_limit", model=chosen_model)
+        return chosen_model
+
+    def update(self, model, headers):
+        """
+        Corrects the model's budget from Groq's x-ratelimit response headers. Tokens are limited per minute,
+        requests per day, so the request headers only matter once the daily budget is exhausted.
+        Returns True if the headers gave the remaining tokens, which then replace the local estimate.
+        """
+        if not headers:
+            return False
+        with self.lock:
+            requests_bucket, tokens_bucket = self._get_buckets(model)
+            token_limit = headers.get("x-ratelimit-limit-tokens")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if token_limit and token_limit.isdigit() and int(token_limit) != tokens_bucket.capacity:
+                tokens_bucket.resize(int(token_limit))
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests == "0":
+                self._block(model, parse_reset(headers.get("x-ratelimit-reset-requests")) or BACKOFF_MAX)
+            if remaining_tokens and remaining_tokens.isdigit():
+                # The server's count is authoritative in both directions, so unused reservations come back too
+                tokens_bucket.refill()
+                tokens_bucket.available = min(tokens_bucket.capacity, int(remaining_tokens))
+                return True
+            return False
+
+    def settle(self, model, tokens, used):
+        """
+        Settles the tokens reserved for a request against the tokens it used, as reported in its usage.
+        """
+        if used is None:
+            return
+        with self.lock:
+            self._get_buckets(model)[1].settle(tokens, used)
+
+    def _settle_response(self, model, tokens, response):
+        """
+        Settles the reservation from a completion's usage. A stream only reports usage in its last chunk, so it is
+        returned wrapped in a generator that settles when that chunk passes through.
+        """
+        if hasattr(response, "usage"):
+            self.settle(model, tokens, get_total_tokens(response.usage))
+            return response
+
+        def settle_stream():
+            for chunk in response:
+                if x_groq := getattr(chunk, "x_groq", None):
+                    self.settle(model, tokens, get_total_tokens(x_groq.usage))
+                yield chunk
+
+        async def settle_stream_async():
+            async for chunk in response:
+                if x_groq := getattr(chunk, "x_groq", None):
+                    self.settle(model, tokens, get_total_tokens(x_groq.usage))
+                yield chunk
+        return settle_stream_async() if hasattr(response, "__aiter__") else settle_stream()
+
+    def _block(self, model, seconds):
+        self.blocked_until[model] = max(self.blocked_until.get(model, 0.0), time.monotonic() + seconds)
+
+    def record_failure(self, model, error, attempt):
+        """
+        Blocks a model after a retryable error for the server's retry-after or a jittered backoff, whichever is longer.
+        """
+        headers = get_headers(error)
+        self.update(model, headers)
+        retry_after = parse_reset(headers.get("retry-after"))
+        delay = backoff_delay(attempt, retry_after)
+        with self.lock:
+            self._block(model, delay)
+        increment("retries_total", model=model, status=str(get_status_code(error) or type(error).__name__))
+        print(f"Retrying {model} in {delay:.1f}s after {type(error).__name__}: {error}")
+
+    def _get_fallback_models(self, model, fallback_models):
+        fallback_models = self.fallback_models if fallback_models is None else fallback_models
+        return [fallback_model for fallback_model in fallback_models if fallback_model != model]
+
+    def call(self, request, model, tokens=0, fallback_models=None, attempts=RETRY_ATTEMPTS):
+        """
+        Calls request(model) once the budget allows, retrying retryable errors and moving to a fallback model
+        (self.fallback_models unless given) when the preferred one is saturated. request returns (response, headers);
+        returns (model called, response). For a completion, tokens is the reservation from estimate_request_tokens;
+        it is settled from the remaining-tokens header, or else from the usage the completion reports.
+        """
+        fallback_models = self._get_fallback_models(model, fallback_models)
+        for attempt in range(attempts):
+            chosen_model = self.acquire(model, tokens, fallback_models)
+            try:
+                response, headers = request(chosen_model)
+            except Exception as e:
+                if attempt == attempts - 1 or not is_retryable(e):
+                    raise
+                self.record_failure(chosen_model, e, attempt)
+                continue
+            if not self.update(chosen_model, headers) and tokens:
+                response = self._settle_response(chosen_model, tokens, response)
+            return chosen_model, response
+
+    async def call_async(self, request, model, tokens=0, fallback_models=None, attempts=RETRY_ATTEMPTS):
+        """
+        Same as call, for a coroutine function request.
+        """
+        fallback_models = self._get_fallback_models(model, fallback_models)
+        for attempt in range(attempts):
+            chosen_model = await self.acquire_async(model, tokens, fallback_models)
+            try:
+                response, headers = await request(chosen_model)
+            except Exception as e:
+                if attempt == attempts - 1 or not is_retryable(e):
+                    raise
+                self.record_failure(chosen_model, e, attempt)
+                continue
+            if not self.update(chosen_model, headers) and tokens:
+                response = self._settle_response(chosen_model, tokens, response)
+            return chosen_model, response
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,128 @@
+import math
+import re
+from collections import Counter
+
+SEGMENT_WORDS = 150  # Approximate words per indexed transcript segment
+RETRIEVAL_TOP_K = 6  # Segments included in each section prompt
+MAX_OUTLINE_CONTEXT_CHARS = 2000  # Cap on the other-sections summary sent with each section
+
+TIMESTAMP_PATTERN = re.compile(r"\[(?:\d+:)?\d{2}:\d{2}\] ?")  # Marks added to excerpts by format_segments
+
+STOPWORDS = set("""a an and are as at be but by for from has have he her his i if in into is it its of on or our she so
+that the their them there these they this to was we were what when which who will with you your""".split())
+
+
+class TranscriptSegment:
+    def __init__(self, index, text, start=None, end=None):
+        self.index = index
+        self.text = text
+        self.start = start  # Seconds into the audio, when the transcription has timestamps
+        self.end = end
+
+    def __repr__(self):
+        return f"TranscriptSegment(index={self.index}, words={len(self.text.split())})"
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS]
+
+
+def split_transcript(text, segment_words=SEGMENT_WORDS, timeline=None):
+    """
+    Splits a transcript into segments of roughly segment_words words, breaking on sentence boundaries.
+    With the transcript's Timeline, each segment is given the times of the audio it covers.
+    """
+    segments = []
+    current = []
+    current_words = 0
+    first_offset = position = 0
+
+    def add_segment():
+        start = end = None
+        if timeline:
+            start, end = timeline.get_start(first_offset), timeline.get_end(position - 1)
+        segments.append(TranscriptSegment(len(segments), " ".join(current), start, end))
+
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if not sentence:
+            continue
+        if timeline:
+            position = text.find(sentence, position)
+            if not current:
+                first_offset = position
+            position += len(sentence)
+        current.append(sentence)
+        current_words += len(sentence.split())
+        if current_words >= segment_words:
+            add_segment()
+            current = []
+            current_words = 0
+    if current:
+        add_segment()
+    return segments
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over transcript segments, built locally with no external dependencies.
+    """
+    def __init__(self, segments, k1=1.5, b=0.75):
+        self.segments = segments
+        self.k1 = k1
+        self.b = b
+        vocabulary = {}  # One string per distinct term, shared by the counts of every segment
+        self.term_counts = [Counter(vocabulary.setdefault(term, term) for term in tokenize(segment.text)) for segment in segments]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(segments)
+        self.idf = {term: math.log(1 + (total - freq + 0.5) / (freq + 0.5)) for term, freq in document_frequency.items()}
+
+    def score(self, query_terms, position):
+        counts = self.term_counts[position]
+        length_norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / (self.average_length or 1))
+        total = 0.0
+        for term in query_terms:
+            frequency = counts.get(term, 0)
+            if frequency:
+                total += self.idf[term] * frequency * (self.k1 + 1) / (frequency + length_norm)
+        return total
+
+    def search(self, query, top_k=RETRIEVAL_TOP_K):
+        """
+        Returns the top_k segments most relevant to the query, in transcript order.
+        """
+        if len(self.segments) <= top_k:
+            return list(self.segments)
+        query_terms = tokenize(query)
+        ranked = sorted(range(len(self.segments)), key=lambda position: self.score(query_terms, position), reverse=True)
+        return [self.segments[position] for position in sorted(ranked[:top_k])]
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def format_segments(segments):
+    """
+    Renders retrieved segments for a prompt, marking gaps between non-adjacent segments.
+    """
+    parts = []
+    previous_index = None
+    for segment in segments:
+        if previous_index is not None and segment.index != previous_index + 1:
+            parts.append("[...]")
+        if segment.start is not None:
+            parts.append(f"[{format_timestamp(segment.start)}] {segment.text}")
+        else:
+            parts.append(segment.text)
+        previous_index = segment.index
+    return "\n\n".join(parts)
+
+
+def truncate_context(text, max_chars=MAX_OUTLINE_CONTEXT_CHARS):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit("\n", 1)[0] + "\n- ..."
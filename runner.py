@@ -0,0 +1,184 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from download import delete_download
+from engine import get_transcript, generate_notes
+from export import exporter
+from sections import SectionStore, MAX_CONCURRENT_SECTIONS
+from tracing import Tracer, use_tracer, export_trace
+
+RUNNER_WORKERS = int(os.environ.get("SCRIBEWIZARD_RUNNER_WORKERS", 2))  # Jobs generating at once per server; the rest wait in the queue
+
+
+class JobProgress:
+    """
+    Live state of a job submitted to the JobRunner. The worker thread writes it through the pipeline callbacks
+    and UI sessions read it, so every access goes through one lock.
+    """
+    def __init__(self, job):
+        self.job = job
+        self.status = "Queued"
+        self.download_status = ""
+        self.preprocess_text = ""
+        self.generation_text = ""
+        self.transcript = job.transcript
+        self.structure = None
+        self.contents = None
+        self.tracer = Tracer(job.id)
+        self.error = None
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def get_stage(self):
+        if self.done.is_set():
+            return "done"
+        if not self.started.is_set():
+            return "queued"
+        if self.transcript is None:
+            return "transcription"
+        if self.structure is None:
+            return "outline"
+        return "sections"
+
+    def set_status(self, text):
+        self.status = text
+
+    def set_download_status(self, text):
+        self.download_status = text
+
+    def set_preprocessing(self, preprocess_result):
+        self.preprocess_text = str(preprocess_result)
+
+    def set_transcript(self, transcript):
+        self.transcript = transcript
+        self.download_status = ""
+
+    def set_structure(self, structure):
+        # Called again each time a streamed outline grows
+        with self.lock:
+            if self.contents is None:
+                self.contents = SectionStore(structure)
+            else:
+                self.contents.extend(structure)
+            self.structure = structure
+
+    def append(self, title, chunk):
+        with self.lock:
+            self.contents.append(title, chunk)
+
+    def set_statistics(self, total_generation_statistics):
+        self.generation_text = str(total_generation_statistics)
+
+    def get_sections(self):
+        """
+        Returns (title, content) for every section of the outline, in outline order.
+        """
+        with self.lock:
+            if self.contents is None:
+                return []
+            return list(self.contents.to_dict().items())
+
+    def get_new_content(self, lengths):
+        """
+        Returns {title: text} with what each section gained beyond lengths, {title: characters already read}.
+        Sections that haven't changed are left out, so a poll only copies what streamed since the previous one.
+        """
+        with self.lock:
+            if self.contents is None:
+                return {}
+            new_content = {}
+            for title in self.contents.levels:
+                text = self.contents.get(title)
+                if len(text) > lengths.get(title, 0):
+                    new_content[title] = text[lengths.get(title, 0):]
+            return new_content
+
+    def get_statistics_text(self):
+        return self.preprocess_text + self.generation_text + str(self.tracer)
+
+    def get_markdown_content(self):
+        with self.lock:
+            return self.contents.get_markdown_content() if self.contents is not None else ""
+
+
+class JobRunner:
+    """
+    Runs note generation jobs on a bounded pool of worker threads, independently of the Streamlit script runs that
+    submitted them. Reruns, widget interactions and page refreshes only change what is displayed, not the job.
+    """
+    def __init__(self, workers=RUNNER_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scribewizard-job")
+        self.progress = {}
+        self.queue = []  # IDs of submitted jobs that haven't started, in submission order
+        self.lock = threading.Lock()
+
+    def submit(self, groq_client, job, source=None, audio_file_path=None, max_concurrent_sections=MAX_CONCURRENT_SECTIONS):
+        """
+        Queues a new or resumed job and returns its ID. audio_file_path is deleted once the job no longer needs it.
+        """
+        with self.lock:
+            current = self.progress.get(job.id)
+            if current is not None and not current.done.is_set():
+                return job.id
+            progress = JobProgress(job)
+            self.progress[job.id] = progress
+            self.queue.append(job.id)
+        job.queue()
+        self.executor.submit(self._run, groq_client, progress, source, audio_file_path, max_concurrent_sections)
+        return job.id
+
+    def get(self, job_id):
+        """
+        Returns the JobProgress of a job submitted in this process, or None.
+        """
+        with self.lock:
+            return self.progress.get(job_id)
+
+    def is_running(self, job_id):
+        progress = self.get(job_id)
+        return progress is not None and not progress.done.is_set()
+
+    def get_queue_position(self, job_id):
+        """
+        Returns how many queued jobs are ahead of this one, or None if it has started.
+        """
+        with self.lock:
+            return self.queue.index(job_id) if job_id in self.queue else None
+
+    def _run(self, groq_client, progress, source, audio_file_path, max_concurrent_sections):
+        job = progress.job
+        with self.lock:
+            self.queue.remove(job.id)
+        progress.started.set()
+        try:
+            with use_tracer(progress.tracer), job.run():
+                if job.transcript is None:
+                    transcript = get_transcript(groq_client, source, on_status=progress.set_status, external_logger=progress.set_download_status,
+                                                on_preprocess=progress.set_preprocessing)
+                    job.save_transcript(transcript)
+                progress.set_transcript(job.transcript)
+                if audio_file_path is not None:
+                    delete_download(audio_file_path)
+                    audio_file_path = None
+
+                generate_notes(groq_client, job.transcript, outline_model=job.outline_model, content_model=job.content_model,
+                               max_concurrent_sections=max_concurrent_sections, on_status=progress.set_status, on_structure=progress.set_structure,
+                               on_chunk=progress.append, on_statistics=progress.set_statistics, job=job)
+            progress.set_status("Notes generated.")
+            # Render the PDF now so it is ready by the time someone asks to download it
+            exporter.submit(progress.get_markdown_content(), "pdf")
+        except Exception as e:
+            traceback.print_exc()
+            progress.error = e
+            progress.set_status("")
+        finally:
+            # Remove audio after an exception to prevent data storage leak
+            if audio_file_path is not None:
+                delete_download(audio_file_path)
+            export_trace(progress.tracer)
+            progress.done.set()
+
+
+job_runner = JobRunner()
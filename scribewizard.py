@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from engine import run_pipeline, revise_job, is_youtube_link, DEFAULT_OUTLINE_MODEL, DEFAULT_CONTENT_MODEL
+from sections import flatten_structure, MAX_CONCURRENT_SECTIONS
+from download import expand_playlists
+from course import write_course_notes
+from cache import get_youtube_video_id
+from tracing import Tracer, use_tracer, process_metrics
+from clients import client_pool
+from jobs import job_store
+
+BATCH_WORKERS = 2
+
+
+def read_manifest(path):
+    """
+    Reads one audio file path or YouTube link per line, skipping blank lines and # comments.
+    Relative file paths are resolved against the manifest's directory.
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    sources = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not is_youtube_link(line) and not os.path.isabs(line):
+                line = os.path.join(manifest_dir, line)
+            sources.append(line)
+    return sources
+
+
+def job_name(index, source):
+    if is_youtube_link(source):
+        name = get_youtube_video_id(source) or source
+    else:
+        name = os.path.splitext(os.path.basename(source))[0]
+    return f"{index:04d}_" + re.sub(r"[^A-Za-z0-9_.-]+", "_", name)[:80]
+
+
+def read_summary(index, source, args):
+    """
+    Returns the summary.json an earlier run wrote for this manifest entry, or None.
+    """
+    path = os.path.join(args.output_dir, job_name(index, source), "summary.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_job(index, source, args):
+    """
+    With --resume, returns the unfinished job of the entry's last run so it continues from its checkpoints, or a
+    revision of its completed job when the models changed, which only regenerates what depends on them.
+    Otherwise, or if there is nothing to resume, starts a new job.
+    """
+    previous = read_summary(index, source, args) if args.resume else None
+    job = job_store.get(previous["job_id"]) if previous and previous.get("job_id") else None
+    if job is not None and job.source == source and job.get_status() != "completed":
+        print(f"[job {index}] Resuming job {job.id} after {job.get_progress()}")
+        return job
+    if job is not None and job.source == source and job.transcript is not None:
+        print(f"[job {index}] Revising job {job.id} for the selected models")
+        return revise_job(job, args.outline_model, args.content_model)
+    return job_store.create(source, args.outline_model, args.content_model)
+
+
+def start_job(index, source, args, title=None):
+    output_dir = os.path.join(args.output_dir, job_name(index, source))
+    os.makedirs(output_dir, exist_ok=True)
+    job = get_job(index, source, args)
+    summary = {"index": index, "source": source, "title": title, "output_dir": output_dir, "job_id": job.id, "status": "completed",
+               "start_time": time.time()}
+
+    def on_status(text):
+        print(f"[job {index}] {text}")
+
+    return summary, on_status, Tracer(os.path.basename(output_dir)), job
+
+
+def is_completed(index, source, args):
+    """
+    True if --resume is set and the entry already completed in an earlier run with the same models.
+    """
+    previous = read_summary(index, source, args) if args.resume else None
+    if previous is None or previous["status"] != "completed":
+        return False
+    job = job_store.get(previous["job_id"]) if previous.get("job_id") else None
+    return job is None or (job.outline_model, job.content_model) == (args.outline_model, args.content_model)
+
+
+def finish_job(summary, tracer, result=None, outputs=None, error=None):
+    """
+    Records the outcome of a job and writes its summary.json, trace.jsonl and metrics.prom.
+    """
+    if error is None:
+        summary["outputs"] = outputs
+        summary["sections"] = len(result.contents)
+        summary["outline_statistics"] = result.outline_statistics.to_dict()
+        summary["content_statistics"] = result.content_statistics.to_dict()
+        if result.preprocessing:
+            summary["preprocessing"] = result.preprocessing.to_dict()
+    else:
+        summary["status"] = "failed"
+        summary["error"] = str(error)
+    summary["elapsed_time"] = time.time() - summary.pop("start_time")
+    summary["trace"] = tracer.to_dict()
+    tracer.write_jsonl(os.path.join(summary["output_dir"], "trace.jsonl"))
+    tracer.metrics.write_prometheus(os.path.join(summary["output_dir"], "metrics.prom"))
+    process_metrics.add(tracer.metrics)
+    with open(os.path.join(summary["output_dir"], "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"[job {summary['index']}] {summary['status']} in {summary['elapsed_time']:.1f}s")
+    return summary
+
+
+def run_job(groq_client, index, source, args, title=None):
+    """
+    Runs the pipeline for one manifest entry and writes its summary.json. Failures are recorded, not raised.
+    """
+    if is_completed(index, source, args):
+        return read_summary(index, source, args)
+    summary, on_status, tracer, job = start_job(index, source, args, title)
+    try:
+        with use_tracer(tracer), job.run():
+            result, outputs = run_pipeline(groq_client, source, summary["output_dir"], outline_model=args.outline_model, content_model=args.content_model,
+                                           max_concurrent_sections=args.section_workers, pdf=args.pdf, on_status=on_status,
+                                           formats=args.formats, job=job)
+    except Exception as e:
+        traceback.print_exc()
+        return finish_job(summary, tracer, error=e)
+    return finish_job(summary, tracer, result, outputs)
+
+
+async def run_job_async(groq_client, semaphore, index, source, args, title=None):
+    from async_engine import run_pipeline_async
+    if is_completed(index, source, args):
+        return read_summary(index, source, args)
+    async with semaphore:
+        summary, on_status, tracer, job = start_job(index, source, args, title)
+        try:
+            with use_tracer(tracer), job.run():
+                result, outputs = await run_pipeline_async(groq_client, source, summary["output_dir"], outline_model=args.outline_model,
+                                                           content_model=args.content_model, max_concurrent_sections=args.section_workers,
+                                                           pdf=args.pdf, on_status=on_status, formats=args.formats, job=job)
+        except Exception as e:
+            traceback.print_exc()
+            return finish_job(summary, tracer, error=e)
+        return finish_job(summary, tracer, result, outputs)
+
+
+async def run_batch_async(items, args):
+    """
+    Runs every job as a task on one event loop, with at most args.workers pipelines active at a time.
+    """
+    # The async client (and httpx) are only loaded for --async
+    from async_engine import create_async_client, get_http_client
+    groq_client = create_async_client()
+    semaphore = asyncio.Semaphore(args.workers)
+    try:
+        return await asyncio.gather(*(run_job_async(groq_client, semaphore, index, source, args, title) for index, (source, title) in enumerate(items)))
+    finally:
+        await get_http_client().aclose()
+
+
+def load_lecture(summary):
+    """
+    Returns (title, structure, contents) of a completed job for the course notes, or None if its job has expired.
+    """
+    job = job_store.get(summary["job_id"]) if summary["status"] == "completed" and summary.get("job_id") else None
+    if job is None or job.structure is None:
+        return None
+    sections = job.get_sections()
+    contents = {title: sections[title][0] if title in sections else "" for title in flatten_structure(job.structure)}
+    return summary.get("title") or job_name(summary["index"], summary["source"]), job.structure, contents
+
+
+def write_batch_course_notes(summaries, args):
+    lectures = [lecture for lecture in map(load_lecture, summaries) if lecture is not None]
+    if not lectures:
+        print("No completed jobs to write course notes from")
+        return
+    print(f"Writing course notes for {len(lectures)} lectures")
+    statistics, outputs = write_course_notes(client_pool.get(), lectures, args.output_dir, model=args.outline_model,
+                                             pdf=args.pdf, formats=args.formats)
+    print(statistics)
+    print(f"Course notes written to {outputs['markdown']}")
+
+
+def batch(args):
+    # Playlist and channel links become one job per video; their titles come from the same listing
+    items = expand_playlists(read_manifest(args.manifest))
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Processing {len(items)} jobs with {args.workers} workers")
+
+    if args.use_async:
+        summaries = asyncio.run(run_batch_async(items, args))
+    else:
+        groq_client = client_pool.get()
+
+        def run(entry):
+            index, (source, title) = entry
+            return run_job(groq_client, index, source, args, title)
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            summaries = list(executor.map(run, enumerate(items)))
+
+    if args.course_notes:
+        write_batch_course_notes(summaries, args)
+    process_metrics.write_prometheus(os.path.join(args.output_dir, "metrics.prom"))
+    with open(os.path.join(args.output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=2)
+    failed = sum(summary["status"] == "failed" for summary in summaries)
+    print(f"Finished {len(summaries) - failed}/{len(summaries)} jobs, summaries in {args.output_dir}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="scribewizard", description="Generate structured notes from audio without the Streamlit app.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="Process a manifest of audio files and YouTube links.")
+    batch_parser.add_argument("manifest", help="Text file with one audio file path, YouTube link or YouTube playlist or channel link per line.")
+    batch_parser.add_argument("--output-dir", default="./output", help="Directory for per-job notes and summaries.")
+    batch_parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Jobs processed at the same time.")
+    batch_parser.add_argument("--section-workers", type=int, default=MAX_CONCURRENT_SECTIONS, help="Sections generated in parallel per job.")
+    batch_parser.add_argument("--outline-model", default=DEFAULT_OUTLINE_MODEL)
+    batch_parser.add_argument("--content-model", default=DEFAULT_CONTENT_MODEL)
+    batch_parser.add_argument("--async", dest="use_async", action="store_true", help="Run jobs on one event loop with the async Groq client.")
+    batch_parser.add_argument("--no-pdf", dest="pdf", action="store_false", help="Only write markdown notes.")
+    batch_parser.add_argument("--format", dest="formats", action="append", choices=["html", "docx"], default=[],
+                              help="Also write notes in this format. Can be repeated.")
+    batch_parser.add_argument("--resume", action="store_true",
+                              help="Skip entries that completed in an earlier run into the same output directory and resume failed ones from their checkpoints. "
+                                   "Entries completed with other models only regenerate what depends on the changed model.")
+    batch_parser.add_argument("--course-notes", action="store_true",
+                              help="Also write course_notes with an overview of every completed entry followed by its notes, in manifest order.")
+    batch_parser.set_defaults(func=batch)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import observe, bind_tracer
+
+MAX_CONCURRENT_SECTIONS = 4
+
+_DONE = object()
+
+
+def flatten_structure(structure):
+    """
+    Returns every title in the outline, parents before their subsections.
+    """
+    sections = []
+    for title, content in structure.items():
+        sections.append(title)
+        if isinstance(content, dict):
+            sections.extend(flatten_structure(content))
+    return sections
+
+
+def flatten_leaf_sections(structure):
+    """
+    Returns (title, description) pairs for every leaf of the outline, in outline order.
+    """
+    leaves = []
+    for title, content in structure.items():
+        if isinstance(content, str):
+            leaves.append((title, content))
+        elif isinstance(content, dict):
+            leaves.extend(flatten_leaf_sections(content))
+    return leaves
+
+
+def get_section_levels(structure, level=1):
+    """
+    Returns {title: heading level} for every title in the outline, in outline order.
+    """
+    levels = {}
+    for title, content in structure.items():
+        levels[title] = level
+        if isinstance(content, dict):
+            levels.update(get_section_levels(content, level + 1))
+    return levels
+
+
+def format_section_markdown(title, content, level=1):
+    """
+    Renders one section of the notes document. Sections without content are left out.
+    """
+    if not content.strip():
+        return ""
+    return f"{'#' * level} {title}\n{content}.\n\n"
+
+
+class SectionStore:
+    """
+    Streamed section contents kept as lists of chunks and joined only when read, so appending a token costs
+    the same however long the section already is. The rendered markdown of each section and of the whole
+    document is cached and only rebuilt for sections that changed since the last read.
+    """
+    def __init__(self, structure):
+        self.levels = {}
+        self.chunks = {}
+        self.texts = {}
+        self.markdown_parts = {}
+        self.stale = set()  # Sections whose text and markdown need rebuilding
+        self.updated = set()  # Sections changed since the last take_updated call
+        self.markdown = ""
+        self.markdown_stale = False
+        self.extend(structure)
+
+    def extend(self, structure):
+        """
+        Updates the store to the whole outline so far, for an outline that grows while it streams. Sections already
+        in the store keep their content.
+        """
+        self.levels = get_section_levels(structure)
+        self.chunks = {title: self.chunks.get(title, []) for title in self.levels}
+        self.texts = {title: self.texts.get(title, "") for title in self.levels}
+        self.markdown_parts = {title: self.markdown_parts.get(title, "") for title in self.levels}
+        self.markdown_stale = True
+
+    def append(self, title, chunk):
+        self.chunks[title].append(chunk)
+        self.stale.add(title)
+        self.updated.add(title)
+
+    def _refresh(self, title):
+        if title in self.stale:
+            # Collapse the chunk list into one string, so later reads only join the new chunks
+            self.texts[title] = "".join(self.chunks[title])
+            self.chunks[title] = [self.texts[title]]
+            self.markdown_parts[title] = format_section_markdown(title, self.texts[title], self.levels[title])
+            self.stale.discard(title)
+            self.markdown_stale = True
+
+    def get(self, title):
+        self._refresh(title)
+        return self.texts[title]
+
+    def __getitem__(self, title):
+        return self.get(title)
+
+    def __contains__(self, title):
+        return title in self.levels
+
+    def take_updated(self):
+        """
+        Returns the sections appended to since the last call, in outline order.
+        """
+        updated, self.updated = self.updated, set()
+        return [title for title in self.levels if title in updated]
+
+    def get_markdown_content(self):
+        for title in list(self.stale):
+            self._refresh(title)
+        if self.markdown_stale:
+            self.markdown = "".join(self.markdown_parts.values())
+            self.markdown_stale = False
+        return self.markdown
+
+    def to_dict(self):
+        return {title: self.get(title) for title in self.levels}
+
+
+def build_outline_context(leaves, title):
+    """
+    Lists the other sections of the outline so each section can avoid repeating content written in parallel.
+    """
+    return "\n".join(f"- {other_title}: {description}" for other_title, description in leaves if other_title != title)
+
+
+class SectionDispatcher:
+    """
+    Runs generate(title, description) for sections on a bounded thread pool as they are submitted and, when iterated,
+    yields (title, chunk) pairs as they arrive. The caller consumes them on its own thread, so UI updates stay on the
+    script thread. Iterables added with add_source, such as a streamed outline, are read on their own thread and
+    their items are yielded as (key, item) in the same way, so the caller can submit sections while they still stream.
+    If anything fails, sections that haven't started are dropped, while sources and the sections already streaming are
+    finished, so their output, such as a streamed outline, can still be kept, before the first error is raised.
+    """
+    def __init__(self, generate, max_workers=MAX_CONCURRENT_SECTIONS):
+        self.generate = generate
+        self.events = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.futures = []
+        self.remaining = 0  # Sections and sources that haven't finished
+        self.error = None
+
+    def submit(self, title, description):
+        if self.error is not None:
+            return
+        self.remaining += 1
+        self.futures.append(self.executor.submit(bind_tracer(self._run_section), title, description, time.perf_counter()))
+
+    def add_source(self, key, items):
+        self.remaining += 1
+        threading.Thread(target=bind_tracer(self._read_source), args=(key, items), daemon=True).start()
+
+    def _run_section(self, title, description, submitted):
+        observe("queue_seconds", time.perf_counter() - submitted, stage="section_worker")
+        try:
+            for chunk in self.generate(title, description):
+                self.events.put((title, chunk))
+        except Exception as e:
+            self.events.put((title, e))
+        finally:
+            self.events.put((title, _DONE))
+
+    def _read_source(self, key, items):
+        try:
+            for item in items:
+                self.events.put((key, item))
+        except Exception as e:
+            self.events.put((key, e))
+        finally:
+            self.events.put((key, _DONE))
+
+    def __iter__(self):
+        while self.remaining:
+            key, item = self.events.get()
+            if item is _DONE:
+                self.remaining -= 1
+            elif isinstance(item, Exception):
+                if self.error is None:
+                    self.error = item
+                    self.remaining -= sum(future.cancel() for future in self.futures)
+            else:
+                yield key, item
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
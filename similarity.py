@@ -0,0 +1,146 @@
+import re
+import string
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from cache import LazyDatabase, CACHE_DIR, CACHE_TTL, hash_bytes, hash_text
+
+SHINGLE_WORDS = 5  # Words per shingle
+MINHASH_SIZE = 128  # Values in a MinHash signature
+LSH_BANDS = 16  # Bands of 8 values; transcripts above about 0.7 similarity almost always share one
+SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard similarity above which a transcript counts as a near duplicate
+MAX_CANDIDATES = 50  # Transcripts sharing a band that are compared in full
+
+# Punctuation becomes spaces, so "word," and "word" make the same shingles
+PUNCTUATION_TABLE = str.maketrans({**{character: " " for character in string.punctuation + "“”«»–—…" if character != "'"}, "’": "'"})
+WORD_PATTERN = re.compile(rb"\S+")
+EMPTY_BIN = 2 ** 32 - 1
+BIN_OFFSET = 2 ** 32 // MINHASH_SIZE  # Hash values within a bin stay below this
+
+
+def iter_shingles(text, size=SHINGLE_WORDS):
+    """
+    Yields the overlapping size-word shingles of the text as bytes, lowercased and without punctuation.
+    Texts shorter than size words yield a single shingle.
+    """
+    # Normalizing with translate and encoding once keeps the per-word work to a few small allocations
+    normalized = text.lower().translate(PUNCTUATION_TABLE).encode("utf-8")
+    window = deque(maxlen=size)
+    for match in WORD_PATTERN.finditer(normalized):
+        window.append(match.group())
+        if len(window) == size:
+            yield b" ".join(window)
+    if 0 < len(window) < size:
+        yield b" ".join(window)
+
+
+def shingle_similarity(text, other_text):
+    """
+    Exact Jaccard similarity of two texts' shingle sets, for texts short enough to compare directly.
+    """
+    shingles, other_shingles = set(iter_shingles(text)), set(iter_shingles(other_text))
+    if not shingles and not other_shingles:
+        return 1.0
+    return len(shingles & other_shingles) / len(shingles | other_shingles)
+
+
+def get_signature(text, size=MINHASH_SIZE):
+    """
+    Returns a one-permutation MinHash signature of the text's shingles: each shingle is hashed once with CRC-32, the
+    hash picks one of size bins and every bin keeps the smallest hash it received. Shingles are hashed as they are
+    read, so a long transcript never has its shingles in memory at once. Empty bins take the value of the next filled
+    bin, offset by the distance, so short texts still compare. The share of equal values estimates Jaccard similarity.
+    """
+    signature = [EMPTY_BIN] * size
+    for shingle in iter_shingles(text):
+        value = zlib.crc32(shingle)
+        index, value = value % size, value // size
+        if value < signature[index]:
+            signature[index] = value
+    filled = [index for index, value in enumerate(signature) if value != EMPTY_BIN]
+    if filled and len(filled) < size:
+        for index in range(size):
+            if signature[index] == EMPTY_BIN:
+                distance = min((filled_index - index) % size for filled_index in filled)
+                signature[index] = signature[(index + distance) % size] % BIN_OFFSET + distance * BIN_OFFSET
+    return array("I", signature)
+
+
+def estimate_similarity(signature, other_signature):
+    return sum(value == other_value for value, other_value in zip(signature, other_signature)) / len(signature)
+
+
+def get_band_buckets(signature, bands=LSH_BANDS):
+    rows = len(signature) // bands
+    return [(band, hash_bytes(signature[band * rows:(band + 1) * rows].tobytes())[:16]) for band in range(bands)]
+
+
+class SimilarityIndex:
+    """
+    Locality-sensitive hashing index of transcript MinHash signatures in SQLite, shared by every session and thread
+    in the process. Each signature is cut into LSH_BANDS bands and the transcript is filed under a hash of every band,
+    so a lookup only compares transcripts that share a band instead of every transcript seen.
+    """
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL):
+        self.database = LazyDatabase(directory, "similarity.sqlite3", self._create_tables)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def _create_tables(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS transcripts (id TEXT PRIMARY KEY, transcript TEXT, signature BLOB, created REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket TEXT, transcript_id TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+
+    def add(self, transcript, signature=None):
+        """
+        Indexes a transcript. Transcripts already in the index are left as they are.
+        """
+        if not transcript.strip():
+            return
+        transcript_id = hash_text(transcript)
+        signature = signature if signature is not None else get_signature(transcript)
+        now = time.time()
+        with self.lock, self.database.connect() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO transcripts (id, transcript, signature, created) VALUES (?, ?, ?, ?)",
+                                  (transcript_id, transcript, signature.tobytes(), now))
+            if cursor.rowcount:
+                conn.executemany("INSERT INTO bands (band, bucket, transcript_id) VALUES (?, ?, ?)",
+                                 [(band, bucket, transcript_id) for band, bucket in get_band_buckets(signature)])
+            self._expire(conn, now)
+
+    def find(self, transcript, threshold=SIMILARITY_THRESHOLD, signature=None):
+        """
+        Returns (similarity, transcript) for the indexed transcripts estimated to be at least threshold similar,
+        most similar first. The transcript itself is left out.
+        """
+        transcript_id = hash_text(transcript)
+        signature = signature if signature is not None else get_signature(transcript)
+        buckets = get_band_buckets(signature)
+        with self.lock, self.database.connect() as conn:
+            rows = conn.execute(f"SELECT DISTINCT transcript_id FROM bands WHERE {' OR '.join(['(band = ? AND bucket = ?)'] * len(buckets))} LIMIT ?",
+                                [value for bucket in buckets for value in bucket] + [MAX_CANDIDATES + 1]).fetchall()
+            candidates = [row[0] for row in rows if row[0] != transcript_id]
+            signatures = conn.execute(f"SELECT id, signature FROM transcripts WHERE id IN ({', '.join('?' * len(candidates))})",
+                                      candidates).fetchall() if candidates else []
+            matches = []
+            for candidate_id, candidate_signature in signatures:
+                similarity = estimate_similarity(signature, array("I", candidate_signature))
+                if similarity >= threshold:
+                    matches.append((similarity, candidate_id))
+            matches.sort(reverse=True)
+            return [(similarity, conn.execute("SELECT transcript FROM transcripts WHERE id = ?", (candidate_id,)).fetchone()[0])
+                    for similarity, candidate_id in matches]
+
+    def get(self, transcript_id):
+        with self.lock, self.database.connect() as conn:
+            row = conn.execute("SELECT transcript FROM transcripts WHERE id = ?", (transcript_id,)).fetchone()
+        return row[0] if row else None
+
+    def _expire(self, conn, now):
+        conn.execute("DELETE FROM bands WHERE transcript_id IN (SELECT id FROM transcripts WHERE created < ?)", (now - self.ttl,))
+        conn.execute("DELETE FROM transcripts WHERE created < ?", (now - self.ttl,))
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,86 @@
+class GenerationStatistics:
+    def __init__(self, input_time=0,output_time=0,input_tokens=0,output_tokens=0,total_time=0,model_name="llama3-8b-8192",requests=0):
+        self.input_time = input_time
+        self.output_time = output_time
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_time = total_time # Sum of queue, prompt (input), and completion (output) times
+        self.model_name = model_name
+        self.requests = requests # Number of API calls these statistics cover
+
+    def get_input_speed(self):
+        """ 
+        Tokens per second calculation for input
+        """
+        if self.input_time != 0:
+            return self.input_tokens / self.input_time
+        else:
+            return 0
+    
+    def get_output_speed(self):
+        """ 
+        Tokens per second calculation for output
+        """
+        if self.output_time != 0:
+            return self.output_tokens / self.output_time
+        else:
+            return 0
+
+    def get_input_tokens_per_request(self):
+        """
+        Average prompt size, which should stay flat as the outline grows
+        """
+        if self.requests != 0:
+            return self.input_tokens / self.requests
+        else:
+            return 0
+    
+    def add(self, other):
+        """
+        Add statistics from another GenerationStatistics object to this one.
+        """
+        if not isinstance(other, GenerationStatistics):
+            raise TypeError("Can only add GenerationStatistics objects")
+        
+        self.input_time += other.input_time
+        self.output_time += other.output_time
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.total_time += other.total_time
+        self.requests += other.requests
+
+    def to_dict(self):
+        return {
+            "model_name": self.model_name,
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "input_time": self.input_time,
+            "output_time": self.output_time,
+            "total_time": self.total_time,
+            "input_speed": self.get_input_speed(),
+            "output_speed": self.get_output_speed(),
+        }
+
+    def __str__(self):
+        return (f"\n## {self.get_output_speed():.2f} T/s ⚡\nRound trip time: {self.total_time:.2f}s  Model: {self.model_name}\n\n"
+                f"| Metric          | Input          | Output          | Total          |\n"
+                f"|-----------------|----------------|-----------------|----------------|\n"
+                f"| Speed (T/s)     | {self.get_input_speed():.2f}            | {self.get_output_speed():.2f}            | {(self.input_tokens + self.output_tokens) / self.total_time if self.total_time != 0 else 0:.2f}            |\n"
+                f"| Tokens          | {self.input_tokens}            | {self.output_tokens}            | {self.input_tokens + self.output_tokens}            |\n"
+                f"| Inference Time (s) | {self.input_time:.2f}            | {self.output_time:.2f}            | {self.total_time:.2f}            |\n"
+                f"| Tokens / Request ({self.requests}) | {self.get_input_tokens_per_request():.0f}            | {self.output_tokens / self.requests if self.requests != 0 else 0:.0f}            | {(self.input_tokens + self.output_tokens) / self.requests if self.requests != 0 else 0:.0f}            |")
+
+
+def statistics_from_usage(usage, model_name):
+    """
+    Builds GenerationStatistics for one API call from the usage Groq reports.
+    """
+    return GenerationStatistics(input_time=usage.prompt_time, output_time=usage.completion_time, input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens, total_time=usage.total_time, model_name=model_name, requests=1)
+
+
+def statistics_from_dict(data):
+    """
+    Rebuilds GenerationStatistics saved with to_dict. Derived speeds are recomputed, not read back.
+    """
+    return GenerationStatistics(input_time=data["input_time"], output_time=data["output_time"], input_tokens=data["input_tokens"], output_tokens=data["output_tokens"], total_time=data["total_time"], model_name=data["model_name"], requests=data["requests"])
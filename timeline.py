@@ -0,0 +1,71 @@
+import bisect
+from array import array
+
+
+class Timeline:
+    """
+    Timestamps of transcript segments, kept as three parallel arrays: where each segment starts in the transcript
+    text and its start and end in seconds of the original audio. An hour of audio has about a thousand segments,
+    which take a few kilobytes this way instead of an object each.
+    """
+    def __init__(self, offsets=(), starts=(), ends=()):
+        self.offsets = array("l", offsets)  # Sorted character offsets into the transcript
+        self.starts = array("f", starts)
+        self.ends = array("f", ends)
+
+    def add(self, offset, start, end):
+        self.offsets.append(offset)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def find(self, offset):
+        """
+        Returns the index of the segment containing the character offset.
+        """
+        return max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+
+    def get_start(self, offset):
+        return self.starts[self.find(offset)] if self.offsets else None
+
+    def get_end(self, offset):
+        return self.ends[self.find(offset)] if self.offsets else None
+
+    def get_segments(self, text, first=0, last=None):
+        """
+        Returns (start, end, text) for the segments from first up to last.
+        """
+        last = len(self) if last is None else min(last, len(self))
+        segments = []
+        for index in range(first, last):
+            end_offset = self.offsets[index + 1] if index + 1 < len(self) else len(text)
+            segments.append((self.starts[index], self.ends[index], text[self.offsets[index]:end_offset].strip()))
+        return segments
+
+    def map_times(self, function):
+        """
+        Returns a copy with every time passed through function, such as OffsetMap.to_original.
+        """
+        return Timeline(self.offsets, [function(start) for start in self.starts], [function(end) for end in self.ends])
+
+    def to_dict(self):
+        return {"offsets": self.offsets.tolist(), "starts": [round(start, 2) for start in self.starts], "ends": [round(end, 2) for end in self.ends]}
+
+
+def timeline_from_dict(data):
+    return Timeline(data["offsets"], data["starts"], data["ends"])
+
+
+def parse_segments(transcription):
+    """
+    Returns (start, end, text) for every segment of a verbose_json transcription, or an empty list if it has none.
+    """
+    segments = []
+    for segment in getattr(transcription, "segments", None) or []:
+        if isinstance(segment, dict):
+            segments.append((float(segment["start"]), float(segment["end"]), segment["text"]))
+        else:
+            segments.append((float(segment.start), float(segment.end), segment.text))
+    return segments
@@ -0,0 +1,342 @@
+import bisect
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_DIR = os.environ.get("SCRIBEWIZARD_TRACE_DIR")  # When set, the app appends every run's trace here
+METRIC_PREFIX = "scribewizard_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+WATERFALL_WIDTH = 24
+
+METRIC_HELP = {
+    "stage_seconds": "Wall time of each pipeline stage span.",
+    "request_seconds": "Round trip time of non-streaming API calls.",
+    "ttft_seconds": "Time from sending a streaming request to its first token.",
+    "inter_token_seconds": "Time between consecutive streamed tokens.",
+    "queue_seconds": "Time spent waiting for a rate limit budget or a free worker.",
+    "bytes_total": "Bytes read, uploaded or written by each stage.",
+    "retries_total": "API calls retried after a rate limit or transient error.",
+}
+
+_current_tracer = contextvars.ContextVar("scribewizard_tracer", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def add(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation inside the bucket it falls in, as Prometheus does.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+    def get_mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """
+    Histograms and counters keyed by metric name and labels, exportable in the Prometheus text format.
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def increment(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, other):
+        with self.lock:
+            for key, histogram in other.histograms.items():
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(histogram.buckets)
+                self.histograms[key].add(histogram)
+            for key, value in other.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def get_histograms(self, name):
+        """
+        Returns {labels: Histogram} for one metric.
+        """
+        return {labels: histogram for (metric, labels), histogram in self.histograms.items() if metric == name}
+
+    def get_counters(self, name):
+        return {labels: value for (metric, labels), value in self.counters.items() if metric == name}
+
+    def to_prometheus(self):
+        lines = []
+        for name in sorted({metric for metric, _ in self.histograms}):
+            full_name = METRIC_PREFIX + name
+            lines += [f"# HELP {full_name} {METRIC_HELP.get(name, name)}", f"# TYPE {full_name} histogram"]
+            for labels, histogram in sorted(self.get_histograms(name).items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        for name in sorted({metric for metric, _ in self.counters}):
+            full_name = METRIC_PREFIX + name
+            lines += [f"# HELP {full_name} {METRIC_HELP.get(name, name)}", f"# TYPE {full_name} counter"]
+            for labels, value in sorted(self.get_counters(name).items()):
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+class Span:
+    def __init__(self, name, start, end=None, attributes=None):
+        self.name = name
+        self.start = start  # Seconds since the tracer started
+        self.end = end
+        self.attributes = attributes or {}
+
+    def get_duration(self):
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def to_dict(self):
+        return {"type": "span", "name": self.name, "start": round(self.start, 6), "end": round(self.end, 6),
+                "duration": round(self.get_duration(), 6), **self.attributes}
+
+
+class Tracer:
+    """
+    Collects the spans and latency metrics of one pipeline run. Install it with use_tracer; instrumented code
+    finds it through a context variable, so pipeline signatures stay unchanged.
+    """
+    def __init__(self, name="run"):
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.metrics = Metrics()
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.started
+
+    def record_span(self, span):
+        with self.lock:
+            self.spans.append(span)
+        self.metrics.observe("stage_seconds", span.get_duration(), stage=span.name)
+
+    def get_stages(self):
+        """
+        Groups spans by name into one waterfall row per stage, ordered by when the stage first started.
+        busy is the summed span time, which exceeds the wall time of the stage when its spans ran in parallel.
+        """
+        stages = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"stage": span.name, "start": span.start, "end": span.end, "count": 0, "busy": 0.0})
+            stage["start"] = min(stage["start"], span.start)
+            stage["end"] = max(stage["end"], span.end)
+            stage["count"] += 1
+            stage["busy"] += span.get_duration()
+        return sorted(stages.values(), key=lambda stage: stage["start"])
+
+    def get_waterfall(self):
+        stages = self.get_stages()
+        if not stages:
+            return ""
+        total = max(stage["end"] for stage in stages) or 1e-9
+        rows = [f"\n## Pipeline stages ⏱️\nWall time: {total:.2f}s\n\n",
+                "| Stage | Start (s) | Wall (s) | Busy (s) | Spans | Timeline |\n",
+                "|-------|-----------|----------|----------|-------|----------|\n"]
+        for stage in stages:
+            offset = int(stage["start"] / total * WATERFALL_WIDTH)
+            length = max(1, round((stage["end"] - stage["start"]) / total * WATERFALL_WIDTH))
+            bar = ("·" * offset + "█" * length).ljust(WATERFALL_WIDTH, "·")[:WATERFALL_WIDTH]
+            rows.append(f"| {stage['stage']} | {stage['start']:.2f} | {stage['end'] - stage['start']:.2f} | {stage['busy']:.2f} | {stage['count']} | `{bar}` |\n")
+        return "".join(rows)
+
+    def get_latency_table(self):
+        ttft = self.metrics.get_histograms("ttft_seconds")
+        inter_token = self.metrics.get_histograms("inter_token_seconds")
+        if not ttft:
+            return ""
+        rows = ["\n| Model | TTFT p50 (s) | TTFT p95 (s) | Inter-token p50 (ms) | Inter-token p95 (ms) |\n",
+                "|-------|--------------|--------------|----------------------|----------------------|\n"]
+        for labels, histogram in sorted(ttft.items()):
+            tokens = inter_token.get(labels)
+            rows.append(f"| {dict(labels).get('model', '')} | {histogram.quantile(0.5):.2f} | {histogram.quantile(0.95):.2f} | "
+                        f"{tokens.quantile(0.5) * 1000 if tokens else 0:.1f} | {tokens.quantile(0.95) * 1000 if tokens else 0:.1f} |\n")
+        return "".join(rows)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "stages": self.get_stages(),
+            "latency": {dict(labels).get("model", ""): {"ttft_p50": histogram.quantile(0.5), "ttft_p95": histogram.quantile(0.95),
+                                                        "requests": histogram.count}
+                        for labels, histogram in self.metrics.get_histograms("ttft_seconds").items()},
+            "bytes": {dict(labels).get("stage", ""): value for labels, value in self.metrics.get_counters("bytes_total").items()},
+        }
+
+    def write_jsonl(self, path):
+        """
+        Appends one line per span, then a summary line for the run.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps({"run": self.name, "started_at": self.started_at, **span.to_dict()}) + "\n")
+            f.write(json.dumps({"run": self.name, "started_at": self.started_at, "type": "summary", **self.to_dict()}) + "\n")
+
+    def __str__(self):
+        return self.get_waterfall() + self.get_latency_table()
+
+
+@contextmanager
+def use_tracer(tracer):
+    """
+    Makes tracer the destination of spans and metrics recorded in this context, including worker threads
+    started through bind_tracer and asyncio tasks created inside it.
+    """
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+def get_tracer():
+    return _current_tracer.get()
+
+
+def bind_tracer(function):
+    """
+    Wraps a function submitted to a thread pool so it records into the caller's tracer.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return function
+
+    def run(*args, **kwargs):
+        with use_tracer(tracer):
+            return function(*args, **kwargs)
+    return run
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block as a span of the current tracer. Does nothing when no tracer is installed.
+    The yielded dict can be filled with attributes that are only known at the end.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield attributes
+        return
+    start = tracer.now()
+    try:
+        yield attributes
+    finally:
+        tracer.record_span(Span(name, start, tracer.now(), attributes))
+
+
+def observe(name, value, **labels):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.metrics.observe(name, value, **labels)
+
+
+def increment(name, value=1, **labels):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.metrics.increment(name, value, **labels)
+
+
+def add_bytes(stage, count):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.metrics.increment("bytes_total", count, stage=stage)
+
+
+class StreamTimer:
+    """
+    Records time to first token and inter-token latency for one streaming request. Call tick() for every token chunk.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.started = time.perf_counter()
+        self.last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.last is None:
+            observe("ttft_seconds", now - self.started, model=self.model)
+        else:
+            observe("inter_token_seconds", now - self.last, model=self.model)
+        self.last = now
+
+
+process_metrics = Metrics()  # Every run exported by this process, for the Prometheus text file
+
+
+def export_trace(tracer, directory=TRACE_DIR):
+    """
+    Appends a run's spans to trace.jsonl and rewrites metrics.prom with the metrics of every run so far.
+    """
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    tracer.write_jsonl(os.path.join(directory, "trace.jsonl"))
+    process_metrics.add(tracer.metrics)
+    process_metrics.write_prometheus(os.path.join(directory, "metrics.prom"))
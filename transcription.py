@@ -0,0 +1,283 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span, observe, add_bytes, bind_tracer
+from rate_limit import rate_limiter
+from media import open_upload
+from timeline import Timeline, parse_segments
+
+WHISPER_MODEL = "whisper-large-v3"
+MAX_UPLOAD_SIZE = 25 * 1024 * 1024  # Files above this size are always chunked before upload
+CHUNK_LENGTH = 600  # Target chunk length in seconds
+CHUNK_OVERLAP = 5  # Seconds of audio repeated at the start of each chunk
+SILENCE_SEARCH_WINDOW = 30  # Seconds around the target cut point searched for silence
+SILENCE_THRESHOLD = "-35dB"
+SILENCE_MIN_DURATION = 0.4
+MAX_WORKERS = 4
+MAX_STITCH_WORDS = 60  # Longest overlap (in words) considered when stitching chunk texts
+# Words a chunk cut mid-word may add around the overlap, like "former" for "transformer", skipped when matching it
+MAX_CLIPPED_WORDS = 3
+MIN_CLIPPED_OVERLAP_WORDS = 3  # Shortest match accepted once clipped words are skipped, so common words don't match by chance
+# verbose_json adds start and end times for each segment, at a few more bytes per sentence of response
+TRANSCRIPTION_RESPONSE_FORMAT = "verbose_json"
+
+# Speech-friendly encoding: 16 kHz mono Opus at 24 kbps is about 10x smaller than 192 kbps MP3
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_AUDIO_CODEC = "libopus"
+SPEECH_AUDIO_BITRATE = "24k"
+SPEECH_AUDIO_EXTENSION = "ogg"
+
+
+class AudioChunk:
+    def __init__(self, index, start, end, path=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.path = path
+
+    def __repr__(self):
+        return f"AudioChunk(index={self.index}, start={self.start:.2f}, end={self.end:.2f})"
+
+
+def get_audio_duration(path):
+    """
+    Returns the duration of an audio file in seconds using ffprobe.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(path, threshold=SILENCE_THRESHOLD, min_duration=SILENCE_MIN_DURATION, start=0.0):
+    """
+    Returns a list of (start, end) tuples for the silent stretches ffmpeg's silencedetect finds in the audio,
+    searching from start seconds on.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-ss", f"{start:.3f}", "-i", path, "-af", f"silencedetect=noise={threshold}:d={min_duration}",
+         "-f", "null", "-"],
+        capture_output=True,
+        text=True,
+    )
+    return [(silence_start + start, silence_end + start) for silence_start, silence_end in parse_silences(result.stderr)]
+
+
+def parse_silences(ffmpeg_output):
+    """
+    Parses silencedetect log lines into (start, end) tuples.
+    """
+    silences = []
+    start = None
+    for line in ffmpeg_output.splitlines():
+        if match := re.search(r"silence_start: (-?[\d.]+)", line):
+            start = max(float(match.group(1)), 0.0)
+        elif (match := re.search(r"silence_end: ([\d.]+)", line)) and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(duration, silences, chunk_length=CHUNK_LENGTH, overlap=CHUNK_OVERLAP, search_window=SILENCE_SEARCH_WINDOW):
+    """
+    Plans chunk boundaries near every chunk_length seconds, preferring the middle of the silence closest
+    to each target cut point. Every chunk after the first starts overlap seconds before the previous cut.
+    """
+    chunks = []
+    cut = 0.0
+    while cut < duration:
+        chunk_start = max(cut - overlap, 0.0) if chunks else 0.0
+        target = cut + chunk_length
+        if target + search_window >= duration:
+            next_cut = duration
+        else:
+            candidates = [(start + end) / 2 for start, end in silences if abs((start + end) / 2 - target) <= search_window]
+            next_cut = min(candidates, key=lambda point: abs(point - target)) if candidates else target
+        chunks.append(AudioChunk(len(chunks), chunk_start, next_cut))
+        cut = next_cut
+    return chunks
+
+
+def plan_audio_chunks(path, chunk_length=CHUNK_LENGTH, overlap=CHUNK_OVERLAP):
+    """
+    Plans silence-aligned chunks for an audio file without encoding them.
+    """
+    with span("plan_chunks"):
+        return plan_chunks(get_audio_duration(path), detect_silences(path), chunk_length, overlap)
+
+
+def encode_chunk(path, chunk, output_dir):
+    """
+    Encodes one planned chunk as mono 16 kHz speech Opus in output_dir and sets its path, so chunks of a
+    preprocessed recording stay as small as the recording itself.
+    """
+    chunk.path = os.path.join(output_dir, f"chunk_{chunk.index:04d}.{SPEECH_AUDIO_EXTENSION}")
+    with span("encode_chunk", chunk=chunk.index):
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{chunk.start:.3f}", "-t", f"{chunk.end - chunk.start:.3f}",
+             "-i", path, "-ac", "1", "-ar", str(SPEECH_SAMPLE_RATE), "-c:a", SPEECH_AUDIO_CODEC, "-b:a", SPEECH_AUDIO_BITRATE,
+             "-application", "voip", chunk.path],
+            check=True,
+        )
+    return chunk
+
+
+def split_audio(path, output_dir, chunk_length=CHUNK_LENGTH, overlap=CHUNK_OVERLAP):
+    """
+    Splits an audio file on silence into mono 16 kHz speech Opus chunks written to output_dir.
+    """
+    return [encode_chunk(path, chunk, output_dir) for chunk in plan_audio_chunks(path, chunk_length, overlap)]
+
+
+def transcribe_file(client, path, model=WHISPER_MODEL, language="en", prompt=""):
+    """
+    Transcribes a single audio file with one Whisper API call. Returns the text and its (start, end, text) segments.
+    """
+    size = os.path.getsize(path)
+    add_bytes("upload", size)
+
+    def request(model):
+        with span("transcription", file=os.path.basename(path), bytes=size), open_upload(path) as upload:
+            started = time.perf_counter()
+            transcription = client.audio.transcriptions.create(
+                file=upload,
+                model=model,
+                prompt=prompt,
+                response_format=TRANSCRIPTION_RESPONSE_FORMAT,
+                language=language,
+                temperature=0.0
+            )
+            observe("request_seconds", time.perf_counter() - started, model=model)
+        return transcription, {}
+
+    # Whisper has no fallback model; the scheduler only paces and retries it
+    _, transcription = rate_limiter.call(request, model, fallback_models=())
+    return transcription.text, parse_segments(transcription)
+
+
+def transcribe_chunks(client, chunks, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Transcribes chunks concurrently through a bounded worker pool, returning (text, segments, start) in chunk order.
+    """
+    def transcribe(chunk):
+        return (*transcribe_file(client, chunk.path, **kwargs), chunk.start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(bind_tracer(transcribe), chunks))
+
+
+def transcribe_chunk_stream(client, chunks, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Transcribes chunks from an iterator as they become available, so uploads start before the
+    whole recording has been produced. Returns the stitched transcript and its Timeline.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(executor.submit(bind_tracer(transcribe_file), client, chunk.path, **kwargs), chunk.start) for chunk in chunks]
+        return stitch_transcripts([(*future.result(), start) for future, start in futures])
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def find_overlap(tail, head, max_clipped_words=MAX_CLIPPED_WORDS):
+    """
+    Returns how many words at the start of head repeat the end of tail. Audio cut mid-word is transcribed as a
+    fragment, so up to max_clipped_words words at the start of head and the end of tail may be left out of the match;
+    the head's fragments are counted in the overlap and dropped with it.
+    """
+    for size in range(min(len(tail), len(head)), 0, -1):
+        clipped = max_clipped_words if size >= MIN_CLIPPED_OVERLAP_WORDS else 0
+        for skipped in range(min(clipped, len(head) - size) + 1):
+            for trimmed in range(min(clipped, len(tail) - size) + 1):
+                end = len(tail) - trimmed
+                if tail[end - size:end] == head[skipped:skipped + size]:
+                    return skipped + size
+    return 0
+
+
+class TranscriptStitcher:
+    """
+    Incrementally joins chunk transcripts in order, dropping the words at the start of each chunk
+    that repeat the end of the previous one. Segment times are collected into a Timeline of the joined text.
+    """
+    def __init__(self, max_overlap_words=MAX_STITCH_WORDS):
+        self.max_overlap_words = max_overlap_words
+        self.words = []
+        self.length = 0  # Characters in get_text()
+        self.timeline = Timeline()
+
+    def add(self, text, segments=(), start=0.0):
+        """
+        Appends a chunk's text and returns the part of it that was not overlap. segments are the chunk's
+        (start, end, text) Whisper segments, timed from the start of the chunk at start seconds.
+        """
+        new_words = text.split()
+        tail = [_normalize_word(word) for word in self.words[-self.max_overlap_words:]]
+        head = [_normalize_word(word) for word in new_words[:self.max_overlap_words]]
+        overlap = find_overlap(tail, head)
+        kept = new_words[overlap:]
+        offsets = []
+        position = self.length + 1 if self.words else 0
+        for word in kept:
+            offsets.append(position)
+            position += len(word) + 1
+        # Segments are located by word count, and those that begin inside the overlap are dropped with it
+        word_index = -overlap
+        for segment_start, segment_end, segment_text in segments:
+            segment_words = len(segment_text.split())
+            if segment_words and 0 <= word_index < len(offsets):
+                self.timeline.add(offsets[word_index], start + segment_start, start + segment_end)
+            word_index += segment_words
+        if kept:
+            self.length = position - 1
+        self.words.extend(kept)
+        return " ".join(kept)
+
+    def get_text(self):
+        return " ".join(self.words)
+
+
+def stitch_transcripts(pieces, max_overlap_words=MAX_STITCH_WORDS):
+    """
+    Joins (text, segments, start) chunk transcripts, dropping the words at the start of each chunk that repeat the end
+    of the previous one. Returns the text and its Timeline.
+    """
+    stitcher = TranscriptStitcher(max_overlap_words)
+    for piece in pieces:
+        stitcher.add(*piece)
+    return stitcher.get_text(), stitcher.timeline
+
+
+def needs_chunking(path, chunk_length=CHUNK_LENGTH):
+    """
+    Whether a file should be split before upload. Without ffmpeg every file is sent whole.
+    """
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("ffmpeg not found, transcribing without chunking")
+        return False
+    return os.path.getsize(path) > MAX_UPLOAD_SIZE or get_audio_duration(path) > chunk_length + SILENCE_SEARCH_WINDOW
+
+
+def transcribe_long_audio(client, path, chunk_length=CHUNK_LENGTH, overlap=CHUNK_OVERLAP, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Transcribes an audio file of any length. Short files are sent in one call, longer ones are split on silence,
+    transcribed in parallel and stitched back together. Returns the transcript and its Timeline.
+    """
+    if not needs_chunking(path, chunk_length):
+        return stitch_transcripts([(*transcribe_file(client, path, **kwargs), 0.0)])
+
+    output_dir = tempfile.mkdtemp(prefix="scribewizard_chunks_")
+    try:
+        chunks = split_audio(path, output_dir, chunk_length, overlap)
+        print(f"Transcribing {len(chunks)} chunks with {max_workers} workers")
+        return stitch_transcripts(transcribe_chunks(client, chunks, max_workers=max_workers, **kwargs))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)